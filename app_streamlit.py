@@ -1,29 +1,160 @@
+import hashlib
 import io
-import json
+import os
+import tempfile
+from datetime import timedelta
 import streamlit as st
 import pandas as pd
 
-from src.pcapviz.parser import parse_pcap, FilterOptions
+from src.pcapviz.parser import parse_pcap, build_flows, FilterOptions
+from src.pcapviz.columns import string_view, take_rows
+from src.pcapviz.query import PacketIndex
+from src.pcapviz.rollup import ThroughputPyramid
+from src.pcapviz.ipset import IPSet
 from src.pcapviz.metrics import (
     compute_top_talkers,
     compute_protocol_breakdown,
-    compute_throughput,
     compute_top_ports,
-    compute_conversation_matrix,
+    scale_estimates,
+    sparse_conversation_matrix,
 )
-from src.pcapviz.graph import build_host_graph, to_pyvis_html, export_graphml
+from src.pcapviz.graph import SubnetMap, build_host_graph, export_graphml
+from src.pcapviz.render import DEFAULT_MAX_EDGES, DEFAULT_MAX_NODES, to_html
+from src.pcapviz.follow import CaptureFollower
+from src.pcapviz.sampling import SampleOptions, sample_rate
+from src.pcapviz.streaming import StreamingStats
+
+# Results are cached per upload and parameters: ``key`` is (content digest,
+# packet limit, filters, sample), and arguments starting with "_" are not
+# hashed. The capture (or its sample) is parsed once without filters and
+# indexed (``query.PacketIndex``); filters select row positions of that table
+# in memory, which the panels read without copying the table, and each panel
+# recomputes only when its own parameters change. With a sample, the panels
+# show counts scaled up to estimates of the whole capture.
+# Entry counts bound the memory held by the caches (least recently used go first).
+_CAPTURES = 2  # unfiltered tables of recent uploads
+_VIEWS = 4  # filtered selections and the results derived from them
+_EXPORTS = 8  # prepared download files
+
+
+def upload_digest(uploaded) -> str:
+    """Content hash of the upload, computed once per uploaded file."""
+    cached = st.session_state.get("upload_digest")
+    if cached is None or cached[0] != uploaded.file_id:
+        cached = (uploaded.file_id, hashlib.blake2b(uploaded.getbuffer(), digest_size=16).hexdigest())
+        st.session_state["upload_digest"] = cached
+    return cached[1]
+
+
+@st.cache_resource(max_entries=_CAPTURES, show_spinner="Разбор PCAP…")
+def load_capture(digest: str, limit, sample, _uploaded):
+    # parsed from memory; compressed uploads are decompressed on the fly
+    return parse_pcap(_uploaded.getvalue(), max_packets=limit, sample=sample)
+
+
+@st.cache_resource(max_entries=_CAPTURES)
+def packet_index(digest: str, limit, sample, _packets: pd.DataFrame) -> PacketIndex:
+    return PacketIndex(_packets)
+
+
+@st.cache_resource(max_entries=_VIEWS)
+def select(key, _index: PacketIndex):
+    """Row positions passing the filters, or None when every packet does."""
+    rows = _index.select(key[2])
+    return None if len(rows) == _index.n else rows
+
+
+@st.cache_resource(max_entries=_VIEWS)
+def flows(key, _packets: pd.DataFrame, _flows: pd.DataFrame, _rows):
+    return _flows if _rows is None else build_flows(take_rows(_packets, _rows))
+
+
+@st.cache_data(max_entries=_VIEWS)
+def top_talkers(key, _packets: pd.DataFrame, _rows) -> pd.DataFrame:
+    return compute_top_talkers(_packets, n=15, rows=_rows, sample_rate=sample_rate(key[3]))
+
+
+@st.cache_data(max_entries=_VIEWS)
+def protocols(key, _packets: pd.DataFrame, _rows) -> pd.DataFrame:
+    return compute_protocol_breakdown(_packets, rows=_rows, sample_rate=sample_rate(key[3]))
+
+
+@st.cache_data(max_entries=_VIEWS)
+def top_ports(key, _packets: pd.DataFrame, _rows) -> pd.DataFrame:
+    return compute_top_ports(_packets, n=15, rows=_rows, sample_rate=sample_rate(key[3]))
+
+
+@st.cache_resource(max_entries=_VIEWS)
+def throughput_levels(key, _packets: pd.DataFrame, _rows) -> ThroughputPyramid:
+    # bucketed once per selection; interval, window and breakdown changes only read it
+    return ThroughputPyramid(_packets, rows=_rows)
+
+
+@st.cache_resource(max_entries=_VIEWS)
+def conversations(key, _packets: pd.DataFrame, _rows):
+    return sparse_conversation_matrix(_packets, rows=_rows)
+
+
+@st.cache_resource(max_entries=_VIEWS)
+def host_graph(key, min_bytes: int, top_edges: int, collapse, _packets: pd.DataFrame, _rows):
+    subnets = SubnetMap(*collapse) if collapse else None
+    return build_host_graph(
+        _packets,
+        min_bytes=min_bytes,
+        top_edges=(top_edges or None),
+        subnets=subnets,
+        rows=_rows,
+        sample_rate=sample_rate(key[3]),
+    )
+
+
+@st.cache_data(max_entries=2 * _VIEWS)
+def graph_html(key, graph_params, max_nodes: int, max_edges: int, _G) -> str:
+    return to_html(_G, max_nodes=max_nodes, max_edges=max_edges)
+
+
+@st.cache_resource(max_entries=_EXPORTS)
+def download_bytes(key, name: str, _make) -> bytes:
+    """Export file contents; ``name`` identifies the export, ``_make`` builds it."""
+    return _make()
+
+
+def graphml_bytes(G) -> bytes:
+    fd, path = tempfile.mkstemp(suffix=".graphml")
+    os.close(fd)
+    try:
+        export_graphml(G, path)
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        os.remove(path)
+
+
+def parquet_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
 
 st.set_page_config(page_title="PCAPViz — JDRockfeller (Off-set)", layout="wide")
 
 st.title("PCAPViz: Анализ и визуализация PCAP")
 st.caption("© 2025 JDRockfeller (Off-set)")
 
-uploaded = st.file_uploader("Загрузите PCAP-файл", type=["pcap", "pcapng"]) 
+uploaded = st.file_uploader(
+    "Загрузите PCAP-файл (можно сжатый: .gz, .bz2, .xz, .zst)",
+    type=["pcap", "pcapng", "cap", "gz", "bz2", "xz", "zst"],
+)
 max_packets = st.number_input("Ограничение пакетов (0 = без лимита)", min_value=0, value=0, step=1000)
+scol1, scol2 = st.columns(2)
+with scol1:
+    sample_mode = st.selectbox("Выборка для быстрого просмотра", ["нет", "по флоу", "по пакетам"], index=0)
+with scol2:
+    sample_every = st.number_input("Один из N", min_value=2, value=10, step=1, disabled=sample_mode == "нет")
 
 with st.expander("Фильтры"):
-    ips = st.text_input("Включить IP (через запятую)")
-    exclude_ips = st.text_input("Исключить IP (через запятую)")
+    ips = st.text_input("Включить IP и подсети CIDR (через запятую)")
+    exclude_ips = st.text_input("Исключить IP и подсети CIDR (через запятую)")
     protos = st.multiselect("Протоколы", ["TCP", "UDP", "OTHER"], default=[])
     src_ports = st.text_input("SRC порты (через запятую)")
     dst_ports = st.text_input("DST порты (через запятую)")
@@ -36,12 +167,22 @@ with st.expander("Фильтры"):
     def parse_list_str(txt: str):
         return [x.strip() for x in txt.split(",") if x.strip()] if txt.strip() else None
 
+    def parse_list_ips(txt: str):
+        entries = parse_list_str(txt)
+        if entries is not None:
+            try:
+                IPSet(entries)  # reject typos here rather than in every panel
+            except ValueError as exc:
+                st.error(str(exc))
+                return None
+        return entries
+
     start_ts = pd.to_datetime(tstart, utc=True) if tstart.strip() else None
     end_ts = pd.to_datetime(tend, utc=True) if tend.strip() else None
 
     filter_opts = FilterOptions(
-        include_ips=parse_list_str(ips),
-        exclude_ips=parse_list_str(exclude_ips),
+        include_ips=parse_list_ips(ips),
+        exclude_ips=parse_list_ips(exclude_ips),
         protocols=protos if protos else None,
         src_ports=parse_list_int(src_ports),
         dst_ports=parse_list_int(dst_ports),
@@ -50,80 +191,181 @@ with st.expander("Фильтры"):
     )
 
 if uploaded is not None:
-    tmp_bytes = uploaded.read()
-    with open(".tmp_upload.pcap", "wb") as f:
-        f.write(tmp_bytes)
-
-    packets_df, flows_df = parse_pcap(
-        ".tmp_upload.pcap",
-        max_packets=(None if max_packets == 0 else max_packets),
-        filters=filter_opts,
-    )
+    limit = None if max_packets == 0 else int(max_packets)
+    sample = None
+    if sample_mode != "нет":
+        sample = SampleOptions(int(sample_every), "flow" if sample_mode == "по флоу" else "packet")
+    key = (upload_digest(uploaded), limit, filter_opts, sample)
+    all_packets, all_flows = load_capture(key[0], limit, sample, uploaded)
+    rows = select(key, packet_index(key[0], limit, sample, all_packets))
+    flows_df = flows(key, all_packets, all_flows, rows)
+    # only the columns the summary reads
+    summary = take_rows(all_packets, rows, ["timestamp", "length"])
+
+    rate = sample_rate(sample)
 
     st.subheader("Сводка")
+    if sample is not None:
+        st.caption(
+            f"Оценка по выборке 1 из {rate}: пакеты и байты умножены на {rate}; "
+            "таблицы пакетов, флоу и матрица разговоров показывают саму выборку."
+        )
     st.write({
-        "Пакетов": int(len(packets_df)),
+        "Пакетов": int(len(summary)) * rate,
         "Флоу": int(len(flows_df)),
         "Временной диапазон": (
-            f"{packets_df['timestamp'].min()} — {packets_df['timestamp'].max()}" if not packets_df.empty else "—"
+            f"{summary['timestamp'].min()} — {summary['timestamp'].max()}" if not summary.empty else "—"
         ),
-        "Всего байт": int(packets_df["length"].sum()) if not packets_df.empty else 0,
+        "Всего байт": int(summary["length"].sum()) * rate if not summary.empty else 0,
     })
 
     with st.expander("Пакеты"):
-        st.dataframe(packets_df.head(2000))
-        if not packets_df.empty:
-            st.download_button("Скачать packets.csv", packets_df.to_csv(index=False).encode("utf-8"), "packets.csv")
+        st.dataframe(string_view(take_rows(all_packets, None if rows is None else rows[:2000]).head(2000)))
+        # building the CSV of a large capture takes seconds, so only on request
+        if not summary.empty and st.checkbox("Подготовить packets.csv"):
+            data = download_bytes(
+                key, "packets.csv", lambda: string_view(take_rows(all_packets, rows)).to_csv(index=False).encode("utf-8")
+            )
+            st.download_button("Скачать packets.csv", data, "packets.csv")
 
     with st.expander("Флоу"):
         st.dataframe(flows_df.head(2000))
-        if not flows_df.empty:
-            st.download_button("Скачать flows.csv", flows_df.to_csv(index=False).encode("utf-8"), "flows.csv")
+        if not flows_df.empty and st.checkbox("Подготовить flows.csv"):
+            data = download_bytes(key, "flows.csv", lambda: flows_df.to_csv(index=False).encode("utf-8"))
+            st.download_button("Скачать flows.csv", data, "flows.csv")
 
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Топ узлы")
-        top = compute_top_talkers(packets_df, n=15)
+        top = top_talkers(key, all_packets, rows)
         st.dataframe(top)
         if not top.empty:
             st.download_button("Скачать top_talkers.csv", top.to_csv(index=False).encode("utf-8"), "top_talkers.csv")
 
     with col2:
         st.subheader("Протоколы")
-        proto = compute_protocol_breakdown(packets_df)
+        proto = protocols(key, all_packets, rows)
         st.dataframe(proto)
         if not proto.empty:
             st.download_button("Скачать protocols.csv", proto.to_csv(index=False).encode("utf-8"), "protocols.csv")
 
     st.subheader("Топ порты (DST)")
-    ports = compute_top_ports(packets_df, n=15)
+    ports = top_ports(key, all_packets, rows)
     st.dataframe(ports)
 
     st.subheader("Пропускная способность")
-    rule = st.selectbox("Интервал", ["500ms", "1S", "5S", "10S", "1min"], index=1)
-    thr = compute_throughput(packets_df, rule=rule)
-    st.line_chart(thr.set_index("timestamp")["bytes"])  # bytes per bucket
+    levels = throughput_levels(key, all_packets, rows)
+    tcol1, tcol2 = st.columns(2)
+    with tcol1:
+        rule = st.selectbox("Интервал", ["авто", "1ms", "10ms", "100ms", "500ms", "1S", "5S", "10S", "1min"], index=0)
+    with tcol2:
+        breakdown = st.selectbox("Разбивка", ["нет", "по протоколам", "по узлам"], index=0)
+    window_start = window_end = None
+    if levels.time_min is not None and levels.time_max > levels.time_min:
+        first = pd.Timestamp(levels.time_min).floor("ms").to_pydatetime()
+        last = pd.Timestamp(levels.time_max).ceil("ms").to_pydatetime()
+        window_start, window_end = st.slider(
+            "Окно (UTC)",
+            min_value=first,
+            max_value=last,
+            value=(first, last),
+            step=max(timedelta(milliseconds=1), (last - first) / 1000),
+            format="YYYY-MM-DD HH:mm:ss.SSS",
+        )
+    if rule == "авто":
+        rule = levels.auto_rule(window_start, window_end)
+        st.caption(f"Интервал: {rule}")
+    by = {"нет": None, "по протоколам": "protocol", "по узлам": "host"}[breakdown]
+    thr = scale_estimates(levels.throughput(rule, window_start, window_end, by=by), rate)
+    if by is None:
+        st.line_chart(thr.set_index("timestamp")["bytes"])  # bytes per bucket
+    else:
+        st.line_chart(thr.pivot(index="timestamp", columns=by, values="bytes"))
     if not thr.empty:
         st.download_button("Скачать throughput.csv", thr.to_csv(index=False).encode("utf-8"), "throughput.csv")
 
     st.subheader("Матрица разговоров")
-    conv = compute_conversation_matrix(packets_df)
+    conv = conversations(key, all_packets, rows)
     if not conv.empty:
-        st.dataframe(conv)
+        st.caption(f"Узлов: {conv.shape[0]}, ненулевых ячеек: {conv.nnz}")
+        top_hosts = st.slider("Узлов в матрице (самые нагруженные)", min_value=5, max_value=100, value=30)
+        st.dataframe(conv.dense(top_n=top_hosts))
+        st.write("Топ разговоров")
+        st.dataframe(conv.top(50))
+        host = st.text_input("Разговоры узла (IP)")
+        if host.strip():
+            hcol1, hcol2 = st.columns(2)
+            with hcol1:
+                st.write("Отправлено")
+                st.dataframe(conv.row(host.strip()))
+            with hcol2:
+                st.write("Получено")
+                st.dataframe(conv.column(host.strip()))
+        csv_data = download_bytes(key, "conversations.csv", lambda: conv.triplets().to_csv(index=False).encode("utf-8"))
+        st.download_button("Скачать conversations.csv", csv_data, "conversations.csv")
+        parquet_data = download_bytes(key, "conversations.parquet", lambda: parquet_bytes(conv.triplets()))
+        st.download_button("Скачать conversations.parquet", parquet_data, "conversations.parquet")
 
     st.subheader("Граф узлов")
     min_bytes = st.slider(
         "Минимум байт на ребро",
         min_value=0,
-        max_value=int(max(1, packets_df["length"].sum() // 10)),
+        max_value=int(max(1, summary["length"].sum() * rate // 10)),
         value=0,
     )
-    G = build_host_graph(packets_df, min_bytes=min_bytes)
-    html = to_pyvis_html(G)
-    st.components.v1.html(html, height=720, scrolling=True)
+    gcol1, gcol2 = st.columns(2)
+    with gcol1:
+        top_edges = st.number_input("Оставить самых тяжёлых рёбер (0 = все)", min_value=0, value=0, step=100)
+    with gcol2:
+        collapse = st.selectbox("Объединять узлы в подсети", ["нет", "/24 и /64", "/16 и /48"], index=0)
+    prefixes = None
+    if collapse != "нет":
+        prefixes = (24, 64) if collapse == "/24 и /64" else (16, 48)
+    graph_params = (int(min_bytes), int(top_edges), prefixes)
+    G = host_graph(key, *graph_params, all_packets, rows)
+    with st.expander("Бюджет отрисовки"):
+        max_nodes = st.number_input("Максимум узлов", min_value=10, value=DEFAULT_MAX_NODES, step=100)
+        max_edges = st.number_input("Максимум рёбер", min_value=10, value=DEFAULT_MAX_EDGES, step=500)
+    html = graph_html(key, graph_params, int(max_nodes), int(max_edges), G)
+    st.components.v1.html(html, height=760, scrolling=True)
     if G.number_of_edges() > 0:
-        export_graphml(G, ".tmp_graph.graphml")
-        with open(".tmp_graph.graphml", "rb") as fh:
-            st.download_button("Скачать graph.graphml", fh, file_name="graph.graphml")
+        data = download_bytes(key, f"graph.graphml:{graph_params}", lambda: graphml_bytes(G))
+        st.download_button("Скачать graph.graphml", data, file_name="graph.graphml")
 else:
     st.info("Загрузите PCAP для начала анализа.")
+
+    st.subheader("Живой захват")
+    follow_path = st.text_input("Путь или шаблон растущего захвата (например /tmp/live.pcap*)")
+    follow_every = st.number_input("Обновлять каждые, с", min_value=0.5, value=1.0, step=0.5)
+
+    if follow_path.strip():
+        key = (follow_path.strip(), repr(filter_opts))
+        if st.session_state.get("follow_key") != key:
+            st.session_state["follow_key"] = key
+            st.session_state["follower"] = CaptureFollower(follow_path.strip(), filters=filter_opts)
+            st.session_state["follow_stats"] = StreamingStats(flows=False)
+
+        @st.fragment(run_every=follow_every)
+        def live_view():
+            follower = st.session_state["follower"]
+            stats = st.session_state["follow_stats"]
+            new = 0
+            for chunk in follower.read_new():
+                stats.update(chunk)
+                new += len(chunk)
+            st.write({
+                "Файл": follower.path or "—",
+                "Пакетов": stats.packets,
+                "Новых": new,
+                "Всего байт": stats.bytes,
+            })
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(stats.top_talkers(15))
+            with col2:
+                st.dataframe(stats.protocol_breakdown())
+            thr = stats.throughput()
+            if not thr.empty:
+                st.line_chart(thr.tail(600).set_index("timestamp")["bytes"])
+
+        live_view()
@@ -10,4 +10,23 @@ __all__ = [
     "parser",
     "metrics",
     "graph",
+    "decoder",
+    "columns",
+    "cache",
+    "index",
+    "streaming",
+    "flows",
+    "follow",
+    "replay",
+    "sketch",
+    "render",
+    "matrix",
+    "query",
+    "ipset",
+    "synth",
+    "bench",
+    "profiling",
+    "batch",
+    "rollup",
+    "sampling",
 ]
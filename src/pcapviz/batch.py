@@ -0,0 +1,340 @@
+"""Batch analysis of many captures, with merged results.
+
+``run_batch`` analyses every capture of a directory or glob (rotated files,
+say) in a pool of worker processes. Each file is streamed on its own
+(``streaming.stream_pcap``, bounded memory) and only its ``StreamingStats`` is
+kept: the mergeable per-pair, per-port, per-time-bucket and flow aggregates.
+Workers save these partials next to the outputs and a manifest records each
+file's fingerprint (``cache.file_fingerprint``), so later runs skip files
+that did not change and read only new or modified ones. The combined outputs
+come from merging the partials of all matched files, without reading their
+packets again; flows spanning files are joined as in a single capture.
+
+    python -m src.pcapviz.batch '/data/rotated/*.pcap' --out-dir out --workers 8
+
+Files are independent, so throughput grows with the worker count until the
+disks saturate; the largest files are started first to balance the pool.
+Partials are pickles: only reuse output directories you trust.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from .cache import file_fingerprint
+from .cli import CREDIT, add_filter_arguments, add_graph_arguments, filter_options, graph_reductions, write_graph_html
+from .graph import export_graphml
+from .ipset import IPSet
+from .parser import FilterOptions
+from .streaming import StreamingStats, stream_pcap
+
+MANIFEST_VERSION = 3  # bump when the pickled StreamingStats partials change
+MANIFEST_NAME = "batch_manifest.json"
+PARTIALS_DIR = "partials"
+
+# Files picked from a directory; globs and explicit paths are taken as they are.
+CAPTURE_SUFFIXES = tuple(
+    base + ext for base in (".pcap", ".pcapng", ".cap") for ext in ("", ".gz", ".bz2", ".xz", ".zst")
+)
+
+
+def find_captures(sources: Iterable[str]) -> list[str]:
+    """Absolute paths of the captures in ``sources`` (directories, globs or files), sorted per source, without duplicates."""
+    paths: list[str] = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = sorted(
+                os.path.join(source, name)
+                for name in os.listdir(source)
+                if name.endswith(CAPTURE_SUFFIXES) and os.path.isfile(os.path.join(source, name))
+            )
+        elif glob.has_magic(source):
+            found = sorted(p for p in glob.glob(source) if os.path.isfile(p))
+        else:
+            found = [source]
+        paths.extend(os.path.abspath(p) for p in found)
+    return list(dict.fromkeys(paths))
+
+
+def _ips_key(ips) -> Optional[list[str]]:
+    if ips is None:
+        return None
+    return (ips if isinstance(ips, IPSet) else IPSet(ips)).networks()
+
+
+@dataclass(frozen=True)
+class BatchOptions:
+    """How each file is analysed; partials made with other options are not reused."""
+
+    filters: Optional[FilterOptions] = None
+    engine: str = "native"
+    throughput_rule: str = "1S"
+    epsilon: Optional[float] = None
+    max_packets: Optional[int] = None  # per file
+
+    def key(self) -> dict:
+        """JSON description compared against the manifest."""
+        f = self.filters or FilterOptions()
+        return {
+            "engine": self.engine,
+            "throughput_rule": self.throughput_rule,
+            "epsilon": self.epsilon,
+            "max_packets": self.max_packets,
+            "filters": {
+                "include_ips": _ips_key(f.include_ips),
+                "exclude_ips": _ips_key(f.exclude_ips),
+                "protocols": None if f.protocols is None else sorted(f.protocols),
+                "src_ports": None if f.src_ports is None else sorted(int(p) for p in f.src_ports),
+                "dst_ports": None if f.dst_ports is None else sorted(int(p) for p in f.dst_ports),
+                "time_start": None if f.time_start is None else str(f.time_start),
+                "time_end": None if f.time_end is None else str(f.time_end),
+            },
+        }
+
+
+@dataclass
+class BatchResult:
+    """Merged stats of all matched files, and what happened to each of them."""
+
+    stats: StreamingStats
+    processed: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)  # unchanged since an earlier run
+    failed: dict[str, str] = field(default_factory=dict)  # path -> error
+
+
+def _partial_name(path: str) -> str:
+    return hashlib.blake2b(path.encode(), digest_size=12).hexdigest() + ".pkl"
+
+
+def _load_manifest(path: Path, options: dict) -> dict:
+    """The manifest at ``path``, or an empty one if it is missing or was made with other options."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        manifest = None
+    if not manifest or manifest.get("version") != MANIFEST_VERSION or manifest.get("options") != options:
+        manifest = {"version": MANIFEST_VERSION, "options": options, "files": {}}
+    return manifest
+
+
+def _save_json(doc: dict, path: Path) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(doc, fh, indent=2)
+        fh.write("\n")
+    os.replace(tmp, path)
+
+
+def analyse_file(path: str, partial_path: str, options: BatchOptions) -> dict:
+    """Worker: stream one capture, save its ``StreamingStats`` to ``partial_path``; returns its manifest entry."""
+    started = time.perf_counter()
+    stats = stream_pcap(
+        path,
+        max_packets=options.max_packets,
+        filters=options.filters,
+        engine=options.engine,
+        throughput_rule=options.throughput_rule,
+        epsilon=options.epsilon,
+    )
+    tmp = partial_path + ".tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(stats, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, partial_path)
+    return {
+        "packets": stats.packets,
+        "bytes": stats.bytes,
+        "time_min": None if stats.time_min is None else stats.time_min.isoformat(),
+        "time_max": None if stats.time_max is None else stats.time_max.isoformat(),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_batch(
+    paths: list[str],
+    out_dir: Path,
+    options: Optional[BatchOptions] = None,
+    workers: int = 1,
+    manifest_path: Optional[Path] = None,
+    force: bool = False,
+    on_file: Optional[Callable[[str, Optional[dict], Optional[str]], None]] = None,
+) -> BatchResult:
+    """Analyse ``paths`` (skipping files unchanged since the manifest) and merge all their partials.
+
+    ``on_file(path, entry, error)`` is called as each file finishes. ``force``
+    re-reads every file. Failed files are reported and left out of the merge
+    (and retried next time).
+    """
+    options = options or BatchOptions()
+    out_dir = Path(out_dir)
+    partials = out_dir / PARTIALS_DIR
+    partials.mkdir(parents=True, exist_ok=True)
+    manifest_path = Path(manifest_path) if manifest_path is not None else out_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_path, options.key())
+    files = manifest["files"]
+    result = BatchResult(StreamingStats(options.throughput_rule, epsilon=options.epsilon))
+
+    todo = []
+    for path in paths:
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError as exc:
+            result.failed[path] = str(exc)
+            if on_file is not None:
+                on_file(path, None, str(exc))
+            continue
+        entry = files.get(path)
+        if not force and entry and entry["fingerprint"] == fingerprint and (partials / entry["partial"]).exists():
+            result.skipped.append(path)
+        else:
+            todo.append((path, fingerprint))
+
+    def finished(path: str, fingerprint: str, entry: Optional[dict], error: Optional[str]) -> None:
+        if error is not None:
+            files.pop(path, None)
+            result.failed[path] = error
+        else:
+            files[path] = {
+                "fingerprint": fingerprint,
+                "partial": _partial_name(path),
+                "processed": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+                **entry,
+            }
+            result.processed.append(path)
+        _save_json(manifest, manifest_path)
+        if on_file is not None:
+            on_file(path, entry, error)
+
+    # largest first, so a big file does not start last and hold up the pool
+    todo.sort(key=lambda item: -os.path.getsize(item[0]))
+    if workers <= 1 or len(todo) <= 1:
+        for path, fingerprint in todo:
+            try:
+                entry = analyse_file(path, str(partials / _partial_name(path)), options)
+            except Exception as exc:  # a broken capture must not stop the batch
+                finished(path, fingerprint, None, f"{type(exc).__name__}: {exc}")
+            else:
+                finished(path, fingerprint, entry, None)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = {
+                pool.submit(analyse_file, path, str(partials / _partial_name(path)), options): (path, fingerprint)
+                for path, fingerprint in todo
+            }
+            for future in as_completed(futures):
+                path, fingerprint = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as exc:
+                    finished(path, fingerprint, None, f"{type(exc).__name__}: {exc}")
+                else:
+                    finished(path, fingerprint, entry, None)
+
+    for path in paths:
+        if path in result.failed:
+            continue
+        with open(partials / files[path]["partial"], "rb") as fh:
+            result.stats.merge(pickle.load(fh))
+    # partials of files dropped from the manifest (e.g. after an options change)
+    referenced = {entry["partial"] for entry in files.values()}
+    for leftover in partials.glob("*.pkl"):
+        if leftover.name not in referenced:
+            leftover.unlink()
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=f"Analyse many captures and merge the results — {CREDIT}")
+    parser.add_argument("sources", nargs="+", help="Capture files, directories or quoted globs (e.g. '/data/*.pcap')")
+    parser.add_argument("--out-dir", type=Path, default=Path("out"), help="Output directory (also holds the partials)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, one file each (0 = one per CPU)")
+    parser.add_argument("--manifest", type=Path, help=f"Manifest of processed files (default: OUT_DIR/{MANIFEST_NAME})")
+    parser.add_argument("--force", action="store_true", help="Re-read every file, even if the manifest lists it")
+    parser.add_argument("--max-packets", type=int, default=0, help="Limit packets parsed per file (0 = no limit)")
+    parser.add_argument("--throughput", default="1S", help="Throughput interval (a fixed interval, e.g. 1S or 1min)")
+    parser.add_argument(
+        "--engine", choices=["native", "scapy"], default="native", help="Packet decoder (see pcapviz.cli --engine)"
+    )
+    parser.add_argument(
+        "--approx", type=float, metavar="EPSILON", help="Heavy-hitter sketches for hosts and ports (see pcapviz.cli --approx)"
+    )
+    parser.add_argument(
+        "--conversations",
+        choices=["csv", "parquet"],
+        help="Also write the merged sparse conversation matrix as (src_ip, dst_ip, bytes, packets) triplets",
+    )
+    add_graph_arguments(parser)
+    add_filter_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = find_captures(args.sources)
+    if not paths:
+        parser.error("no captures found")
+    options = BatchOptions(
+        filters=filter_options(parser, args),
+        engine=args.engine,
+        throughput_rule=args.throughput,
+        epsilon=args.approx,
+        max_packets=args.max_packets or None,
+    )
+
+    def report(path: str, entry: Optional[dict], error: Optional[str]) -> None:
+        if error is not None:
+            print(f"{path}: failed: {error}", file=sys.stderr)
+        else:
+            print(f"{path}: {entry['packets']} packets in {entry['seconds']:.1f}s", file=sys.stderr)
+
+    started = time.perf_counter()
+    result = run_batch(
+        paths,
+        args.out_dir,
+        options,
+        workers=args.workers or os.cpu_count() or 1,
+        manifest_path=args.manifest,
+        force=args.force,
+        on_file=report,
+    )
+    stats = result.stats
+    out = args.out_dir
+    stats.flows().to_csv(out / "flows.csv", index=False)
+    stats.top_talkers().to_csv(out / "top_talkers.csv", index=False)
+    stats.protocol_breakdown().to_csv(out / "protocols.csv", index=False)
+    stats.throughput().to_csv(out / "throughput.csv", index=False)
+    stats.top_ports().to_csv(out / "top_ports.csv", index=False)
+    G = stats.host_graph(**graph_reductions(args))
+    write_graph_html(G, out / "graph.html", args)
+    export_graphml(G, str(out / "graph.graphml"))
+    written = "flows.csv, top_talkers.csv, protocols.csv, throughput.csv, top_ports.csv, graph.html, graph.graphml"
+    if args.conversations:
+        conversations = stats.sparse_conversation_matrix()
+        conv_path = out / f"conversations.{args.conversations}"
+        if args.conversations == "parquet":
+            conversations.to_parquet(conv_path)
+        else:
+            conversations.to_csv(conv_path)
+        written += f", {conv_path.name}"
+
+    print(CREDIT, file=sys.stderr)
+    print(
+        f"{len(result.processed)} files read, {len(result.skipped)} unchanged, {len(result.failed)} failed; "
+        f"{stats.packets} packets in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+    print(f"Wrote to {out}: {written}", file=sys.stderr)
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,281 @@
+"""Benchmarks of the analysis pipeline, with regression gates.
+
+Times each stage separately (parsing, flow building, every metric, graph
+construction, HTML rendering and GraphML export) on a deterministic
+``synth`` capture or an existing file, and records the best of ``--repeat``
+runs, packets per second and the stage's peak traced memory (``tracemalloc``,
+measured in one extra run so it does not slow the timed ones). Results are
+written as JSON; given a ``--baseline`` (an earlier results file for the same
+workload) the run fails with exit status 1 if a stage got slower or used more
+memory than the thresholds allow.
+
+    python -m src.pcapviz.bench --packets 1000000 --out bench.json
+    python -m src.pcapviz.bench --packets 1000000 --baseline bench.json --threshold 0.15
+
+Runs offline; needs nothing beyond the package requirements.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import __version__
+from .graph import build_host_graph, export_graphml, to_pyvis_html
+from .metrics import (
+    compute_protocol_breakdown,
+    compute_throughput,
+    compute_top_ports,
+    compute_top_talkers,
+    sparse_conversation_matrix,
+)
+from .parser import build_flows, parse_pcap
+from .render import to_html
+from .synth import SynthSpec, add_spec_arguments, spec_from_args, write_capture
+
+RESULTS_VERSION = 1
+DEFAULT_REPEAT = 3
+DEFAULT_TIME_THRESHOLD = 0.2  # allowed slowdown: 20%
+DEFAULT_MEMORY_THRESHOLD = 0.2
+DEFAULT_MIN_DELTA = 0.01  # seconds; smaller slowdowns are timer noise
+
+
+def _graphml(ctx: dict) -> None:
+    fd, path = tempfile.mkstemp(suffix=".graphml")
+    os.close(fd)
+    try:
+        export_graphml(ctx["graph"], path)
+    finally:
+        os.remove(path)
+
+
+# (name, stage) in pipeline order; a stage reads its inputs from ``ctx`` and stores its output there.
+STAGES: list[tuple[str, Callable[[dict], None]]] = [
+    ("parse_pcap", lambda ctx: ctx.update(zip(("packets", "flows"), parse_pcap(ctx["pcap"])))),
+    ("build_flows", lambda ctx: ctx.update(flows=build_flows(ctx["packets"]))),
+    ("top_talkers", lambda ctx: compute_top_talkers(ctx["packets"], n=10)),
+    ("protocol_breakdown", lambda ctx: compute_protocol_breakdown(ctx["packets"])),
+    ("top_ports", lambda ctx: compute_top_ports(ctx["packets"], n=10)),
+    ("throughput", lambda ctx: compute_throughput(ctx["packets"], rule="1s")),
+    ("conversation_matrix", lambda ctx: sparse_conversation_matrix(ctx["packets"])),
+    ("build_host_graph", lambda ctx: ctx.update(graph=build_host_graph(ctx["packets"]))),
+    ("to_pyvis_html", lambda ctx: to_pyvis_html(ctx["graph"])),
+    ("render_html", lambda ctx: to_html(ctx["graph"])),
+    ("export_graphml", _graphml),
+]
+STAGE_NAMES = [name for name, _ in STAGES]
+
+
+def _peak_traced_mb(stage: Callable[[dict], None], ctx: dict) -> float:
+    tracemalloc.start()
+    try:
+        stage(ctx)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(
+    pcap_path: str,
+    repeat: int = DEFAULT_REPEAT,
+    stages: Optional[list[str]] = None,
+    memory: bool = True,
+) -> dict:
+    """Time the pipeline stages on ``pcap_path``; returns the per-stage results.
+
+    Stages that others depend on (parsing, graph building) always run, but only
+    the selected ones are reported.
+    """
+    selected = set(STAGE_NAMES if stages is None else stages)
+    ctx: dict = {"pcap": pcap_path}
+    results = {}
+    needed = {"parse_pcap"}
+    if selected & {"to_pyvis_html", "render_html", "export_graphml"}:
+        needed.add("build_host_graph")
+    for name, stage in STAGES:
+        if name not in selected:
+            if name in needed:
+                stage(ctx)
+            continue
+        times = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            stage(ctx)
+            times.append(time.perf_counter() - started)
+        packets = len(ctx["packets"])
+        best = min(times)
+        results[name] = {
+            "seconds": best,
+            "median_seconds": float(np.median(times)),
+            "packets_per_s": packets / best if best > 0 else None,
+            "peak_mb": _peak_traced_mb(stage, ctx) if memory else None,
+        }
+    return results
+
+
+def benchmark(
+    spec: Optional[SynthSpec] = None,
+    pcap_path: Optional[str] = None,
+    repeat: int = DEFAULT_REPEAT,
+    stages: Optional[list[str]] = None,
+    memory: bool = True,
+) -> dict:
+    """Benchmark an existing capture, or a synthetic one generated from ``spec``; returns the results document."""
+    if pcap_path is not None:
+        workload = {"pcap": os.path.abspath(pcap_path), "size": os.path.getsize(pcap_path)}
+        stage_results = run_benchmarks(pcap_path, repeat, stages, memory)
+    else:
+        spec = spec or SynthSpec()
+        workload = {"synth": asdict(spec)}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.pcapng" if spec.pcapng else "bench.pcap")
+            write_capture(path, spec)
+            stage_results = run_benchmarks(path, repeat, stages, memory)
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "pcapviz": __version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "created": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "repeat": repeat,
+            # process peak RSS (ru_maxrss is in KiB on Linux)
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        "workload": workload,
+        "stages": stage_results,
+    }
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    threshold: float = DEFAULT_TIME_THRESHOLD,
+    memory_threshold: float = DEFAULT_MEMORY_THRESHOLD,
+    stage_thresholds: Optional[dict[str, float]] = None,
+    min_delta: float = DEFAULT_MIN_DELTA,
+) -> list[str]:
+    """Regressions of ``results`` against ``baseline``, one message each (empty if none).
+
+    A stage regresses when its best time exceeds the baseline by more than its
+    threshold (and by more than ``min_delta`` seconds), or its peak memory by
+    more than ``memory_threshold``. Raises ValueError if the workloads differ.
+    """
+    if results.get("workload") != baseline.get("workload"):
+        raise ValueError("Baseline was recorded on a different workload; regenerate it with the same options")
+    stage_thresholds = stage_thresholds or {}
+    regressions = []
+    for name, now in results["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before is None:
+            continue
+        limit = stage_thresholds.get(name, threshold)
+        slower = now["seconds"] - before["seconds"]
+        if slower > min_delta and now["seconds"] > before["seconds"] * (1 + limit):
+            regressions.append(
+                f"{name}: {now['seconds']:.3f}s vs {before['seconds']:.3f}s "
+                f"(+{slower / before['seconds']:.0%}, limit {limit:.0%})"
+            )
+        if now.get("peak_mb") is not None and before.get("peak_mb"):
+            if now["peak_mb"] > before["peak_mb"] * (1 + memory_threshold):
+                regressions.append(
+                    f"{name}: peak {now['peak_mb']:.1f} MB vs {before['peak_mb']:.1f} MB "
+                    f"(+{now['peak_mb'] / before['peak_mb'] - 1:.0%}, limit {memory_threshold:.0%})"
+                )
+    return regressions
+
+
+def _report(results: dict, baseline: Optional[dict]) -> None:
+    same_workload = baseline is not None and baseline.get("workload") == results["workload"]
+    base = baseline.get("stages", {}) if same_workload else {}
+    print(f"{'stage':<20} {'seconds':>9} {'packets/s':>12} {'peak MB':>9} {'vs base':>8}", file=sys.stderr)
+    for name, r in results["stages"].items():
+        pps = f"{r['packets_per_s']:,.0f}" if r["packets_per_s"] else "-"
+        peak = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        change = f"{r['seconds'] / base[name]['seconds'] - 1:+.0%}" if base.get(name, {}).get("seconds") else ""
+        print(f"{name:<20} {r['seconds']:>9.3f} {pps:>12} {peak:>9} {change:>8}", file=sys.stderr)
+
+
+def _stage_threshold(text: str) -> tuple[str, float]:
+    name, sep, value = text.partition("=")
+    if not sep or name not in STAGE_NAMES:
+        raise argparse.ArgumentTypeError(f"expected STAGE=FRACTION with a stage from {', '.join(STAGE_NAMES)}")
+    return name, float(value)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PCAPViz pipeline stages")
+    parser.add_argument("--pcap", help="Benchmark this capture instead of a synthetic one")
+    parser.add_argument("--pcapng", action="store_true", help="Generate the synthetic capture as pcapng")
+    add_spec_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per stage (the best counts)")
+    parser.add_argument("--stages", nargs="*", choices=STAGE_NAMES, help="Stages to report (default: all)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_TIME_THRESHOLD, help="Allowed slowdown per stage (0.2 = 20%%)"
+    )
+    parser.add_argument(
+        "--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD, help="Allowed peak memory growth per stage"
+    )
+    parser.add_argument(
+        "--stage-threshold",
+        action="append",
+        type=_stage_threshold,
+        default=[],
+        metavar="STAGE=FRACTION",
+        help="Allowed slowdown for one stage, overriding --threshold; repeatable",
+    )
+    parser.add_argument(
+        "--min-delta", type=float, default=DEFAULT_MIN_DELTA, help="Ignore slowdowns smaller than this many seconds"
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    try:
+        spec = None if args.pcap else spec_from_args(args, pcapng=args.pcapng)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    results = benchmark(spec, args.pcap, args.repeat, args.stages, memory=not args.no_memory)
+    _report(results, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+            fh.write("\n")
+    if baseline is None:
+        return 0
+    try:
+        regressions = compare(
+            results, baseline, args.threshold, args.memory_threshold, dict(args.stage_threshold), args.min_delta
+        )
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
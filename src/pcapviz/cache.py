@@ -0,0 +1,156 @@
+"""Persistent cache of parsed captures.
+
+``ParseCache`` stores the unfiltered packet and flow tables of a capture as
+Parquet files in a cache directory, keyed on the capture's size, mtime and a
+content hash plus ``parser.PARSER_VERSION`` and the parse engine.
+``parse_pcap_cached`` serves filters and ``max_packets`` from the cached table,
+so re-analysing a capture skips decoding entirely. The cache is bounded in size; the least recently used
+entries are evicted first.
+
+Parquet I/O needs ``pyarrow`` (installed with Streamlit).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+from .columns import concat_packet_frames
+from .index import CaptureIndex
+from .parser import PARSER_VERSION, FilterOptions, ParseProgress, apply_filters, build_flows, parse_pcap
+from .sampling import SampleOptions
+
+# Captures up to this size are hashed whole; larger ones by evenly spaced samples.
+_HASH_WHOLE_LIMIT = 8 << 20
+_HASH_SAMPLES = 32
+_HASH_SAMPLE_SIZE = 256 << 10
+
+_TABLES = ("packets", "flows")
+
+
+def file_fingerprint(pcap_path: str) -> str:
+    """Identity of a capture file: size, mtime and a (sampled) blake2b hash of its content."""
+    st = os.stat(pcap_path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{PARSER_VERSION}:{st.st_size}:{st.st_mtime_ns}:".encode())
+    with open(pcap_path, "rb") as f:
+        if st.st_size <= _HASH_WHOLE_LIMIT:
+            h.update(f.read())
+        else:
+            step = (st.st_size - _HASH_SAMPLE_SIZE) // (_HASH_SAMPLES - 1)
+            for i in range(_HASH_SAMPLES):
+                f.seek(i * step)
+                h.update(f.read(_HASH_SAMPLE_SIZE))
+    return h.hexdigest()
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise ImportError("The parse cache stores Parquet files and needs pyarrow (pip install pyarrow)") from exc
+
+
+class ParseCache:
+    """Size-bounded directory of parsed capture tables.
+
+    Each entry is ``<key>.packets.parquet`` + ``<key>.flows.parquet``. Hits touch
+    the entry's mtime, which serves as the LRU clock for eviction.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = 2 << 30) -> None:
+        _require_pyarrow()
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _paths(self, key: str) -> list[Path]:
+        return [self.cache_dir / f"{key}.{table}.parquet" for table in _TABLES]
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """Return the cached (packets_df, flows_df) for ``key``, or None."""
+        paths = self._paths(key)
+        if not all(p.exists() for p in paths):
+            return None
+        try:
+            packets_df, flows_df = (pd.read_parquet(p) for p in paths)
+        except Exception:
+            # a damaged entry is dropped and re-parsed
+            self._remove(key)
+            return None
+        now = time.time()
+        for p in paths:
+            os.utime(p, (now, now))
+        return packets_df, flows_df
+
+    def put(self, key: str, packets_df: pd.DataFrame, flows_df: pd.DataFrame) -> None:
+        """Store the tables for ``key``, then evict old entries beyond ``max_bytes``."""
+        for path, df in zip(self._paths(key), (packets_df, flows_df)):
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        self.evict(keep=key)
+
+    def _remove(self, key: str) -> None:
+        for p in self._paths(key):
+            p.unlink(missing_ok=True)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Drop least recently used entries until the cache fits in ``max_bytes``."""
+        entries: dict[str, list] = {}
+        for p in self.cache_dir.glob("*.parquet"):
+            key = p.name.split(".", 1)[0]
+            st = p.stat()
+            entry = entries.setdefault(key, [0, 0.0])
+            entry[0] += st.st_size
+            entry[1] = max(entry[1], st.st_mtime)
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+
+
+def parse_pcap_cached(
+    pcap_path: str,
+    cache: ParseCache,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    workers: int = 1,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
+    index: Optional[CaptureIndex] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """``parse_pcap`` through ``cache``.
+
+    The full, unfiltered capture is parsed and cached on a miss; filters and
+    max_packets are then applied to the cached packet table and the flows rebuilt
+    from the selection, giving the same result as a direct filtered parse.
+    ``progress`` only reports the parse of a miss, and ``index`` only speeds it
+    up. Each engine, and each ``sample``, is cached as an entry of its own
+    (sampling does not depend on the filters).
+    """
+    key = f"{file_fingerprint(pcap_path)}-{engine}"
+    if sample is not None:
+        key = f"{key}-{sample.key}"
+    cached = cache.get(key)
+    if cached is None:
+        cached = parse_pcap(pcap_path, engine=engine, workers=workers, progress=progress, sample=sample, index=index)
+        cache.put(key, *cached)
+    packets_df, flows_df = cached
+    if filters is None and (max_packets is None or max_packets >= len(packets_df)):
+        return packets_df, flows_df
+    selected = apply_filters(packets_df, filters)
+    if max_packets is not None:
+        selected = selected.iloc[:max_packets]
+    packets_df = concat_packet_frames([selected])
+    return packets_df, build_flows(packets_df)
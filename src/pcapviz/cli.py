@@ -1,80 +1,429 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
+import time
+from itertools import chain
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 
 from .parser import parse_pcap, FilterOptions
-from .metrics import compute_top_talkers, compute_protocol_breakdown, compute_throughput, compute_top_ports
-from .graph import build_host_graph, to_pyvis_html, export_graphml
+from .cache import ParseCache, parse_pcap_cached
+from .index import ensure_index
+from .ipset import IPSet, read_ip_list
+from .streaming import StreamingStats, stream_pcap
+from .follow import CaptureFollower, FollowUpdate, follow_capture
+from .flows import DEFAULT_ACTIVE_TIMEOUT, DEFAULT_MAX_FLOWS, FlowTable
+from .columns import empty_packets_frame, string_view
+from .metrics import (
+    compute_top_talkers,
+    compute_protocol_breakdown,
+    compute_throughput,
+    compute_top_ports,
+    sparse_conversation_matrix,
+)
+from .graph import SubnetMap, build_host_graph, export_graphml
+from .profiling import Profiler, ProgressPrinter
+from .render import DEFAULT_MAX_EDGES, DEFAULT_MAX_NODES, to_html
+from .sampling import SAMPLE_MODES, SampleOptions, sample_rate
 
 CREDIT = "© 2025 JDRockfeller (Off-set)"
 
+_FLOW_CHUNK = 65536
 
-def main(argv: list[str] | None = None) -> int:
-    parser = argparse.ArgumentParser(description=f"PCAP parser and visualizer — {CREDIT}")
-    parser.add_argument("pcap", help="Path to pcap/pcapng file")
-    parser.add_argument("--max-packets", type=int, default=0, help="Limit packets parsed (0 = no limit)")
-    parser.add_argument("--out-dir", type=Path, default=Path("out"), help="Output directory")
-    parser.add_argument("--throughput", default="1S", help="Resample rule for throughput")
+
+def _append_csv(df: pd.DataFrame, fh) -> None:
+    """Append rows to an open CSV file, writing the header first if the file is empty."""
+    df.to_csv(fh, header=fh.tell() == 0, index=False)
+
+
+def _report_update(update: FollowUpdate, stats: StreamingStats) -> None:
+    """One status line per --follow update; latency covers reading, decoding and refreshing top talkers."""
+    started = time.monotonic()
+    top = stats.top_talkers(1)
+    latency = update.latency_s + time.monotonic() - started
+    leader = f", top {top['ip'].iloc[0]} ({int(top['bytes'].iloc[0])} B)" if not top.empty else ""
+    print(
+        f"{update.path}: +{update.packets} packets, {stats.packets} total{leader}, update {latency * 1000:.0f} ms",
+        file=sys.stderr,
+    )
+
+
+def _ip_filter(ips: Optional[list[str]], files: Optional[list[Path]]) -> Optional[IPSet]:
+    """Addresses/prefixes from the command line plus those of the list files; None if neither is given."""
+    if ips is None and not files:
+        return None
+    return IPSet(chain(ips or [], *(read_ip_list(p) for p in files or [])))
+
+
+def add_graph_arguments(parser: argparse.ArgumentParser) -> None:
+    """Graph reduction and render budget options (see ``graph_reductions``)."""
     parser.add_argument("--min-bytes", type=int, default=0, help="Min bytes threshold for edges in graph")
-    parser.add_argument("--include-ips", nargs="*", help="Only include traffic where src or dst in list")
-    parser.add_argument("--exclude-ips", nargs="*", help="Exclude traffic where src or dst in list")
+    parser.add_argument(
+        "--render-max-nodes",
+        type=int,
+        default=DEFAULT_MAX_NODES,
+        help="Render budget of graph.html: nodes with the most traffic kept (0 = all; GraphML keeps everything)",
+    )
+    parser.add_argument(
+        "--render-max-edges", type=int, default=DEFAULT_MAX_EDGES, help="Render budget of graph.html: heaviest edges kept (0 = all)"
+    )
+    parser.add_argument("--top-nodes", type=int, help="Keep only edges between the N nodes with the most traffic")
+    parser.add_argument("--top-edges", type=int, help="Keep only the N heaviest edges in the graph")
+    parser.add_argument("--collapse-v4", type=int, metavar="PREFIX", help="Collapse IPv4 hosts into /PREFIX subnet nodes (e.g. 24)")
+    parser.add_argument("--collapse-v6", type=int, metavar="PREFIX", help="Collapse IPv6 hosts into /PREFIX subnet nodes (e.g. 64)")
+    parser.add_argument("--collapse-cidr", nargs="*", metavar="CIDR", help="Collapse hosts inside these networks into one node each")
+
+
+def graph_reductions(args: argparse.Namespace) -> dict:
+    """``build_host_graph`` reduction keywords from the ``add_graph_arguments`` options."""
+    subnets = None
+    if args.collapse_v4 is not None or args.collapse_v6 is not None or args.collapse_cidr:
+        subnets = SubnetMap(args.collapse_v4, args.collapse_v6, args.collapse_cidr or ())
+    return dict(min_bytes=args.min_bytes, top_nodes=args.top_nodes, top_edges=args.top_edges, subnets=subnets)
+
+
+def write_graph_html(G, path: Path, args: argparse.Namespace) -> None:
+    """Render ``G`` within the ``add_graph_arguments`` budget."""
+    html = to_html(G, max_nodes=args.render_max_nodes or None, max_edges=args.render_max_edges or None)
+    path.write_text(html, encoding="utf-8")
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    """Packet filter options (see ``filter_options``)."""
+    parser.add_argument(
+        "--include-ips", nargs="*", help="Only include traffic where src or dst matches an address or CIDR prefix in list"
+    )
+    parser.add_argument("--exclude-ips", nargs="*", help="Exclude traffic where src or dst matches an address or CIDR prefix")
+    parser.add_argument(
+        "--ip-list-file",
+        action="append",
+        type=Path,
+        metavar="PATH",
+        help="Add the addresses/prefixes in this file (one per line, # comments) to --include-ips; repeatable",
+    )
+    parser.add_argument(
+        "--exclude-ip-list-file",
+        action="append",
+        type=Path,
+        metavar="PATH",
+        help="Add the addresses/prefixes in this file to --exclude-ips (e.g. a blocklist feed); repeatable",
+    )
     parser.add_argument("--protocols", nargs="*", help="Filter protocols, e.g., TCP UDP")
     parser.add_argument("--src-ports", nargs="*", type=int, help="Filter by source ports")
     parser.add_argument("--dst-ports", nargs="*", type=int, help="Filter by destination ports")
     parser.add_argument("--start", help="Start time (UTC ISO)")
     parser.add_argument("--end", help="End time (UTC ISO)")
 
-    args = parser.parse_args(argv)
-
-    args.out_dir.mkdir(parents=True, exist_ok=True)
-
-    start_ts = pd.to_datetime(args.start, utc=True) if args.start else None
-    end_ts = pd.to_datetime(args.end, utc=True) if args.end else None
 
-    filters = FilterOptions(
-        include_ips=args.include_ips,
-        exclude_ips=args.exclude_ips,
+def filter_options(parser: argparse.ArgumentParser, args: argparse.Namespace) -> FilterOptions:
+    """``FilterOptions`` from the ``add_filter_arguments`` options; bad addresses or list files are usage errors."""
+    try:
+        include_ips = _ip_filter(args.include_ips, args.ip_list_file)
+        exclude_ips = _ip_filter(args.exclude_ips, args.exclude_ip_list_file)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    return FilterOptions(
+        include_ips=include_ips,
+        exclude_ips=exclude_ips,
         protocols=args.protocols,
         src_ports=args.src_ports,
         dst_ports=args.dst_ports,
-        time_start=start_ts,
-        time_end=end_ts,
+        time_start=pd.to_datetime(args.start, utc=True) if args.start else None,
+        time_end=pd.to_datetime(args.end, utc=True) if args.end else None,
     )
 
-    packets_df, flows_df = parse_pcap(
-        str(args.pcap),
-        max_packets=(None if args.max_packets == 0 else args.max_packets),
-        filters=filters,
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=f"PCAP parser and visualizer — {CREDIT}")
+    parser.add_argument("pcap", help="Path to pcap/pcapng file (with --follow: a path or quoted glob of rotated files)")
+    parser.add_argument("--max-packets", type=int, default=0, help="Limit packets parsed (0 = no limit)")
+    parser.add_argument("--out-dir", type=Path, default=Path("out"), help="Output directory")
+    parser.add_argument("--throughput", default="1S", help="Resample rule for throughput")
+    add_graph_arguments(parser)
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "--engine",
+        choices=["native", "scapy"],
+        default="native",
+        help="Packet decoder: native header decoder (default) or full Scapy dissection",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Parser processes; large captures are split into byte ranges (1 = serial, 0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Build or reuse a sidecar index (<pcap>.pvidx) to read only blocks matching the time/protocol filters",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Single pass with constant memory: aggregate packets in chunks instead of building the packet table "
+        "(serial; --workers and --cache-dir are not used; --throughput must be a fixed interval)",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep reading a capture that is still being written (and its rotated successors), updating metrics "
+        "every --interval seconds; outputs are written on Ctrl-C or after --follow-seconds "
+        "(--max-packets, --workers, --index and --sample cannot be used)",
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="With --follow: seconds between reads")
+    parser.add_argument("--follow-seconds", type=float, help="With --follow: stop after this many seconds")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="Export NetFlow-style flow records to flows.csv: a flow ends after this many idle seconds, "
+        "on TCP FIN/RST or at --active-timeout (default: one flow per 5-tuple over the whole capture)",
+    )
+    parser.add_argument(
+        "--active-timeout",
+        type=float,
+        default=DEFAULT_ACTIVE_TIMEOUT,
+        help="With --idle-timeout: split flows lasting longer than this many seconds (0 = never)",
+    )
+    parser.add_argument(
+        "--max-flows",
+        type=int,
+        default=DEFAULT_MAX_FLOWS,
+        help="With --idle-timeout: cap on concurrently tracked flows; unanswered flows are evicted first",
     )
+    parser.add_argument(
+        "--conversations",
+        choices=["csv", "parquet"],
+        help="Also write the sparse conversation matrix as (src_ip, dst_ip, bytes, packets) triplets",
+    )
+    parser.add_argument(
+        "--approx",
+        type=float,
+        metavar="EPSILON",
+        help="Estimate top talkers, top ports and graph edges with fixed-size heavy-hitter sketches "
+        "(error at most EPSILON x total bytes, e.g. 0.001); outputs get a bytes_error column",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        metavar="N",
+        help="Fast preview: keep about 1 in N flows (or packets, see --sample-mode), chosen by a deterministic hash; "
+        "metrics and the graph are scaled by N and marked with a sample_rate column/attribute",
+    )
+    parser.add_argument(
+        "--sample-mode",
+        choices=SAMPLE_MODES,
+        default="flow",
+        help="With --sample: 'flow' keeps whole flows (by their direction-agnostic 5-tuple), "
+        "'packet' keeps single packets and skips the others before decoding them",
+    )
+    parser.add_argument("--sample-seed", type=int, default=0, help="With --sample: picks a different sample")
+    parser.add_argument("--cache-dir", type=Path, help="Cache parsed captures as Parquet in this directory")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="Size limit of the parse cache in MB")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Time every stage (wall/CPU time, rows, rows/s, peak RSS), print a summary and write it as JSON "
+        "to PATH (default: OUT_DIR/profile.json); implies --progress",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        type=Path,
+        metavar="PATH",
+        help="Run the stages under cProfile and write the stats of the slowest one to PATH (read with python -m pstats)",
+    )
+    parser.add_argument("--progress", action="store_true", help="Print parsing progress (packets, rate, ETA) to stderr")
+
+    args = parser.parse_args(argv)
+    if args.follow:
+        for option, given in (("--max-packets", args.max_packets), ("--workers", args.workers != 1), ("--index", args.index)):
+            if given:
+                parser.error(f"{option} cannot be used with --follow")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    filters = filter_options(parser, args)
+    sample = None
+    if args.sample is not None:
+        if args.follow:
+            parser.error("--sample cannot be used with --follow")
+        try:
+            sample = SampleOptions(args.sample, args.sample_mode, args.sample_seed)
+        except ValueError as exc:
+            parser.error(str(exc))
+    rate = sample_rate(sample)
+
+    max_packets = None if args.max_packets == 0 else args.max_packets
+    index = None
+    if args.index:
+        try:
+            index = ensure_index(str(args.pcap))
+        except ValueError as exc:
+            print(f"Not using an index: {exc}", file=sys.stderr)
 
     packets_csv = args.out_dir / "packets.csv"
     flows_csv = args.out_dir / "flows.csv"
-    packets_df.to_csv(packets_csv, index=False)
-    flows_df.to_csv(flows_csv, index=False)
-
     top_csv = args.out_dir / "top_talkers.csv"
     proto_csv = args.out_dir / "protocols.csv"
     thr_csv = args.out_dir / "throughput.csv"
     ports_csv = args.out_dir / "top_ports.csv"
-    compute_top_talkers(packets_df).to_csv(top_csv, index=False)
-    compute_protocol_breakdown(packets_df).to_csv(proto_csv, index=False)
-    compute_throughput(packets_df, rule=args.throughput).to_csv(thr_csv, index=False)
-    compute_top_ports(packets_df).to_csv(ports_csv, index=False)
 
-    G = build_host_graph(packets_df, min_bytes=args.min_bytes)
-    html = to_pyvis_html(G)
-    (args.out_dir / "graph.html").write_text(html, encoding="utf-8")
-    export_graphml(G, str(args.out_dir / "graph.graphml"))
+    reductions = graph_reductions(args)
+
+    flow_table = None
+    if args.idle_timeout is not None:
+        flow_table = FlowTable(
+            idle_timeout=args.idle_timeout,
+            active_timeout=args.active_timeout or None,
+            max_flows=args.max_flows,
+        )
+
+    profiler = Profiler(cprofile=args.profile_dump is not None)
+    progress = ProgressPrinter() if args.progress or args.profile is not None else None
+
+    if args.streaming or args.follow:
+        # packets.csv (and flows.csv with a flow table) are appended chunk by chunk;
+        # only aggregates and active flows are kept in memory
+        with open(packets_csv, "w", newline="", encoding="utf-8") as fh, open(
+            flows_csv, "w", newline="", encoding="utf-8"
+        ) as flows_fh, profiler.stage("follow" if args.follow else "stream") as st:
+
+            def write_chunk(chunk: pd.DataFrame) -> None:
+                string_view(chunk).to_csv(fh, header=fh.tell() == 0, index=False)
+                if flow_table is not None:
+                    _append_csv(flow_table.update(chunk), flows_fh)
+
+            if args.follow:
+                stats = StreamingStats(args.throughput, flows=flow_table is None, epsilon=args.approx)
+                follower = CaptureFollower(str(args.pcap), filters=filters, engine=args.engine)
+                try:
+                    follow_capture(
+                        follower,
+                        stats,
+                        on_update=lambda update: _report_update(update, stats),
+                        on_chunk=write_chunk,
+                        interval=args.interval,
+                        duration=args.follow_seconds,
+                    )
+                except KeyboardInterrupt:
+                    pass
+            else:
+                stats = stream_pcap(
+                    str(args.pcap),
+                    max_packets=max_packets,
+                    filters=filters,
+                    engine=args.engine,
+                    index=index,
+                    throughput_rule=args.throughput,
+                    on_chunk=write_chunk,
+                    flows=flow_table is None,
+                    epsilon=args.approx,
+                    progress=progress,
+                    sample=sample,
+                )
+            if not stats.packets:
+                string_view(empty_packets_frame()).to_csv(fh, index=False)
+            _append_csv(flow_table.flush() if flow_table is not None else stats.flows(), flows_fh)
+            st.rows_out = stats.packets
+        n_packets = stats.packets
+        with profiler.stage("top_talkers", n_packets):
+            stats.top_talkers().to_csv(top_csv, index=False)
+        with profiler.stage("protocol_breakdown", n_packets):
+            stats.protocol_breakdown().to_csv(proto_csv, index=False)
+        with profiler.stage("throughput", n_packets):
+            stats.throughput().to_csv(thr_csv, index=False)
+        with profiler.stage("top_ports", n_packets):
+            stats.top_ports().to_csv(ports_csv, index=False)
+        with profiler.stage("build_host_graph", n_packets) as st:
+            G = stats.host_graph(**reductions)
+            st.rows_out = G.number_of_edges()
+        if args.conversations:
+            with profiler.stage("conversation_matrix", n_packets) as st:
+                conversations = stats.sparse_conversation_matrix()
+                st.rows_out = conversations.nnz
+    else:
+        parse_args = dict(
+            max_packets=max_packets,
+            filters=filters,
+            engine=args.engine,
+            workers=args.workers or os.cpu_count() or 1,
+            progress=progress,
+            sample=sample,
+        )
+        with profiler.stage("parse_pcap") as st:
+            if args.cache_dir is not None:
+                cache = ParseCache(args.cache_dir, max_bytes=args.cache_max_mb << 20)
+                packets_df, flows_df = parse_pcap_cached(str(args.pcap), cache, index=index, **parse_args)
+            else:
+                packets_df, flows_df = parse_pcap(str(args.pcap), index=index, **parse_args)
+            st.rows_out = len(packets_df)
+        n_packets = len(packets_df)
+
+        with profiler.stage("write_packets_csv", n_packets):
+            string_view(packets_df).to_csv(packets_csv, index=False)
+        if flow_table is not None:
+            with profiler.stage("flow_table", n_packets), open(flows_csv, "w", newline="", encoding="utf-8") as flows_fh:
+                for start in range(0, len(packets_df), _FLOW_CHUNK):
+                    _append_csv(flow_table.update(packets_df.iloc[start:start + _FLOW_CHUNK]), flows_fh)
+                _append_csv(flow_table.flush(), flows_fh)
+        else:
+            with profiler.stage("write_flows_csv", len(flows_df)):
+                flows_df.to_csv(flows_csv, index=False)
+        with profiler.stage("top_talkers", n_packets):
+            compute_top_talkers(packets_df, epsilon=args.approx, sample_rate=rate).to_csv(top_csv, index=False)
+        with profiler.stage("protocol_breakdown", n_packets):
+            compute_protocol_breakdown(packets_df, sample_rate=rate).to_csv(proto_csv, index=False)
+        with profiler.stage("throughput", n_packets):
+            compute_throughput(packets_df, rule=args.throughput, sample_rate=rate).to_csv(thr_csv, index=False)
+        with profiler.stage("top_ports", n_packets):
+            compute_top_ports(packets_df, epsilon=args.approx, sample_rate=rate).to_csv(ports_csv, index=False)
+        with profiler.stage("build_host_graph", n_packets) as st:
+            G = build_host_graph(packets_df, epsilon=args.approx, sample_rate=rate, **reductions)
+            st.rows_out = G.number_of_edges()
+        if args.conversations:
+            with profiler.stage("conversation_matrix", n_packets) as st:
+                conversations = sparse_conversation_matrix(packets_df)
+                st.rows_out = conversations.nnz
+
+    with profiler.stage("render_html", G.number_of_edges()):
+        write_graph_html(G, args.out_dir / "graph.html", args)
+    with profiler.stage("export_graphml", G.number_of_edges()):
+        export_graphml(G, str(args.out_dir / "graph.graphml"))
+
+    written = f"{packets_csv}, {flows_csv}, {top_csv}, {proto_csv}, {thr_csv}, {ports_csv}, graph.html, graph.graphml"
+    if args.conversations:
+        conv_path = args.out_dir / f"conversations.{args.conversations}"
+        with profiler.stage("export_conversations", conversations.nnz):
+            if args.conversations == "parquet":
+                conversations.to_parquet(conv_path)
+            else:
+                conversations.to_csv(conv_path)
+        written += f", {conv_path}"
+
+    if args.profile is not None:
+        profile_path = Path(args.profile) if args.profile else args.out_dir / "profile.json"
+        profiler.print_summary()
+        profiler.write_json(profile_path, command=sys.argv if argv is None else ["pcapviz", *argv])
+        written += f", {profile_path}"
+    if args.profile_dump is not None:
+        stage = profiler.dump_hottest(args.profile_dump)
+        print(f"cProfile stats of the slowest stage ({stage}): {args.profile_dump}", file=sys.stderr)
+        written += f", {args.profile_dump}"
 
     print(CREDIT, file=sys.stderr)
-    print(
-        f"Wrote: {packets_csv}, {flows_csv}, {top_csv}, {proto_csv}, {thr_csv}, {ports_csv}, graph.html, graph.graphml",
-        file=sys.stderr,
-    )
+    if sample is not None:
+        print(
+            f"Sampled about 1 in {rate} {sample.mode}s ({n_packets} packets kept): packets.csv and flows.csv hold "
+            f"the sample, the other outputs are estimates scaled by {rate}",
+            file=sys.stderr,
+        )
+    print(f"Wrote: {written}", file=sys.stderr)
     return 0
 
 
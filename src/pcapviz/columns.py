@@ -0,0 +1,329 @@
+"""Columnar packet table with compact dtypes.
+
+``PacketTableBuilder`` fills growable typed numpy buffers chunk by chunk instead
+of keeping one Python dict per packet. The resulting ``packets_df`` uses:
+
+- timestamp: datetime64[ns, UTC]               8 bytes
+- src_ip, dst_ip: categorical (int8-int32 codes)  up to 4 + 4 bytes
+- src_port, dst_port: UInt16 + null mask        3 + 3 bytes
+- protocol: categorical (int8 codes)            1 byte
+- length: uint32                                4 bytes
+- ip_version, ttl: uint8                        1 + 1 bytes
+- tcp_flags: UInt16 bitmask + null mask         3 bytes
+
+That is at most 32 bytes per packet (``BYTES_PER_PACKET``) plus one string per
+distinct address, so a 50M-packet capture needs about 1.6 GB for the packet table. tcp_flags keeps
+9 bits (FSRPAUECN, as Scapy reports them); use ``string_view`` to get text
+IPs and flag strings such as "SA" on demand.
+"""
+
+from __future__ import annotations
+
+import socket
+from itertools import islice
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .decoder import tcp_flags_str
+
+PACKET_COLUMNS = [
+    "timestamp",
+    "src_ip",
+    "dst_ip",
+    "src_port",
+    "dst_port",
+    "protocol",
+    "length",
+    "ip_version",
+    "ttl",
+    "tcp_flags",
+]
+
+# Field order of the record tuples fed to PacketTableBuilder.append
+RECORD_FIELDS = (
+    "timestamp",
+    "length",
+    "src_ip",
+    "dst_ip",
+    "src_port",
+    "dst_port",
+    "protocol",
+    "ip_version",
+    "ttl",
+    "tcp_flags",
+)
+
+BYTES_PER_PACKET = 32
+
+_FLAG_LABELS = np.asarray([tcp_flags_str(mask) for mask in range(1 << 9)] + [None], dtype=object)
+
+
+def ip_text(addr) -> str:
+    """Text form of a packed (4 or 16 byte) address; strings pass through."""
+    if isinstance(addr, str):
+        return addr
+    return socket.inet_ntop(socket.AF_INET if len(addr) == 4 else socket.AF_INET6, addr)
+
+
+class _Interner:
+    """Map addresses (packed bytes or text) and protocol names to dense integer codes."""
+
+    def __init__(self, to_text=str) -> None:
+        self.codes: dict = {}
+        self.names: list[str] = []
+        self._by_name: dict[str, int] = {}
+        self._to_text = to_text
+
+    def code(self, key) -> int:
+        code = self.codes.get(key)
+        if code is None:
+            name = self._to_text(key)
+            code = self._by_name.get(name)
+            if code is None:
+                code = self._by_name[name] = len(self.names)
+                self.names.append(name)
+            self.codes[key] = code
+        return code
+
+    def encode(self, keys: Iterable) -> list[int]:
+        codes = self.codes
+        get = codes.get
+        out = [get(k) for k in keys]
+        if None in out:
+            for key in set(keys).difference(codes):
+                self.code(key)
+            out = [codes[k] for k in keys]
+        return out
+
+    def sorted_codes(self) -> tuple[np.ndarray, list[str]]:
+        """Return (old code -> new code remap, names sorted) so categories follow string order."""
+        order = np.argsort(np.asarray(self.names, dtype=object), kind="stable")
+        remap = np.empty(len(self.names), dtype=np.int32)
+        remap[order] = np.arange(len(self.names), dtype=np.int32)
+        return remap, [self.names[i] for i in order]
+
+
+class PacketTableBuilder:
+    """Accumulate packet records into compact typed columns.
+
+    Records are ``RECORD_FIELDS`` tuples; addresses may be packed bytes or text and
+    tcp_flags is a bitmask or None. Records are buffered in chunks of ``chunk_size``
+    and then copied into numpy buffers that grow in place.
+    """
+
+    def __init__(self, chunk_size: int = 65536, capacity: int = 0) -> None:
+        self.chunk_size = chunk_size
+        self._chunk: list[tuple] = []
+        self._n = 0
+        self._ips = _Interner(ip_text)
+        self._protocols = _Interner()
+        capacity = max(int(capacity), chunk_size)
+        self._cols = {
+            "timestamp": np.empty(capacity, dtype=np.float64),
+            "src_ip": np.empty(capacity, dtype=np.int32),
+            "dst_ip": np.empty(capacity, dtype=np.int32),
+            "src_port": np.empty(capacity, dtype=np.uint16),
+            "dst_port": np.empty(capacity, dtype=np.uint16),
+            "protocol": np.empty(capacity, dtype=np.int8),
+            "length": np.empty(capacity, dtype=np.uint32),
+            "ip_version": np.empty(capacity, dtype=np.uint8),
+            "ttl": np.empty(capacity, dtype=np.uint8),
+            "tcp_flags": np.empty(capacity, dtype=np.uint16),
+            "has_ports": np.empty(capacity, dtype=bool),
+            "has_flags": np.empty(capacity, dtype=bool),
+        }
+
+    def __len__(self) -> int:
+        return self._n + len(self._chunk)
+
+    def append(self, record: tuple) -> None:
+        self._chunk.append(record)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, records: Iterable[tuple]) -> None:
+        records = iter(records)
+        while True:
+            self._chunk.extend(islice(records, self.chunk_size - len(self._chunk)))
+            if len(self._chunk) < self.chunk_size:
+                return
+            self.flush()
+
+    def flush(self) -> None:
+        """Move buffered records into the typed column buffers."""
+        chunk = self._chunk
+        if not chunk:
+            return
+        k = len(chunk)
+        start, end = self._n, self._n + k
+        self._reserve(end)
+        cols = self._cols
+        ts, length, src, dst, sport, dport, proto, ver, ttl, flags = zip(*chunk)
+        cols["timestamp"][start:end] = ts
+        cols["length"][start:end] = length
+        cols["src_ip"][start:end] = self._ips.encode(src)
+        cols["dst_ip"][start:end] = self._ips.encode(dst)
+        cols["src_port"][start:end] = [0 if p is None else p for p in sport]
+        cols["dst_port"][start:end] = [0 if p is None else p for p in dport]
+        cols["has_ports"][start:end] = [p is not None for p in sport]
+        cols["protocol"][start:end] = self._protocols.encode(proto)
+        cols["ip_version"][start:end] = ver
+        cols["ttl"][start:end] = ttl
+        cols["tcp_flags"][start:end] = [0 if f is None else f for f in flags]
+        cols["has_flags"][start:end] = [f is not None for f in flags]
+        self._n = end
+        self._chunk = []
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._cols["timestamp"])
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2)
+        for arr in self._cols.values():
+            arr.resize(new_capacity, refcheck=False)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the packets table. The buffers are handed over, so call this once."""
+        self.flush()
+        n = self._n
+        if n == 0:
+            return empty_packets_frame()
+        cols = self._cols
+        for arr in cols.values():
+            arr.resize(n, refcheck=False)
+
+        remap, names = self._ips.sorted_codes()
+        ip_dtype = pd.CategoricalDtype(pd.Index(names, dtype=object))
+        proto_remap, proto_names = self._protocols.sorted_codes()
+        proto_dtype = pd.CategoricalDtype(pd.Index(proto_names, dtype=object))
+        has_ports = cols["has_ports"]
+        no_ports = ~has_ports
+
+        df = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(cols["timestamp"], unit="s", utc=True),
+                "src_ip": pd.Categorical.from_codes(remap[cols["src_ip"]], dtype=ip_dtype),
+                "dst_ip": pd.Categorical.from_codes(remap[cols["dst_ip"]], dtype=ip_dtype),
+                "src_port": pd.arrays.IntegerArray(cols["src_port"], no_ports),
+                "dst_port": pd.arrays.IntegerArray(cols["dst_port"], no_ports.copy()),
+                "protocol": pd.Categorical.from_codes(proto_remap[cols["protocol"]].astype(np.int8), dtype=proto_dtype),
+                "length": cols["length"],
+                "ip_version": cols["ip_version"],
+                "ttl": cols["ttl"],
+                "tcp_flags": pd.arrays.IntegerArray(cols["tcp_flags"], ~cols["has_flags"]),
+            }
+        )
+        return df
+
+
+def ipv4_packets_frame(fields: dict) -> pd.DataFrame:
+    """Packets table of IPv4 TCP/UDP rows given as arrays (see ``decoder.decode_ipv4_batch``).
+
+    Categories are built from the distinct addresses in string order, as
+    ``PacketTableBuilder`` does.
+    """
+    src, dst = fields["src"], fields["dst"]
+    if not len(src):
+        return empty_packets_frame()
+    addrs = np.unique(np.concatenate([src, dst]))
+    packed = addrs.astype(">u4").tobytes()
+    names = np.asarray([socket.inet_ntoa(packed[i:i + 4]) for i in range(0, len(packed), 4)], dtype=object)
+    order = np.argsort(names, kind="stable")
+    rank = np.empty(len(addrs), dtype=np.int32)
+    rank[order] = np.arange(len(addrs), dtype=np.int32)
+    ip_dtype = pd.CategoricalDtype(pd.Index(names[order], dtype=object))
+
+    proto = fields["protocol"]
+    is_tcp = proto == 6
+    proto_names = [name for name, present in (("TCP", is_tcp.any()), ("UDP", (~is_tcp).any())) if present]
+    proto_codes = np.where(is_tcp, 0, len(proto_names) - 1).astype(np.int8)
+    n = len(src)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(fields["timestamp"], unit="s", utc=True),
+            "src_ip": pd.Categorical.from_codes(rank[np.searchsorted(addrs, src)], dtype=ip_dtype),
+            "dst_ip": pd.Categorical.from_codes(rank[np.searchsorted(addrs, dst)], dtype=ip_dtype),
+            "src_port": pd.arrays.IntegerArray(fields["src_port"].astype(np.uint16), np.zeros(n, dtype=bool)),
+            "dst_port": pd.arrays.IntegerArray(fields["dst_port"].astype(np.uint16), np.zeros(n, dtype=bool)),
+            "protocol": pd.Categorical.from_codes(proto_codes, dtype=pd.CategoricalDtype(pd.Index(proto_names, dtype=object))),
+            "length": fields["length"].astype(np.uint32),
+            "ip_version": np.full(n, 4, dtype=np.uint8),
+            "ttl": fields["ttl"].astype(np.uint8),
+            "tcp_flags": pd.arrays.IntegerArray(fields["tcp_flags"].astype(np.uint16), ~is_tcp),
+        }
+    )
+
+
+def empty_packets_frame() -> pd.DataFrame:
+    """Empty packets table with the compact dtypes."""
+    ip_dtype = pd.CategoricalDtype(pd.Index([], dtype=object))
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Series([], dtype="datetime64[ns, UTC]"),
+            "src_ip": pd.Series([], dtype=ip_dtype),
+            "dst_ip": pd.Series([], dtype=ip_dtype),
+            "src_port": pd.Series([], dtype="UInt16"),
+            "dst_port": pd.Series([], dtype="UInt16"),
+            "protocol": pd.Series([], dtype=pd.CategoricalDtype(pd.Index([], dtype=object))),
+            "length": pd.Series([], dtype=np.uint32),
+            "ip_version": pd.Series([], dtype=np.uint8),
+            "ttl": pd.Series([], dtype=np.uint8),
+            "tcp_flags": pd.Series([], dtype="UInt16"),
+        }
+    )
+
+
+def concat_packet_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate packet tables row-wise, keeping the compact dtypes.
+
+    Categories are merged (and those no row uses dropped) so the result matches
+    a table built from all the rows at once.
+    """
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return empty_packets_frame()
+    out = {}
+    for col in PACKET_COLUMNS:
+        values = [f[col] for f in frames]
+        if isinstance(values[0].dtype, pd.CategoricalDtype):
+            out[col] = union_categoricals([v.array for v in values], sort_categories=True).remove_unused_categories()
+        else:
+            out[col] = pd.concat(values, ignore_index=True)
+    ips = out["src_ip"].categories.union(out["dst_ip"].categories)
+    out["src_ip"] = out["src_ip"].set_categories(ips)
+    out["dst_ip"] = out["dst_ip"].set_categories(ips)
+    return pd.DataFrame(out)
+
+
+def tcp_flags_labels(flags: pd.Series) -> pd.Series:
+    """String view of a tcp_flags bitmask column ('SA', 'PA', ...; None where not TCP)."""
+    codes = flags.fillna(len(_FLAG_LABELS) - 1).to_numpy(dtype=np.int64)
+    return pd.Series(_FLAG_LABELS[codes], index=flags.index, name=flags.name)
+
+
+def take_rows(packets_df: pd.DataFrame, rows: Optional[np.ndarray], columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """The packets at positions ``rows`` (all of them if None), with only ``columns``.
+
+    Gathers just the requested columns, so a ``query.PacketIndex`` selection is
+    not materialized as a full packets table; with ``rows=None`` the table is
+    returned as is.
+    """
+    if rows is None:
+        return packets_df
+    columns = list(packets_df.columns) if columns is None else columns
+    return pd.DataFrame({col: packets_df[col].array.take(rows) for col in columns}, columns=columns)
+
+
+def string_view(packets_df: pd.DataFrame) -> pd.DataFrame:
+    """Return packets_df with text IPs/protocol and tcp_flags rendered as flag strings, for display and CSV."""
+    out = packets_df.copy()
+    for col in ("src_ip", "dst_ip", "protocol"):
+        if col in out and isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(object)
+    if "tcp_flags" in out and pd.api.types.is_integer_dtype(out["tcp_flags"].dtype):
+        out["tcp_flags"] = tcp_flags_labels(out["tcp_flags"])
+    return out
+
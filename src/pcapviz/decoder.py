@@ -0,0 +1,765 @@
+"""Native pcap/pcapng reader and header decoder.
+
+Reads capture records directly and pulls out only the fields PCAPViz emits
+(addresses, ports, TTL/hlim, TCP flags, length, timestamp) without building
+Scapy packets. Frames whose dissection by Scapy would not be a plain
+Ethernet/VLAN -> IPv4/IPv6 -> TCP/UDP chain (tunnels, ICMP errors, IP options,
+IPv6 extension headers, truncated headers, ...) are reported as
+``SCAPY_FALLBACK`` so the caller can dissect that one record with Scapy and
+still produce exactly the same row.
+
+Captures compressed with gzip, bzip2, xz or zstd are recognised by their
+magic bytes and decompressed on the fly (``DecompressedStream``), so they
+are never unpacked to disk.
+"""
+
+from __future__ import annotations
+
+import bz2
+import io
+import lzma
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from functools import partial
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+# Scapy's PcapReader truncates every record to this many bytes.
+MTU = 0xFFFF
+
+DLT_EN10MB = 1
+DLT_RAW_ALT = 12
+DLT_RAW = 101
+DLT_LINUX_SLL = 113
+DLT_IPV4 = 228
+DLT_IPV6 = 229
+
+# Returned by decode_frame when only a full Scapy dissection gives the right row.
+SCAPY_FALLBACK = object()
+
+# (src, dst, src_port, dst_port, protocol, ip_version, ttl, tcp_flags); addresses are packed bytes
+Decoded = Tuple[bytes, bytes, Optional[int], Optional[int], str, int, int, Optional[int]]
+
+PCAP_MAGICS = {
+    b"\xa1\xb2\xc3\xd4": (">", False),
+    b"\xd4\xc3\xb2\xa1": ("<", False),
+    b"\xa1\xb2\x3c\x4d": (">", True),
+    b"\x4d\x3c\xb2\xa1": ("<", True),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+GZIP_MAGIC = b"\x1f\x8b"
+BZIP2_MAGIC = b"BZh"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSION_MAGIC_SIZE = len(XZ_MAGIC)  # leading bytes capture_compression needs
+
+# A capture file's path, or its contents in memory.
+CaptureSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview]
+
+_READ_SIZE = 1 << 20
+_COMPRESSED_READ = 1 << 20  # compressed bytes read at a time
+_PREFETCH_CHUNKS = 16  # decompressed chunks a DecompressedStream may hold ahead of its reader
+
+# Ethertypes whose Scapy dissection may contain an IP layer we don't decode (jumbo LLC, PPPoE, 6LoWPAN)
+_ETH_FALLBACK = frozenset({0x8864, 0x8870, 0xA0ED})
+_SLL_FALLBACK = frozenset({0x0001, 0x007A, 0x8864, 0x88A8})
+_VLAN_TYPES = frozenset({0x8100, 0x88A8})
+
+# IP protocols Scapy dissects into another IP/TCP/UDP layer (IP-in-IP, 6in4, GRE, AH)
+_IP_TUNNEL_PROTOS = frozenset({4, 41, 47, 51})
+# IPv6 next headers that cannot lead to another IP/TCP/UDP layer in Scapy
+_IPV6_OPAQUE_NH = frozenset({50, 59, 89, 103, 112, 132})
+_IPV6_DECODED_NH = _IPV6_OPAQUE_NH | {6, 17, 58}
+_ICMP_ERROR_TYPES = frozenset({3, 4, 5, 11, 12})
+_ICMPV6_NESTED_TYPES = frozenset({1, 2, 3, 4, 137})
+# UDP ports Scapy binds to encapsulations carrying inner IP packets (L2TP, VXLAN)
+_UDP_TUNNEL_PORTS = frozenset({1701, 4789, 4790, 6633, 8472, 48879})
+
+_u16 = struct.Struct("!H").unpack_from
+_u16x2 = struct.Struct("!HH").unpack_from
+
+TCP_FLAG_NAMES = "FSRPAUECN"
+_FLAG_STRINGS = [
+    "".join(name for bit, name in enumerate(TCP_FLAG_NAMES) if mask >> bit & 1) for mask in range(1 << len(TCP_FLAG_NAMES))
+]
+
+
+def tcp_flags_str(mask: int) -> str:
+    """Render a TCP flags bitmask the way Scapy's ``FlagValue.flagrepr`` does (e.g. 0x12 -> 'SA')."""
+    return _FLAG_STRINGS[mask & 0x1FF]
+
+
+_FLAG_MASKS = {name: mask for mask, name in enumerate(_FLAG_STRINGS)}
+
+
+def tcp_flags_mask(flags: Optional[str]) -> Optional[int]:
+    """Inverse of ``tcp_flags_str``: 'SA' -> 0x12. None and unknown strings map to None."""
+    if flags is None:
+        return None
+    return _FLAG_MASKS.get(flags)
+
+
+def capture_compression(head: bytes) -> Optional[str]:
+    """Compression of a capture starting with ``head`` (its first bytes): "gzip", "bzip2", "xz", "zstd" or None."""
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(BZIP2_MAGIC):
+        return "bzip2"
+    if head.startswith(XZ_MAGIC):
+        return "xz"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def is_path(source: CaptureSource) -> bool:
+    """Whether ``source`` names a capture file rather than holding its contents."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def open_capture(source: CaptureSource) -> BinaryIO:
+    """Open a capture (a path, or its bytes) for reading.
+
+    Compressed captures, recognised by their magic bytes whatever the file is
+    called, come back as a ``DecompressedStream`` of their contents.
+    """
+    f: BinaryIO = open(source, "rb") if is_path(source) else io.BytesIO(source)
+    compression = capture_compression(f.read(COMPRESSION_MAGIC_SIZE))
+    f.seek(0)
+    if compression is None:
+        return f
+    try:
+        return DecompressedStream(f, compression)
+    except BaseException:
+        f.close()
+        raise
+
+
+def _inflate(raw: BinaryIO, new_decompressor: Callable[[], object]) -> Iterator[bytes]:
+    """Decompressed chunks of at most ``_READ_SIZE`` bytes of ``raw``.
+
+    Concatenated streams (e.g. appended gzip members) are read one after the
+    other; zero padding between them is skipped.
+    """
+    d = new_decompressor()
+    fresh = True
+    while True:
+        data = raw.read(_COMPRESSED_READ)
+        if not data:
+            return
+        while True:
+            if fresh:
+                data = data.lstrip(b"\0")
+                if not data:
+                    break
+                fresh = False
+            out = d.decompress(data, _READ_SIZE)
+            if out:
+                yield out
+            if d.eof:
+                data = d.unused_data
+                d, fresh = new_decompressor(), True
+                continue
+            # zlib hands back the input it had no room for; bz2 and lzma keep it until they need more
+            data = getattr(d, "unconsumed_tail", b"")
+            if not data and getattr(d, "needs_input", True):
+                break
+
+
+def _zstd_chunks(raw: BinaryIO) -> Iterator[bytes]:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError("Reading zstd-compressed captures requires the 'zstandard' package (pip install zstandard)") from exc
+    reader = zstandard.ZstdDecompressor().stream_reader(raw, read_size=_COMPRESSED_READ, read_across_frames=True)
+    return iter(partial(reader.read, _READ_SIZE), b"")
+
+
+def _decompressed_chunks(raw: BinaryIO, compression: str) -> Iterator[bytes]:
+    if compression == "gzip":
+        return _inflate(raw, partial(zlib.decompressobj, zlib.MAX_WBITS | 16))
+    if compression == "bzip2":
+        return _inflate(raw, bz2.BZ2Decompressor)
+    if compression == "xz":
+        return _inflate(raw, lzma.LZMADecompressor)
+    if compression == "zstd":
+        return _zstd_chunks(raw)
+    raise ValueError(f"Unknown compression: {compression!r}")
+
+
+class DecompressedStream:
+    """Read-only stream of a compressed capture's contents, decompressed ahead of the reader.
+
+    A background thread reads ``raw`` in large blocks and queues up to
+    ``_PREFETCH_CHUNKS`` decompressed chunks; zlib, bz2, lzma and zstandard
+    release the GIL while they work, so decompression overlaps with decoding
+    the records already read. Errors of the thread are raised by ``read``. A
+    truncated stream ends where its data does. Closing the stream closes ``raw``.
+    """
+
+    def __init__(self, raw: BinaryIO, compression: str) -> None:
+        self.compression = compression
+        self.name = getattr(raw, "name", None)
+        self._raw = raw
+        self._queue: queue.Queue = queue.Queue(_PREFETCH_CHUNKS)
+        self._closing = threading.Event()
+        self._buf = b""
+        self._pos = 0
+        self._offset = 0
+        self._eof = False
+        self.closed = False
+        chunks = _decompressed_chunks(raw, compression)
+        self._thread = threading.Thread(target=self._fill, args=(chunks,), name="pcapviz-decompress", daemon=True)
+        self._thread.start()
+
+    def _fill(self, chunks: Iterator[bytes]) -> None:
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+            self._put(b"")
+        except BaseException as exc:
+            self._put(exc)
+
+    def _put(self, item) -> bool:
+        while not self._closing.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        """Up to ``size`` bytes (all that is left if negative); fewer only at the end of the stream."""
+        parts = []
+        wanted = size
+        while wanted != 0:
+            if self._pos >= len(self._buf):
+                if self._eof:
+                    break
+                item = self._queue.get()
+                if isinstance(item, BaseException):
+                    self._eof = True
+                    raise item
+                if not item:
+                    self._eof = True
+                    break
+                self._buf, self._pos = item, 0
+            take = len(self._buf) - self._pos if wanted < 0 else min(wanted, len(self._buf) - self._pos)
+            if self._pos == 0 and take == len(self._buf):
+                parts.append(self._buf)
+            else:
+                parts.append(self._buf[self._pos:self._pos + take])
+            self._pos += take
+            if wanted > 0:
+                wanted -= take
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        self._offset += len(data)
+        return data
+
+    def tell(self) -> int:
+        """Offset in the decompressed capture."""
+        return self._offset
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._closing.set()
+        self._thread.join()
+        self._raw.close()
+
+    def __enter__(self) -> "DecompressedStream":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _refill(f: BinaryIO, buf: bytes, pos: int, need: int) -> bytes:
+    """Return the unread tail of ``buf`` extended with reads from ``f`` to at least ``need`` bytes (or EOF)."""
+    data = buf[pos:]
+    while len(data) < need:
+        chunk = f.read(max(_READ_SIZE, need - len(data)))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+@dataclass(frozen=True)
+class CaptureRange:
+    """Records starting in the byte range ``[start, end)`` (``end=None``: to EOF), with the reader state at ``start``."""
+
+    start: int
+    end: Optional[int]
+    pcapng: bool
+    endian: str
+    nano: bool = False
+    linktype: int = 0
+    interfaces: Tuple[Tuple[int, int, int], ...] = ()  # pcapng (linktype, snaplen, tsresol)
+
+
+class ReadState:
+    """Reader state shared with the caller: format, file offset of the current record, pcapng interfaces."""
+
+    __slots__ = ("pcapng", "endian", "nano", "linktype", "offset", "interfaces", "untimed")
+
+    def __init__(self) -> None:
+        self.pcapng = False
+        self.endian = "<"
+        self.nano = False
+        self.linktype = 0
+        self.offset = 0
+        self.interfaces: list[Tuple[int, int, int]] = []
+        self.untimed = 0  # records stamped with the read time (pcapng simple packet blocks)
+
+
+def iter_records(
+    f: BinaryIO, state: Optional[ReadState] = None, complete: bool = False
+) -> Iterator[Tuple[float, int, bytes, int, int]]:
+    """Yield ``(timestamp, linktype, buf, offset, caplen)`` for every record of a pcap or pcapng stream.
+
+    The frame bytes are ``buf[offset:offset + caplen]``; ``buf`` is shared between
+    records and must not be kept. Raises ValueError if the stream is neither format.
+    A truncated last record is yielded with what is left of it, as Scapy does, unless
+    ``complete`` is set (for captures still being written): reading then stops at
+    it, and ``state.offset`` is where to resume.
+    """
+    state = ReadState() if state is None else state
+    magic = f.read(4)
+    if magic in PCAP_MAGICS:
+        state.endian, state.nano = PCAP_MAGICS[magic]
+        header = f.read(20)
+        if len(header) < 20:
+            raise ValueError("Invalid pcap file (too short)")
+        state.linktype = struct.unpack(state.endian + "HHIIII", header)[5]
+        state.offset = 24
+        return _iter_pcap(f, b"", 24, None, state, complete=complete)
+    if magic == PCAPNG_MAGIC:
+        state.pcapng = True
+        return _iter_pcapng(f, PCAPNG_MAGIC, 0, None, state)
+    raise ValueError(f"Not a pcap/pcapng capture (bad magic: {magic!r})")
+
+
+def iter_range(
+    f: BinaryIO, rng: CaptureRange, mapped=None, state: Optional[ReadState] = None, complete: bool = False
+) -> Iterator[Tuple[float, int, bytes, int, int]]:
+    """Like ``iter_records``, for the records of one ``CaptureRange``.
+
+    ``mapped`` may hold the whole (uncompressed) file, e.g. an ``mmap`` of ``f``;
+    records are then read from it in place instead of through ``f``.
+    """
+    state = ReadState() if state is None else state
+    state.pcapng, state.endian, state.nano, state.linktype = rng.pcapng, rng.endian, rng.nano, rng.linktype
+    state.interfaces = list(rng.interfaces)
+    if mapped is not None:
+        f.seek(len(mapped))  # reads past the mapping (truncated last record) hit EOF
+        buf, base, pos = mapped, 0, rng.start
+    else:
+        f.seek(rng.start)
+        buf, base, pos = b"", rng.start, 0
+    if rng.pcapng:
+        return _iter_pcapng(f, buf, base, rng.end, state, pos)
+    return _iter_pcap(f, buf, base, rng.end, state, pos, complete)
+
+
+def split_capture(pcap_path: str, parts: int, min_part_size: int = _READ_SIZE) -> list[CaptureRange]:
+    """Split a capture into up to ``parts`` ranges of whole records of roughly equal size.
+
+    Record boundaries (and the pcapng interface state at each one) are found with
+    one sequential pass over the records. Compressed captures cannot be read from
+    an offset cheaply and always come back as a single range.
+    """
+    with open_capture(pcap_path) as f:
+        state = ReadState()
+        records = iter_records(f, state)
+        if isinstance(f, DecompressedStream):
+            parts = 1
+        size = os.path.getsize(pcap_path)
+        parts = max(1, min(parts, size // max(1, min_part_size)))
+        targets = [size * i // parts for i in range(parts - 1, 0, -1)]  # popped from the end
+        ranges = []
+        start = state.offset
+        endian = state.endian
+        interfaces: Tuple[Tuple[int, int, int], ...] = ()
+        for _record in records:
+            if not targets:
+                break
+            if state.offset >= targets[-1]:
+                ranges.append(CaptureRange(start, state.offset, state.pcapng, endian, state.nano, state.linktype, interfaces))
+                start = state.offset
+                endian = state.endian
+                interfaces = tuple(state.interfaces)
+                while targets and targets[-1] <= start:
+                    targets.pop()
+        ranges.append(CaptureRange(start, None, state.pcapng, endian, state.nano, state.linktype, interfaces))
+    return ranges
+
+
+def _iter_pcap(
+    f: BinaryIO, buf: bytes, base: int, end: Optional[int], state: ReadState, pos: int = 0, complete: bool = False
+) -> Iterator[Tuple[float, int, bytes, int, int]]:
+    # buf[pos] is the next record and buf[0] is at file offset base; records starting at or after end are left alone
+    rec = struct.Struct(state.endian + "IIII").unpack_from
+    div = 1_000_000_000 if state.nano else 1_000_000
+    linktype = state.linktype
+
+    while True:
+        state.offset = base + pos
+        if end is not None and state.offset >= end:
+            return
+        if len(buf) - pos < 16:
+            buf = _refill(f, buf, pos, 16)
+            base += pos
+            pos = 0
+            if len(buf) < 16:
+                return
+        sec, frac, caplen, _wirelen = rec(buf, pos)
+        pos += 16
+        if len(buf) - pos < caplen:
+            buf = _refill(f, buf, pos, caplen)
+            base += pos
+            pos = 0
+            if complete and len(buf) - pos < caplen:
+                return
+        # exact integer division matches Scapy's Decimal timestamp after float()
+        yield (sec * div + frac) / div, linktype, buf, pos, min(caplen, len(buf) - pos, MTU)
+        pos += caplen
+
+
+def _read_options(endian: str, buf: bytes, pos: int, end: int) -> int:
+    """Return the if_tsresol found in a pcapng option list (default microseconds), parsed as Scapy does."""
+    tsresol = 1_000_000
+    head = struct.Struct(endian + "HH").unpack_from
+    while end - pos >= 4:
+        code, length = head(buf, pos)
+        if code == 9 and length == 1 and end - pos >= 5:
+            value = buf[pos + 4]
+            tsresol = (2 if value & 128 else 10) ** (value & 127)
+        if code == 1 and length >= 1 and 4 + length < end - pos:
+            if buf.find(b"\n", pos + 4, pos + 4 + length) == -1:
+                break
+        if code == 0:
+            break
+        pos += 4 + length + (-length % 4)
+    return tsresol
+
+
+def _iter_pcapng(
+    f: BinaryIO, buf: bytes, base: int, end: Optional[int], state: ReadState, pos: int = 0
+) -> Iterator[Tuple[float, int, bytes, int, int]]:
+    # buf[pos] is the next block and buf[0] is at file offset base; blocks starting at or after end are left alone
+    endian = state.endian
+    interfaces = state.interfaces  # (linktype, snaplen, tsresol)
+    while True:
+        state.offset = base + pos
+        if end is not None and state.offset >= end:
+            return
+        if len(buf) - pos < 12:
+            buf = _refill(f, buf, pos, 12)
+            base += pos
+            pos = 0
+            if len(buf) < 8:
+                return
+        if buf[pos:pos + 4] == PCAPNG_MAGIC:
+            if len(buf) - pos < 12:
+                return
+            bom = buf[pos + 8:pos + 12]
+            if bom == b"\x1a\x2b\x3c\x4d":
+                endian = ">"
+            elif bom == b"\x4d\x3c\x2b\x1a":
+                endian = "<"
+            else:
+                return
+            state.endian = endian
+            blocklen = struct.unpack_from(endian + "I", buf, pos + 4)[0]
+            if blocklen < 16:
+                return
+        else:
+            blocklen = struct.unpack_from(endian + "I", buf, pos + 4)[0]
+            if blocklen < 12:
+                return
+        # blocks whose length is not a multiple of 4 are followed by padding, as Scapy tolerates
+        total = blocklen + (-blocklen % 4)
+        if len(buf) - pos < total:
+            buf = _refill(f, buf, pos, total)
+            base += pos
+            pos = 0
+            if len(buf) < total:
+                return
+        if struct.unpack_from(endian + "I", buf, pos + total - 4)[0] != blocklen:
+            return
+
+        btype = struct.unpack_from(endian + "I", buf, pos)[0]
+        body = pos + 8
+        body_end = pos + blocklen - 4
+        if btype == 1:
+            if body_end - body < 8:
+                return
+            linktype, snaplen = struct.unpack_from(endian + "HxxI", buf, body)
+            interfaces.append((linktype, snaplen, _read_options(endian, buf, body + 8, body_end - 4)))
+        elif btype in (6, 2):
+            if body_end - body < 20:
+                return
+            if btype == 6:
+                intid, tshigh, tslow, caplen = struct.unpack_from(endian + "4I", buf, body)
+            else:
+                intid, _drops, tshigh, tslow, caplen = struct.unpack_from(endian + "HH3I", buf, body)
+            if intid >= len(interfaces):
+                return
+            linktype, _snaplen, tsresol = interfaces[intid]
+            start = body + 20
+            n = min(caplen, max(0, body_end - start), MTU)
+            yield ((tshigh << 32) + tslow) / tsresol, linktype, buf, start, n
+        elif btype == 3:
+            if not interfaces:
+                return
+            if body_end - body < 4:
+                return
+            wirelen = struct.unpack_from(endian + "I", buf, body)[0]
+            linktype, snaplen, _tsresol = interfaces[0]
+            start = body + 4
+            n = min(wirelen, snaplen, max(0, body_end - start), MTU)
+            # simple packet blocks carry no timestamp; Scapy stamps them with the read time
+            state.untimed += 1
+            yield time.time(), linktype, buf, start, n
+        pos += total
+
+
+def decode_frame(linktype: int, buf: bytes, off: int, end: int, accept_ips: Optional[Callable] = None):
+    """Decode the L3/L4 header fields of the frame ``buf[off:end]``.
+
+    Returns a ``Decoded`` tuple, None when the frame has no IP layer (or
+    ``accept_ips(src, dst)`` rejects its packed addresses, checked before the L4
+    header is read), or SCAPY_FALLBACK when the frame must be dissected by Scapy.
+    """
+    decode = _LINK_DECODERS.get(linktype)
+    if decode is None:
+        return SCAPY_FALLBACK
+    return decode(buf, off, end, accept_ips)
+
+
+def _decode_ethernet(buf: bytes, off: int, end: int, accept_ips: Optional[Callable] = None):
+    if end - off < 14:
+        return SCAPY_FALLBACK
+    etype = _u16(buf, off + 12)[0]
+    o = off + 14
+    while etype in _VLAN_TYPES:
+        if end - o < 4:
+            return SCAPY_FALLBACK
+        etype = _u16(buf, o + 2)[0]
+        o += 4
+    if etype == 0x0800:
+        return _decode_ipv4(buf, o, end, accept_ips)
+    if etype == 0x86DD:
+        return _decode_ipv6(buf, o, end, accept_ips)
+    if etype <= 1500 or etype in _ETH_FALLBACK:
+        return SCAPY_FALLBACK
+    return None
+
+
+def _decode_raw(buf: bytes, off: int, end: int, accept_ips: Optional[Callable] = None):
+    if end - off < 1:
+        return SCAPY_FALLBACK
+    if buf[off] >> 4 == 6:
+        return _decode_ipv6(buf, off, end, accept_ips)
+    return _decode_ipv4(buf, off, end, accept_ips)
+
+
+def _decode_sll(buf: bytes, off: int, end: int, accept_ips: Optional[Callable] = None):
+    if end - off < 16:
+        return SCAPY_FALLBACK
+    etype = _u16(buf, off + 14)[0]
+    o = off + 16
+    if etype == 0x8100:
+        while etype in _VLAN_TYPES:
+            if end - o < 4:
+                return SCAPY_FALLBACK
+            etype = _u16(buf, o + 2)[0]
+            o += 4
+        if etype <= 1500 or etype in _ETH_FALLBACK:
+            return SCAPY_FALLBACK
+    elif etype in _SLL_FALLBACK:
+        return SCAPY_FALLBACK
+    if etype == 0x0800:
+        return _decode_ipv4(buf, o, end, accept_ips)
+    if etype == 0x86DD:
+        return _decode_ipv6(buf, o, end, accept_ips)
+    return None
+
+
+def _decode_ipv4(buf: bytes, o: int, end: int, accept_ips: Optional[Callable] = None):
+    if end - o < 20 or buf[o] != 0x45:
+        # IP options, odd versions and truncated headers are left to Scapy
+        return SCAPY_FALLBACK
+    total_len = _u16(buf, o + 2)[0]
+    if total_len < 20:
+        return SCAPY_FALLBACK
+    src = buf[o + 12:o + 16]
+    dst = buf[o + 16:o + 20]
+    # Scapy reports the outer IPv4 header even for tunnels, so rejecting here is exact
+    if accept_ips is not None and not accept_ips(src, dst):
+        return None
+    proto = buf[o + 9]
+    if proto in _IP_TUNNEL_PROTOS:
+        return SCAPY_FALLBACK
+    ttl = buf[o + 8]
+    if _u16(buf, o + 6)[0] & 0x1FFF:
+        return src, dst, None, None, "IP", 4, ttl, None
+    l4 = o + 20
+    l4_end = min(end, o + total_len)
+    if proto == 6:
+        if l4_end - l4 < 20:
+            return SCAPY_FALLBACK
+        sport, dport = _u16x2(buf, l4)
+        return src, dst, sport, dport, "TCP", 4, ttl, (buf[l4 + 12] & 1) << 8 | buf[l4 + 13]
+    if proto == 17:
+        if l4_end - l4 < 8:
+            return SCAPY_FALLBACK
+        sport, dport = _u16x2(buf, l4)
+        if sport in _UDP_TUNNEL_PORTS or dport in _UDP_TUNNEL_PORTS:
+            return SCAPY_FALLBACK
+        return src, dst, sport, dport, "UDP", 4, ttl, None
+    if proto == 1 and (l4_end - l4 < 1 or buf[l4] in _ICMP_ERROR_TYPES):
+        return SCAPY_FALLBACK
+    return src, dst, None, None, "IP", 4, ttl, None
+
+
+def _decode_ipv6(buf: bytes, o: int, end: int, accept_ips: Optional[Callable] = None):
+    if end - o < 40 or buf[o] >> 4 != 6:
+        return SCAPY_FALLBACK
+    nh = buf[o + 6]
+    if nh not in _IPV6_DECODED_NH:
+        # may hide an inner IPv4 header, which Scapy would report instead
+        return SCAPY_FALLBACK
+    src = buf[o + 8:o + 24]
+    dst = buf[o + 24:o + 40]
+    if accept_ips is not None and not accept_ips(src, dst):
+        return None
+    hlim = buf[o + 7]
+    l4 = o + 40
+    l4_end = min(end, l4 + _u16(buf, o + 4)[0])
+    if nh == 6:
+        if l4_end - l4 < 20:
+            return SCAPY_FALLBACK
+        sport, dport = _u16x2(buf, l4)
+        return src, dst, sport, dport, "TCP", 6, hlim, (buf[l4 + 12] & 1) << 8 | buf[l4 + 13]
+    if nh == 17:
+        if l4_end - l4 < 8:
+            return SCAPY_FALLBACK
+        sport, dport = _u16x2(buf, l4)
+        if sport in _UDP_TUNNEL_PORTS or dport in _UDP_TUNNEL_PORTS:
+            return SCAPY_FALLBACK
+        return src, dst, sport, dport, "UDP", 6, hlim, None
+    if nh == 58:
+        if l4_end - l4 < 1 or buf[l4] in _ICMPV6_NESTED_TYPES:
+            return SCAPY_FALLBACK
+        return src, dst, None, None, "IPV6", 6, hlim, None
+    return src, dst, None, None, "IPV6", 6, hlim, None
+
+
+# Link-layer decoders of decode_frame; frames of any other linktype are left to Scapy.
+_LINK_DECODERS = {
+    DLT_EN10MB: _decode_ethernet,
+    DLT_RAW: _decode_raw,
+    DLT_RAW_ALT: _decode_raw,
+    DLT_LINUX_SLL: _decode_sll,
+    DLT_IPV4: _decode_ipv4,
+    DLT_IPV6: _decode_ipv6,
+}
+NATIVE_LINKTYPES = frozenset(_LINK_DECODERS)
+
+# Bytes gathered per frame by decode_ipv4_batch: link header room (14) + IPv4 (20) + TCP (20)
+_BATCH_HEADER = 54
+_BATCH_COLUMNS = np.arange(_BATCH_HEADER)
+# Link header length of the decoders whose frames decode_ipv4_batch gathers, and the linktypes using them
+_BATCH_DECODER_OFFSET = {_decode_ethernet: 14, _decode_raw: 0, _decode_ipv4: 0}
+_BATCH_LINK_OFFSET = {lt: _BATCH_DECODER_OFFSET[d] for lt, d in _LINK_DECODERS.items() if d in _BATCH_DECODER_OFFSET}
+_UDP_TUNNEL_PORT_ARRAY = np.array(sorted(_UDP_TUNNEL_PORTS))
+
+
+def decode_ipv4_batch(records: list) -> Tuple[np.ndarray, dict]:
+    """Vectorized ``decode_frame`` for the common frames of a batch of raw records.
+
+    Handles Ethernet (untagged) and raw-IP frames carrying an unfragmented IPv4
+    header without options and a complete TCP or UDP header, which is nearly
+    all traffic. Returns ``(decoded, fields)``: a boolean mask over ``records``
+    and, for the decoded records, arrays ``timestamp``, ``length`` (caplen),
+    ``src``/``dst`` (IPv4 as uint32), ``src_port``, ``dst_port``, ``protocol``
+    (6 or 17), ``ttl`` and ``tcp_flags``. The other records must go through
+    ``decode_frame``; no address filter is applied here.
+    """
+    n = len(records)
+    timestamps, linktypes, bufs, offsets, caplens = zip(*records)
+    linktype = np.array(linktypes, dtype=np.int64)
+    caplen = np.array(caplens, dtype=np.int64)
+    link = np.select(
+        [linktype == lt for lt in _BATCH_LINK_OFFSET], list(_BATCH_LINK_OFFSET.values()), default=-1
+    )
+    # gather each frame's first bytes so the IPv4 header always starts at column 14
+    start = np.array(offsets, dtype=np.int64) + link - 14
+    hdr = np.zeros((n, _BATCH_HEADER), dtype=np.uint8)
+    ids = np.fromiter(map(id, bufs), dtype=np.int64, count=n)
+    bounds = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1, [n]])
+    for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        data = np.frombuffer(bufs[lo], dtype=np.uint8)
+        idx = start[lo:hi, None] + _BATCH_COLUMNS
+        np.clip(idx, 0, len(data) - 1, out=idx)
+        hdr[lo:hi] = data[idx]
+        del data
+
+    def u16(col: int) -> np.ndarray:
+        return hdr[:, col].astype(np.int64) << 8 | hdr[:, col + 1]
+
+    ip_len = caplen - link  # frame bytes from the IPv4 header on
+    total_len = u16(16)
+    proto = hdr[:, 23].astype(np.int64)
+    l4_len = np.minimum(ip_len, total_len) - 20
+    sport, dport = u16(34), u16(36)
+    tcp = (proto == 6) & (l4_len >= 20)
+    udp = (
+        (proto == 17)
+        & (l4_len >= 8)
+        & ~np.isin(sport, _UDP_TUNNEL_PORT_ARRAY)
+        & ~np.isin(dport, _UDP_TUNNEL_PORT_ARRAY)
+    )
+    decoded = (
+        (link >= 0)
+        & ((linktype != DLT_EN10MB) | (u16(12) == 0x0800))
+        & (ip_len >= 20)
+        & (hdr[:, 14] == 0x45)
+        & (total_len >= 20)
+        & (u16(20) & 0x1FFF == 0)
+        & (tcp | udp)
+    )
+    rows = hdr[decoded]
+
+    def u32(col: int) -> np.ndarray:
+        return rows[:, col:col + 4].copy().view(">u4")[:, 0].astype(np.uint32)
+
+    fields = {
+        "timestamp": np.array(timestamps, dtype=np.float64)[decoded],
+        "length": caplen[decoded],
+        "src": u32(26),
+        "dst": u32(30),
+        "src_port": sport[decoded],
+        "dst_port": dport[decoded],
+        "protocol": proto[decoded],
+        "ttl": rows[:, 22],
+        "tcp_flags": (rows[:, 46].astype(np.int64) & 1) << 8 | rows[:, 47],
+    }
+    return decoded, fields
@@ -0,0 +1,261 @@
+"""Timeout-based flow table (NetFlow/IPFIX style).
+
+``build_flows`` groups a whole capture on the bidirectional 5-tuple, so a
+5-tuple reused hours apart becomes one flow and every packet must be loaded
+first. ``FlowTable`` instead keeps per-flow state only for the flows currently
+active and exports a flow record when the flow ends:
+
+- idle: no packet for ``idle_timeout`` seconds
+- active: the flow has lasted ``active_timeout`` seconds; a new record starts
+- end: TCP RST, or FIN followed by ``fin_timeout`` seconds of quiet
+- evicted: the table held ``max_flows`` flows and room was needed
+- forced: still open when the capture ended (``flush``)
+
+Packets are fed as packets table chunks in capture order (``update``), and
+each call returns the flows that expired meanwhile, so records can be written
+out as they are produced. Memory is bounded by ``max_flows``. When the table
+is full, expired flows are swept first, then closing TCP flows, then the
+oldest flow that never saw a reply (scan and flood traffic), then the least
+recently seen flow.
+
+Flow records have the ``parse_pcap`` flows columns (endpoints in the same
+canonical order as ``FlowKey.normalized``) plus the OR of the TCP flags seen
+and the end reason.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from .decoder import tcp_flags_str
+from .parser import FLOW_COLUMNS
+
+FLOW_RECORD_COLUMNS = FLOW_COLUMNS + ["tcp_flags", "end_reason"]
+
+DEFAULT_IDLE_TIMEOUT = 15.0
+DEFAULT_ACTIVE_TIMEOUT = 1800.0
+DEFAULT_FIN_TIMEOUT = 2.0
+DEFAULT_MAX_FLOWS = 1 << 20
+
+# Sorts after every real port, like the flows table's null ports.
+_NO_PORT = 1 << 16
+_FIN = 0x01
+_RST = 0x04
+# How many of the least recently seen flows are searched for an unanswered one to evict.
+_EVICT_SCAN = 64
+
+# Indexes into the per-flow state lists
+_START, _LAST, _PACKETS, _BYTES, _FLAGS, _FORWARD, _ANSWERED = range(7)
+
+
+def _ns(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else int(round(seconds * 1e9))
+
+
+class FlowTable:
+    """Bounded table of active flows with idle/active/TCP-end expiry.
+
+    Timeouts are in seconds of capture time; None disables a timeout, and
+    ``tcp_end=False`` ignores FIN/RST. With no timeouts, no TCP handling and a
+    large enough table, the records of a capture are its ``build_flows`` flows.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+        active_timeout: Optional[float] = DEFAULT_ACTIVE_TIMEOUT,
+        fin_timeout: float = DEFAULT_FIN_TIMEOUT,
+        max_flows: int = DEFAULT_MAX_FLOWS,
+        tcp_end: bool = True,
+    ) -> None:
+        if max_flows < 1:
+            raise ValueError("max_flows must be at least 1")
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.fin_timeout = fin_timeout
+        self.max_flows = max_flows
+        self.tcp_end = tcp_end
+        self.packets = 0
+        self.exported = 0
+        self.evicted = 0
+        self._idle_ns = _ns(idle_timeout)
+        self._active_ns = _ns(active_timeout)
+        self._fin_ns = _ns(fin_timeout)
+        # Both tables are kept in least-recently-seen order; closing holds TCP flows after a FIN.
+        self._active: OrderedDict[tuple, list] = OrderedDict()
+        self._closing: OrderedDict[tuple, list] = OrderedDict()
+        # Every open flow (either table) in creation order, i.e. by start time, for the active timeout.
+        self._started: OrderedDict[tuple, list] = OrderedDict()
+        self._clock = None
+        self._records: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._closing)
+
+    def update(self, packets_df: pd.DataFrame) -> pd.DataFrame:
+        """Account a chunk of packets and return the flow records that expired meanwhile."""
+        if packets_df.empty:
+            return self._drain()
+        timestamps = packets_df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        src = _text(packets_df["src_ip"])
+        dst = _text(packets_df["dst_ip"])
+        sport = packets_df["src_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT).tolist()
+        dport = packets_df["dst_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT).tolist()
+        protocol = _text(packets_df["protocol"])
+        length = packets_df["length"].to_numpy(dtype=np.int64).tolist()
+        flags = packets_df["tcp_flags"].to_numpy(dtype=np.int64, na_value=0).tolist()
+
+        active, closing = self._active, self._closing
+        idle_ns, active_ns = self._idle_ns, self._active_ns
+        tcp_end = self.tcp_end
+        for ts, s, d, sp, dp, proto, size, fl in zip(timestamps.tolist(), src, dst, sport, dport, protocol, length, flags):
+            forward = (s, sp) <= (d, dp)
+            key = (s, d, sp, dp, proto) if forward else (d, s, dp, sp, proto)
+            table = active
+            state = active.get(key)
+            if state is None:
+                state = closing.get(key)
+                if state is not None:
+                    table = closing
+            if state is not None:
+                if idle_ns is not None and ts - state[_LAST] > idle_ns:
+                    self._export(table, key, "idle")
+                    state = None
+                elif active_ns is not None and ts - state[_START] >= active_ns:
+                    self._export(table, key, "active")
+                    state = None
+            if state is None:
+                if len(active) + len(closing) >= self.max_flows:
+                    self._make_room(ts)
+                state = [ts, ts, 0, 0, 0, forward, False]
+                table = active
+                active[key] = state
+                self._started[key] = state
+            else:
+                table.move_to_end(key)
+                if ts > state[_LAST]:
+                    state[_LAST] = ts
+                if ts < state[_START]:
+                    state[_START] = ts
+                if forward != state[_FORWARD]:
+                    state[_ANSWERED] = True
+            state[_PACKETS] += 1
+            state[_BYTES] += size
+            state[_FLAGS] |= fl
+            if tcp_end and fl & (_FIN | _RST) and proto == "TCP":
+                if fl & _RST:
+                    self._export(table, key, "end")
+                elif table is active:
+                    closing[key] = active.pop(key)
+        self.packets += len(timestamps)
+        clock = int(timestamps.max())
+        self._clock = clock if self._clock is None else max(self._clock, clock)
+        self.expire(self._clock)
+        return self._drain()
+
+    def expire(self, now: int) -> None:
+        """Move flows idle, closed or past the active timeout at ``now`` (ns since the epoch) to the pending records."""
+        if self._idle_ns is not None:
+            self._expire_queue(self._active, now - self._idle_ns, "idle")
+        self._expire_queue(self._closing, now - self._fin_ns, "end")
+        if self._active_ns is not None:
+            cutoff = now - self._active_ns
+            while self._started:
+                key, state = next(iter(self._started.items()))
+                if state[_START] > cutoff:
+                    break
+                self._export(self._active if key in self._active else self._closing, key, "active")
+
+    def flush(self) -> pd.DataFrame:
+        """Export every remaining flow (end of capture) and return the pending records."""
+        for table, reason in ((self._closing, "end"), (self._active, "forced")):
+            while table:
+                self._export(table, next(iter(table)), reason)
+        return self._drain()
+
+    def _expire_queue(self, table: OrderedDict, cutoff: int, reason: str) -> None:
+        while table:
+            key = next(iter(table))
+            if table[key][_LAST] >= cutoff:
+                break
+            self._export(table, key, reason)
+
+    def _make_room(self, now: int) -> None:
+        self.expire(now)
+        if len(self) < self.max_flows:
+            return
+        if self._closing:
+            self._export(self._closing, next(iter(self._closing)), "end")
+            return
+        victim = None
+        for i, (key, state) in enumerate(self._active.items()):
+            if not state[_ANSWERED]:
+                victim = key
+                break
+            if i + 1 >= _EVICT_SCAN:
+                break
+        self._export(self._active, victim if victim is not None else next(iter(self._active)), "evicted")
+        self.evicted += 1
+
+    def _export(self, table: OrderedDict, key: tuple, reason: str) -> None:
+        state = table.pop(key)
+        del self._started[key]
+        self._records.append(key + (state[_PACKETS], state[_BYTES], state[_START], state[_LAST], state[_FLAGS], reason))
+        self.exported += 1
+
+    def _drain(self) -> pd.DataFrame:
+        records, self._records = self._records, []
+        return _records_frame(records)
+
+
+def _text(col: pd.Series) -> list:
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.categories.to_numpy(dtype=object)[col.cat.codes.to_numpy()].tolist()
+    return col.astype(object).tolist()
+
+
+def _records_frame(records: list[tuple]) -> pd.DataFrame:
+    if not records:
+        return pd.DataFrame(columns=FLOW_RECORD_COLUMNS)
+    src, dst, sport, dport, protocol, packets, nbytes, start, end, flags, reason = zip(*records)
+    sport = np.asarray(sport, dtype=np.int64)
+    dport = np.asarray(dport, dtype=np.int64)
+    start_time = pd.to_datetime(np.asarray(start, dtype=np.int64), unit="ns", utc=True)
+    end_time = pd.to_datetime(np.asarray(end, dtype=np.int64), unit="ns", utc=True)
+    return pd.DataFrame(
+        {
+            "src_ip": src,
+            "dst_ip": dst,
+            "src_port": pd.arrays.IntegerArray(sport.astype(np.uint16), sport == _NO_PORT),
+            "dst_port": pd.arrays.IntegerArray(dport.astype(np.uint16), dport == _NO_PORT),
+            "protocol": protocol,
+            "packets": np.asarray(packets, dtype=np.int64),
+            "bytes": np.asarray(nbytes, dtype=np.int64),
+            "start_time": start_time,
+            "end_time": end_time,
+            "duration_s": (end_time - start_time).total_seconds(),
+            "tcp_flags": [tcp_flags_str(f) if p == "TCP" else None for f, p in zip(flags, protocol)],
+            "end_reason": reason,
+        }
+    )
+
+
+def iter_flow_records(chunks: Iterable[pd.DataFrame], **options) -> Iterator[pd.DataFrame]:
+    """Run packets table chunks through a ``FlowTable(**options)``, yielding flow records as they expire."""
+    table = FlowTable(**options)
+    for chunk in chunks:
+        records = table.update(chunk)
+        if not records.empty:
+            yield records
+    yield table.flush()
+
+
+def flow_records(packets_df: pd.DataFrame, chunk_size: int = 65536, **options) -> pd.DataFrame:
+    """All flow records of an in-memory packets table, in export order."""
+    chunks = (packets_df.iloc[i:i + chunk_size] for i in range(0, len(packets_df), chunk_size))
+    frames = [f for f in iter_flow_records(chunks, **options) if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else _records_frame([])
@@ -0,0 +1,174 @@
+"""Follow a capture that is still being written.
+
+``CaptureFollower`` keeps the reader position in a growing pcap/pcapng file and
+returns only the records appended since the last read. The path may be a glob
+pattern matching a rotated capture (``tcpdump -w cap.pcap -C 100`` writes
+``cap.pcap``, ``cap.pcap1``, ...): once a newer file appears, the current one is
+read to its end and the follower moves on to the next file.
+
+``follow_capture`` polls a follower and folds new packets into a
+``streaming.StreamingStats`` (and optionally a ``flows.FlowTable``), so top
+talkers, protocols, throughput buckets, flows and the host graph are updated
+from the new packets only. Every update reports its latency: the time from
+the poll that found new data to the updated stats.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from .decoder import COMPRESSION_MAGIC_SIZE, CaptureRange, ReadState, capture_compression, iter_range, iter_records
+from .flows import FLOW_RECORD_COLUMNS, FlowTable
+from .parser import FilterOptions, decode_chunks
+from .streaming import StreamingStats
+
+# A pcap global header; shorter files have not been started yet.
+_MIN_HEADER = 24
+
+
+class CaptureFollower:
+    """Incremental reader of a growing (and possibly rotating) capture.
+
+    ``read_new`` yields packets table chunks for the complete records appended
+    since the previous call; the position advances once the iterator is
+    exhausted. The follower starts at the beginning of the newest matching file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        filters: Optional[FilterOptions] = None,
+        engine: str = "native",
+    ) -> None:
+        self.pattern = str(path)
+        self.engine = engine
+        self._flt = filters.compile() if filters is not None else None
+        self.path: Optional[str] = None
+        self.files_done = 0
+        self._state = ReadState()
+        self._offset: Optional[int] = None  # next record; None before the file header is read
+        self._inode: Optional[int] = None
+        self._mtime_ns = 0
+
+    def _files(self) -> list[tuple[int, str]]:
+        """(mtime_ns, path) of the matching files, oldest first."""
+        paths = glob.glob(self.pattern) if glob.has_magic(self.pattern) else [self.pattern]
+        stamped = []
+        for p in paths:
+            try:
+                stamped.append((os.stat(p).st_mtime_ns, p))
+            except OSError:
+                continue
+        return sorted(stamped)
+
+    def _open(self, path: str) -> None:
+        self.path = path
+        self._state = ReadState()
+        self._offset = None
+        self._inode = None
+
+    def read_new(self, chunk_size: int = 65536) -> Iterator[pd.DataFrame]:
+        """Yield packets table chunks for the records appended since the last call.
+
+        Consume the iterator fully: the read position is only saved at its end.
+        """
+        files = self._files()
+        if self.path is None:
+            if not files:
+                return
+            self._open(files[-1][1])
+        while True:
+            yield from self._read_file(chunk_size)
+            paths = [p for _, p in files]
+            if self.path in paths:
+                later = paths[paths.index(self.path) + 1:]
+            else:
+                # the current file was removed (e.g. a rotation ring buffer): go on from its time
+                later = [p for m, p in files if m >= self._mtime_ns]
+            if not later:
+                return
+            # the writer has moved on: pick up the last records of this file, then switch
+            yield from self._read_file(chunk_size)
+            self.files_done += 1
+            self._open(later[0])
+
+    def _read_file(self, chunk_size: int) -> Iterator[pd.DataFrame]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if self._inode is not None and (st.st_ino != self._inode or st.st_size < (self._offset or 0)):
+            # replaced or truncated in place: start over
+            self._open(self.path)
+        self._mtime_ns = st.st_mtime_ns
+        if st.st_size < _MIN_HEADER:
+            return
+        with open(self.path, "rb") as f:
+            s = self._state
+            if self._offset is None:
+                if capture_compression(f.read(COMPRESSION_MAGIC_SIZE)):
+                    raise ValueError(f"Cannot follow a compressed capture: {self.path}")
+                f.seek(0)
+                iter_records(f, s)  # reads the file header into the state
+                self._offset = s.offset
+                self._inode = st.st_ino
+            # stop at the size seen now, so a writer faster than the reader cannot keep one read going
+            rng = CaptureRange(self._offset, st.st_size, s.pcapng, s.endian, s.nano, s.linktype, tuple(s.interfaces))
+            raw = iter_range(f, rng, state=s, complete=True)
+            yield from decode_chunks(raw, self.engine, self._flt, chunk_size)
+            self._offset = s.offset
+
+
+@dataclass
+class FollowUpdate:
+    """What one poll of ``follow_capture`` added."""
+
+    packets: int  # new packets
+    latency_s: float  # from the poll to updated stats
+    path: Optional[str]  # file being followed
+    flows: Optional[pd.DataFrame] = None  # flow records expired by the new packets (with a flow table)
+
+
+def follow_capture(
+    follower: CaptureFollower,
+    stats: StreamingStats,
+    on_update: Callable[[FollowUpdate], None],
+    flow_table: Optional[FlowTable] = None,
+    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+    interval: float = 1.0,
+    duration: Optional[float] = None,
+    chunk_size: int = 65536,
+) -> None:
+    """Poll ``follower`` every ``interval`` seconds and fold new packets into ``stats``.
+
+    ``on_update`` is called after every poll that found packets; ``on_chunk``
+    sees each new chunk first. Runs until ``duration`` seconds have passed
+    (forever if None) or the caller interrupts it.
+    """
+    deadline = None if duration is None else time.monotonic() + duration
+    while deadline is None or time.monotonic() < deadline:
+        started = time.monotonic()
+        packets = 0
+        expired = []
+        for chunk in follower.read_new(chunk_size):
+            if on_chunk is not None:
+                on_chunk(chunk)
+            stats.update(chunk)
+            if flow_table is not None:
+                expired.append(flow_table.update(chunk))
+            packets += len(chunk)
+        if packets:
+            flows = None
+            if flow_table is not None:
+                expired = [f for f in expired if not f.empty]
+                flows = pd.concat(expired, ignore_index=True) if expired else pd.DataFrame(columns=FLOW_RECORD_COLUMNS)
+            on_update(FollowUpdate(packets, time.monotonic() - started, follower.path, flows))
+        pause = interval - (time.monotonic() - started)
+        if pause > 0:
+            time.sleep(pause if deadline is None else min(pause, max(0.0, deadline - time.monotonic())))
@@ -1,56 +1,178 @@
 from __future__ import annotations
 
+import ipaddress
+import json
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+from xml.sax.saxutils import escape, quoteattr
+
 import networkx as nx
+import numpy as np
 import pandas as pd
 from pyvis.network import Network
 
+from .columns import take_rows
+from .metrics import PAIR_COLUMNS, PAIR_KEYS, packet_chunks, pair_counts, scale_estimates
+from .sketch import HeavyHitters
+
 CREDIT = "© 2025 JDRockfeller (Off-set)"
 
 
-def build_host_graph(packets_df: pd.DataFrame, min_bytes: int = 0) -> nx.DiGraph:
+@dataclass
+class SubnetMap:
+    """Collapse hosts into subnet supernodes.
+
+    An address goes to the most specific of ``networks`` (CIDR strings) that
+    contains it, else to its ``/v4_prefix`` or ``/v6_prefix`` network; with no
+    match it stays a host node.
+    """
+
+    v4_prefix: Optional[int] = None
+    v6_prefix: Optional[int] = None
+    networks: Sequence[str] = ()
+    _nets: list = field(init=False, repr=False, default_factory=list)
+
+    def __post_init__(self) -> None:
+        nets = [ipaddress.ip_network(n, strict=False) for n in self.networks]
+        self._nets = sorted(nets, key=lambda n: n.prefixlen, reverse=True)
+
+    def supernet(self, ip: str) -> str:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return ip
+        for net in self._nets:
+            if net.version == addr.version and addr in net:
+                return str(net)
+        prefix = self.v4_prefix if addr.version == 4 else self.v6_prefix
+        if prefix is None:
+            return ip
+        return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+    def map(self, ips) -> np.ndarray:
+        """Supernode of each address, looking up each distinct address once."""
+        codes, uniques = pd.factorize(pd.Series(ips).astype(object))
+        mapped = np.array([self.supernet(ip) for ip in uniques], dtype=object)
+        return mapped[codes]
+
+
+def collapse_subnets(pairs: pd.DataFrame, subnets: SubnetMap) -> pd.DataFrame:
+    """Pair counts with hosts replaced by their ``subnets`` supernodes, re-aggregated."""
+    values = [c for c in ("bytes", "packets", "bytes_error") if c in pairs]
+    collapsed = pairs.assign(src_ip=subnets.map(pairs["src_ip"]), dst_ip=subnets.map(pairs["dst_ip"]))
+    return collapsed.groupby(PAIR_KEYS, sort=True, observed=True)[values].sum().reset_index()
+
+
+def build_host_graph(
+    packets_df: pd.DataFrame,
+    min_bytes: int = 0,
+    epsilon: Optional[float] = None,
+    top_nodes: Optional[int] = None,
+    top_edges: Optional[int] = None,
+    subnets: Optional[SubnetMap] = None,
+    rows: Optional[np.ndarray] = None,
+    sample_rate: int = 1,
+) -> nx.DiGraph:
     """Build a directed host conversation graph from packets.
 
     Nodes: IP addresses with attributes total_bytes, total_packets
     Edges: src->dst with attributes bytes, packets, protocol_weights
+
+    With ``epsilon``, only the heaviest edges are kept, with estimated weights
+    and a bytes_error attribute (see ``sketch``). See ``host_graph_from_counts``
+    for the other reductions. ``rows`` limits it to those packet positions
+    (e.g. a ``query.PacketIndex`` selection). For a sampled parse,
+    ``sample_rate`` scales the counts (before the reductions) as
+    ``metrics.scale_estimates`` does.
     """
-    G = nx.DiGraph()
+    packets_df = take_rows(packets_df, rows, PAIR_COLUMNS)
+    reductions = dict(min_bytes=min_bytes, top_nodes=top_nodes, top_edges=top_edges, subnets=subnets)
+    if epsilon is not None:
+        sketch = HeavyHitters(PAIR_KEYS, epsilon)
+        for chunk in packet_chunks(packets_df):
+            sketch.update(pair_counts(chunk))
+        return host_graph_from_counts(scale_estimates(sketch.table(), sample_rate), **reductions)
     if packets_df.empty:
-        return G
+        return nx.DiGraph()
+    return host_graph_from_counts(scale_estimates(pair_counts(packets_df), sample_rate), **reductions)
 
-    agg = (
-        packets_df.groupby(["src_ip", "dst_ip", "protocol"]).agg(bytes=("length", "sum"), packets=("length", "count")).reset_index()
-    )
 
-    agg = agg[agg["bytes"] >= int(min_bytes)]
+def host_graph_from_counts(
+    pairs: pd.DataFrame,
+    min_bytes: int = 0,
+    top_nodes: Optional[int] = None,
+    top_edges: Optional[int] = None,
+    subnets: Optional[SubnetMap] = None,
+) -> nx.DiGraph:
+    """Build the host graph from ``metrics.pair_counts`` (per src/dst/protocol bytes and packets).
 
-    node_bytes: dict[str, int] = {}
-    node_packets: dict[str, int] = {}
-    for _, row in agg.iterrows():
-        src = row["src_ip"]
-        dst = row["dst_ip"]
-        b = int(row["bytes"])
-        p = int(row["packets"])
-        node_bytes[src] = node_bytes.get(src, 0) + b
-        node_packets[src] = node_packets.get(src, 0) + p
-        node_bytes[dst] = node_bytes.get(dst, 0)
-        node_packets[dst] = node_packets.get(dst, 0)
+    Reductions, in this order: hosts are collapsed into ``subnets`` supernodes
+    (which get a ``hosts`` attribute), per-protocol counts below ``min_bytes``
+    are dropped, only edges between the ``top_nodes`` nodes with the most bytes
+    sent and received are kept, then only the ``top_edges`` heaviest edges.
+    Node totals are the bytes and packets sent over the edges kept. A
+    ``bytes_error`` column (heavy-hitter estimates) is summed into an edge
+    attribute of that name; a ``sample_rate`` column (scaled sample counts)
+    becomes the graph attribute of that name.
+    """
+    G = nx.DiGraph()
+    if "sample_rate" in pairs and len(pairs):
+        G.graph["sample_rate"] = int(pairs["sample_rate"].iloc[0])
+    if pairs.empty:
+        return G
 
-    for ip in set(list(agg["src_ip"]) + list(agg["dst_ip"])):
-        G.add_node(ip, total_bytes=int(node_bytes.get(ip, 0)), total_packets=int(node_packets.get(ip, 0)))
+    hosts = None
+    if subnets is not None:
+        ips = pd.unique(np.concatenate([pairs["src_ip"].to_numpy(dtype=object), pairs["dst_ip"].to_numpy(dtype=object)]))
+        hosts = pd.Series(subnets.map(ips)).value_counts()
+        pairs = collapse_subnets(pairs, subnets)
+
+    agg = pairs[pairs["bytes"] >= int(min_bytes)]
+    agg = agg.assign(**{k: agg[k].to_numpy(dtype=object) for k in PAIR_KEYS})
+    values = [c for c in ("bytes", "packets", "bytes_error") if c in agg]
 
     # combine per (src,dst) across protocols keeping weights
-    edge_group = agg.groupby(["src_ip", "dst_ip"])  # mix protocols
-    for (src, dst), df in edge_group:
-        total_bytes = int(df["bytes"].sum())
-        total_packets = int(df["packets"].sum())
-        proto_weights = {str(r["protocol"]): int(r["bytes"]) for _, r in df.iterrows()}
-        G.add_edge(src, dst, bytes=total_bytes, packets=total_packets, protocol_bytes=proto_weights)
+    edges = agg.groupby(["src_ip", "dst_ip"], sort=True)[values].sum()
+    if top_nodes is not None:
+        traffic = edges["bytes"].groupby(level=0).sum().add(edges["bytes"].groupby(level=1).sum(), fill_value=0)
+        busiest = traffic.nlargest(top_nodes).index
+        edges = edges[edges.index.get_level_values(0).isin(busiest) & edges.index.get_level_values(1).isin(busiest)]
+    if top_edges is not None:
+        edges = edges.nlargest(top_edges, "bytes").sort_index()
+    if len(edges) < len(agg):
+        agg = agg[pd.MultiIndex.from_frame(agg[["src_ip", "dst_ip"]]).isin(edges.index)]
+
+    proto_weights: dict[tuple, dict] = {}
+    for key, proto, b in zip(zip(agg["src_ip"], agg["dst_ip"]), agg["protocol"], agg["bytes"].tolist()):
+        proto_weights.setdefault(key, {})[str(proto)] = b
+
+    src = edges.index.get_level_values(0).to_numpy()
+    dst = edges.index.get_level_values(1).to_numpy()
+    nodes = pd.unique(np.concatenate([src, dst]))
+    sent = edges[["bytes", "packets"]].groupby(level=0).sum().reindex(nodes, fill_value=0)
+    node_attrs = [
+        {"total_bytes": b, "total_packets": p}
+        for b, p in zip(sent["bytes"].tolist(), sent["packets"].tolist())
+    ]
+    if hosts is not None:
+        for ip, attrs in zip(nodes, node_attrs):
+            attrs["hosts"] = int(hosts.get(ip, 1))
+    G.add_nodes_from(zip(nodes, node_attrs))
+
+    columns = [edges[c].tolist() for c in values]
+    edge_attrs = [dict(zip(values, row)) for row in zip(*columns)]
+    for key, attrs in zip(zip(src, dst), edge_attrs):
+        attrs["protocol_bytes"] = proto_weights[key]
+    G.add_edges_from((u, v, attrs) for u, v, attrs in zip(src, dst, edge_attrs))
 
     return G
 
 
 def to_pyvis_html(G: nx.Graph, height: str = "700px", width: str = "100%", notebook: bool = False) -> str:
-    """Render a NetworkX graph to a standalone HTML string via PyVis with protocol coloring and credit footer."""
+    """Render a NetworkX graph to a standalone HTML string via PyVis with protocol coloring and credit footer.
+
+    The browser runs the physics layout, so this suits small graphs; ``render.to_html`` scales further.
+    """
     net = Network(height=height, width=width, notebook=notebook, directed=G.is_directed())
 
     for node, data in G.nodes(data=True):
@@ -70,10 +192,10 @@ def to_pyvis_html(G: nx.Graph, height: str = "700px", width: str = "100%", noteb
     net.set_options(
         """
         var options = {
-            nodes: { shape: 'dot', scaling: { min: 5, max: 30 } },
-            edges: { arrows: { to: { enabled: true } }, smooth: { type: 'dynamic' } },
-            physics: { stabilization: true }
-        };
+            "nodes": { "shape": "dot", "scaling": { "min": 5, "max": 30 } },
+            "edges": { "arrows": { "to": { "enabled": true } }, "smooth": { "type": "dynamic" } },
+            "physics": { "stabilization": true }
+        }
         """
     )
 
@@ -84,4 +206,58 @@ def to_pyvis_html(G: nx.Graph, height: str = "700px", width: str = "100%", noteb
 
 
 def export_graphml(G: nx.Graph, path: str) -> None:
-    nx.write_graphml(G, path)
+    """Write GraphML that ``nx.read_graphml`` reads back.
+
+    Written in one streaming pass (``nx.write_graphml`` builds the whole XML
+    tree first); dict attributes such as protocol_bytes, which GraphML cannot
+    hold, are written as JSON strings. Graph attributes (e.g. sample_rate)
+    are kept too.
+    """
+    graph_keys = _graphml_keys([G.graph])
+    node_keys = _graphml_keys(d for _, d in G.nodes(data=True))
+    edge_keys = _graphml_keys(d for _, _, d in G.edges(data=True))
+    ids = {}
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        fh.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for domain, keys in (("graph", graph_keys), ("node", node_keys), ("edge", edge_keys)):
+            for name, attr_type in keys.items():
+                key_id = ids[domain, name] = f"d{len(ids)}"
+                fh.write(f'  <key id="{key_id}" for="{domain}" attr.name={quoteattr(name)} attr.type="{attr_type}" />\n')
+        default = "directed" if G.is_directed() else "undirected"
+        fh.write(f'  <graph edgedefault="{default}">{_graphml_data(G.graph, ids, "graph")}\n')
+        for n, d in G.nodes(data=True):
+            fh.write(f"    <node id={quoteattr(str(n))}>{_graphml_data(d, ids, 'node')}</node>\n")
+        for u, v, d in G.edges(data=True):
+            fh.write(f"    <edge source={quoteattr(str(u))} target={quoteattr(str(v))}>{_graphml_data(d, ids, 'edge')}</edge>\n")
+        fh.write("  </graph>\n</graphml>\n")
+
+
+def _graphml_type(value) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "boolean"
+    if isinstance(value, (int, np.integer)):
+        return "long"
+    if isinstance(value, (float, np.floating)):
+        return "double"
+    return "string"
+
+
+def _graphml_keys(datas) -> dict[str, str]:
+    keys: dict[str, str] = {}
+    for d in datas:
+        for name, value in d.items():
+            if name not in keys:
+                keys[name] = _graphml_type(value)
+    return keys
+
+
+def _graphml_data(data: dict, ids: dict, domain: str) -> str:
+    parts = []
+    for name, value in data.items():
+        if isinstance(value, dict):
+            value = json.dumps(value, sort_keys=True)
+        elif isinstance(value, (bool, np.bool_)):
+            value = "true" if value else "false"
+        parts.append(f'<data key="{ids[domain, name]}">{escape(str(value))}</data>')
+    return "".join(parts)
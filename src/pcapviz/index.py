@@ -0,0 +1,199 @@
+"""Sidecar block index for seeking into large captures.
+
+``build_index`` walks a capture once and cuts it into blocks of about
+``block_bytes``. Each block keeps the reader state at its first record (a
+``decoder.CaptureRange``), its first packet number and per-block summaries: the
+min/max timestamp and the protocols seen. ``CaptureIndex.select`` returns the
+blocks that may hold packets passing a filter, and ``parse_pcap(index=...)``
+reads only those, through a memory map of the capture.
+
+The index is stored next to the capture as ``<capture>.pvidx`` (JSON) and is
+valid while the capture's size and mtime are unchanged. Compressed captures
+cannot be indexed.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from .decoder import SCAPY_FALLBACK, CaptureRange, DecompressedStream, ReadState, decode_frame, iter_records, open_capture
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".pvidx"
+DEFAULT_BLOCK_BYTES = 4 << 20
+
+
+@dataclass(frozen=True)
+class IndexBlock:
+    """One indexed run of records and what they can contain."""
+
+    span: CaptureRange
+    first_packet: int  # record number of the block's first record
+    packets: int
+    time_min: float  # -inf/inf when the block has records without timestamps
+    time_max: float
+    protocols: Optional[frozenset]  # None: unknown (frames only Scapy can dissect)
+
+    def may_match(self, flt) -> bool:
+        """False if no packet of this block can pass the compiled filter ``flt``."""
+        if flt is None:
+            return True
+        if flt.time_start is not None and self.time_max < flt.time_start:
+            return False
+        if flt.time_end is not None and self.time_min > flt.time_end:
+            return False
+        if flt.protocols is not None and self.protocols is not None and not (self.protocols & flt.protocols):
+            return False
+        return True
+
+
+@dataclass
+class CaptureIndex:
+    size: int
+    mtime_ns: int
+    blocks: list[IndexBlock]
+
+    def is_current(self, pcap_path: str) -> bool:
+        st = os.stat(pcap_path)
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def select(self, flt=None) -> list[IndexBlock]:
+        """Blocks that may hold packets passing the compiled filter ``flt``, in file order."""
+        return [b for b in self.blocks if b.may_match(flt)]
+
+    @property
+    def checkpoints(self) -> list[tuple]:
+        """Sparse (timestamp, byte offset, packet number) checkpoints, one per block."""
+        return [(b.time_min, b.span.start, b.first_packet) for b in self.blocks]
+
+    def save(self, path: str) -> None:
+        interfaces: dict[tuple, int] = {}
+        blocks = []
+        for b in self.blocks:
+            r = b.span
+            iface = interfaces.setdefault(r.interfaces, len(interfaces))
+            protocols = None if b.protocols is None else sorted(b.protocols)
+            blocks.append([r.start, r.end, r.endian, iface, b.first_packet, b.packets, b.time_min, b.time_max, protocols])
+        first = self.blocks[0].span if self.blocks else CaptureRange(0, None, False, "<")
+        doc = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "pcapng": first.pcapng,
+            "nano": first.nano,
+            "linktype": first.linktype,
+            "interfaces": [[list(i) for i in key] for key in interfaces],
+            "blocks": blocks,
+        }
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(doc, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CaptureIndex":
+        with open(path, encoding="utf-8") as fh:
+            doc = json.load(fh)
+        if doc.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {path}")
+        interfaces = [tuple(tuple(i) for i in key) for key in doc["interfaces"]]
+        blocks = [
+            IndexBlock(
+                CaptureRange(start, end, doc["pcapng"], endian, doc["nano"], doc["linktype"], interfaces[iface]),
+                first_packet,
+                packets,
+                time_min,
+                time_max,
+                None if protocols is None else frozenset(protocols),
+            )
+            for start, end, endian, iface, first_packet, packets, time_min, time_max, protocols in doc["blocks"]
+        ]
+        return cls(doc["size"], doc["mtime_ns"], blocks)
+
+
+def index_path(pcap_path: str) -> str:
+    return str(pcap_path) + INDEX_SUFFIX
+
+
+def build_index(pcap_path: str, block_bytes: int = DEFAULT_BLOCK_BYTES) -> CaptureIndex:
+    """Index a capture in one pass. Raises ValueError for compressed captures."""
+    st = os.stat(pcap_path)
+    blocks: list[IndexBlock] = []
+    with open_capture(pcap_path) as f:
+        if isinstance(f, DecompressedStream):
+            raise ValueError("Compressed captures cannot be indexed")
+        state = ReadState()
+        current: Optional[list] = None  # [range fields, first_packet, packets, tmin, tmax, protocols, untimed]
+        number = 0
+        for timestamp, linktype, buf, off, caplen in iter_records(f, state):
+            if current is None or state.offset - current[0][0] >= block_bytes:
+                if current is not None:
+                    blocks.append(_close_block(current, state.offset))
+                current = [
+                    (state.offset, state.pcapng, state.endian, state.nano, state.linktype, tuple(state.interfaces)),
+                    number,
+                    0,
+                    math.inf,
+                    -math.inf,
+                    set(),
+                    state.untimed,
+                ]
+            number += 1
+            current[2] += 1
+            if timestamp < current[3]:
+                current[3] = timestamp
+            if timestamp > current[4]:
+                current[4] = timestamp
+            protocols = current[5]
+            if protocols is not None:
+                fields = decode_frame(linktype, buf, off, off + caplen)
+                if fields is SCAPY_FALLBACK:
+                    current[5] = None
+                elif fields is not None:
+                    protocols.add(fields[4])
+            if state.untimed != current[6]:
+                current[3], current[4] = -math.inf, math.inf
+        if current is not None:
+            blocks.append(_close_block(current, None))
+    return CaptureIndex(st.st_size, st.st_mtime_ns, blocks)
+
+
+def _close_block(current: list, end: Optional[int]) -> IndexBlock:
+    (start, pcapng, endian, nano, linktype, interfaces), first_packet, packets, tmin, tmax, protocols, _ = current
+    return IndexBlock(
+        CaptureRange(start, end, pcapng, endian, nano, linktype, interfaces),
+        first_packet,
+        packets,
+        tmin,
+        tmax,
+        None if protocols is None else frozenset(protocols),
+    )
+
+
+def load_index(pcap_path: str, path: Optional[str] = None) -> Optional[CaptureIndex]:
+    """The saved index of a capture, or None if missing, unreadable or out of date."""
+    path = path or index_path(pcap_path)
+    try:
+        index = CaptureIndex.load(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return index if index.is_current(pcap_path) else None
+
+
+def ensure_index(pcap_path: str, path: Optional[str] = None, block_bytes: int = DEFAULT_BLOCK_BYTES) -> CaptureIndex:
+    """Load the capture's index, building and saving it first if needed.
+
+    A capture in a read-only directory still gets an (unsaved) index.
+    """
+    index = load_index(pcap_path, path)
+    if index is None:
+        index = build_index(pcap_path, block_bytes)
+        try:
+            index.save(path or index_path(pcap_path))
+        except OSError:
+            pass
+    return index
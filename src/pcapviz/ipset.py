@@ -0,0 +1,144 @@
+"""Address sets for IP filters: single addresses and CIDR prefixes, IPv4 and IPv6.
+
+``IPSet`` compiles a list such as a threat-intel feed (``10.0.0.0/8``,
+``2001:db8::/32``, ``192.0.2.7``, ...) into a longest-prefix-match table on
+integer addresses: one hashed set of network numbers per prefix length. A
+lookup probes the lengths present in the list, longest first, so it costs at
+most 33 (IPv4) or 129 (IPv6) hash lookups however many entries the list has;
+single addresses also sit in a set of their text and packed forms, matched
+with one lookup. For the native decoder's IPv4 batches the prefixes are also
+merged into sorted disjoint ranges, checked for a whole array at once with a
+binary search.
+
+Lists are read with ``read_ip_list``: one or more entries per line, separated
+by whitespace or commas, with ``#`` comments.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import socket
+from typing import Iterable, Iterator
+
+import numpy as np
+
+_BITS = {4: 32, 6: 128}
+
+
+def read_ip_list(path) -> Iterator[str]:
+    """Entries of an address list file (addresses or CIDR prefixes)."""
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.split("#", 1)[0]
+            yield from line.replace(",", " ").split()
+
+
+def _address_int(ip) -> tuple[int, int]:
+    """(IP version, integer value) of a packed or text address; (0, 0) if it is neither."""
+    if isinstance(ip, (bytes, bytearray, memoryview)):
+        ip = bytes(ip)
+        if len(ip) == 4:
+            return 4, int.from_bytes(ip, "big")
+        if len(ip) == 16:
+            return 6, int.from_bytes(ip, "big")
+        return 0, 0
+    if isinstance(ip, str):
+        for family, version in ((socket.AF_INET, 4), (socket.AF_INET6, 6)):
+            try:
+                return version, int.from_bytes(socket.inet_pton(family, ip), "big")
+            except OSError:
+                continue
+    return 0, 0
+
+
+class IPSet:
+    """Membership test for addresses against single IPs and CIDR prefixes.
+
+    ``ip in ipset`` accepts text or packed (4/16 byte) addresses; non-addresses
+    are never members. Raises ``ValueError`` for entries that are neither an
+    address nor a prefix.
+    """
+
+    def __init__(self, entries: Iterable[str] = ()) -> None:
+        exact = set()
+        prefixes: dict[int, dict[int, set]] = {4: {}, 6: {}}
+        v4_ranges = []
+        count = 0
+        for entry in entries:
+            text = str(entry).strip()
+            if not text:
+                continue
+            try:
+                net = ipaddress.ip_network(text, strict=False)
+            except ValueError as exc:
+                raise ValueError(f"Not an IP address or CIDR prefix: {text!r}") from exc
+            count += 1
+            bits = _BITS[net.version]
+            value = int(net.network_address)
+            if net.prefixlen == bits:
+                exact.add(net.network_address.packed)
+                exact.add(str(net.network_address))
+            else:
+                prefixes[net.version].setdefault(net.prefixlen, set()).add(value >> (bits - net.prefixlen))
+            if net.version == 4:
+                v4_ranges.append((value, value + (1 << (bits - net.prefixlen)) - 1))
+        self._count = count
+        self._exact = frozenset(exact)
+        # (prefix length, network numbers) per version, longest prefix first
+        self._prefixes = {
+            version: [(length, frozenset(nets)) for length, nets in sorted(by_len.items(), reverse=True)]
+            for version, by_len in prefixes.items()
+        }
+        self._v4_starts, self._v4_ends = _merge_ranges(v4_ranges)
+
+    def __len__(self) -> int:
+        """Number of entries (addresses and prefixes) the set was built from."""
+        return self._count
+
+    def __repr__(self) -> str:
+        return f"IPSet({self._count} entries)"
+
+    def networks(self) -> list[str]:
+        """The set's addresses and prefixes in canonical CIDR form, sorted (e.g. to compare two sets)."""
+        nets = [ipaddress.ip_network(ip) for ip in self._exact if isinstance(ip, str)]
+        for version, by_len in self._prefixes.items():
+            bits = _BITS[version]
+            nets.extend(ipaddress.ip_network((net << (bits - length), length)) for length, group in by_len for net in group)
+        return [str(net) for net in sorted(nets, key=lambda n: (n.version, n))]
+
+    def __contains__(self, ip) -> bool:
+        if ip in self._exact:
+            return True
+        version, value = _address_int(ip)
+        if not version:
+            return False
+        bits = _BITS[version]
+        for length, nets in self._prefixes[version]:
+            if value >> (bits - length) in nets:
+                return True
+        return False
+
+    def mask(self, ips: Iterable) -> np.ndarray:
+        """Membership of each address, e.g. of the categories of an IP column."""
+        return np.fromiter((ip is not None and ip in self for ip in ips), dtype=bool)
+
+    def contains_v4(self, addrs: np.ndarray) -> np.ndarray:
+        """Vectorized membership of IPv4 addresses given as uint32."""
+        if not len(self._v4_starts):
+            return np.zeros(len(addrs), dtype=bool)
+        addrs = np.asarray(addrs, dtype=np.int64)
+        i = np.searchsorted(self._v4_starts, addrs, side="right") - 1
+        return (i >= 0) & (addrs <= self._v4_ends[np.maximum(i, 0)])
+
+
+def _merge_ranges(ranges: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray]:
+    """Sorted disjoint (start, end) arrays covering the inclusive ``ranges``."""
+    if not ranges:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts, ends = np.array(ranges, dtype=np.int64).T
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # a range starts a new block unless it touches or overlaps the blocks before it
+    first = np.concatenate([[True], starts[1:] > ends[:-1] + 1])
+    last = np.concatenate([first[1:], [True]])
+    return starts[first], ends[last]
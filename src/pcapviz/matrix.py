@@ -0,0 +1,158 @@
+"""Sparse src x dst conversation matrix.
+
+A dense src x dst table needs hosts^2 cells (billions with 50k hosts) while a
+capture only has as many non-zero cells as host pairs. ``ConversationMatrix``
+keeps the pairs as CSR over integer host codes (``hosts`` sorted as strings,
+rows sorted by source then destination) and offers bounded views: the top-K
+conversations, one host's row or column, and a dense sub-matrix of the top-N
+hosts. ``triplets`` / ``to_csv`` / ``to_parquet`` export the non-zero cells.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+TRIPLET_COLUMNS = ["src_ip", "dst_ip", "bytes", "packets"]
+
+
+class ConversationMatrix:
+    """Bytes and packets per (src, dst) host pair, stored as CSR."""
+
+    def __init__(self, hosts: np.ndarray, src: np.ndarray, dst: np.ndarray, nbytes: np.ndarray, packets: np.ndarray) -> None:
+        order = np.lexsort((dst, src))
+        self.hosts = hosts
+        self.src = src[order]
+        self.dst = dst[order]
+        self.bytes = nbytes[order]
+        self.packets = packets[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(self.src, minlength=len(hosts)))])
+        self._by_dst: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_counts(cls, pairs: pd.DataFrame) -> "ConversationMatrix":
+        """From ``metrics.pair_counts`` (protocols are summed)."""
+        src_ip = pairs["src_ip"].to_numpy(dtype=object)
+        dst_ip = pairs["dst_ip"].to_numpy(dtype=object)
+        hosts = np.unique(np.concatenate([src_ip, dst_ip]).astype(str))
+        src = np.searchsorted(hosts, src_ip.astype(str))
+        dst = np.searchsorted(hosts, dst_ip.astype(str))
+        # one cell per (src, dst): sum the per-protocol rows
+        cells, inverse = np.unique(src.astype(np.int64) * max(len(hosts), 1) + dst, return_inverse=True)
+        nbytes = np.bincount(inverse, pairs["bytes"].to_numpy(dtype=np.float64), len(cells)).astype(np.int64)
+        packets = np.bincount(inverse, pairs["packets"].to_numpy(dtype=np.float64), len(cells)).astype(np.int64)
+        n = max(len(hosts), 1)
+        return cls(hosts, cells // n, cells % n, nbytes, packets)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.hosts), len(self.hosts)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.bytes)
+
+    @property
+    def empty(self) -> bool:
+        return self.nnz == 0
+
+    def _frame(self, idx: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "src_ip": self.hosts[self.src[idx]],
+                "dst_ip": self.hosts[self.dst[idx]],
+                "bytes": self.bytes[idx],
+                "packets": self.packets[idx],
+            },
+            columns=TRIPLET_COLUMNS,
+        )
+
+    def triplets(self) -> pd.DataFrame:
+        """All non-zero cells as (src_ip, dst_ip, bytes, packets), by source then destination."""
+        return self._frame(np.arange(self.nnz))
+
+    def top(self, k: int = 20) -> pd.DataFrame:
+        """The k conversations with the most bytes, largest first."""
+        if k < self.nnz:
+            idx = np.argpartition(-self.bytes, k)[:k]
+        else:
+            idx = np.arange(self.nnz)
+        idx = idx[np.argsort(-self.bytes[idx], kind="stable")]
+        return self._frame(idx).reset_index(drop=True)
+
+    def _code(self, ip: str) -> Optional[int]:
+        i = int(np.searchsorted(self.hosts, ip))
+        return i if i < len(self.hosts) and self.hosts[i] == ip else None
+
+    def row(self, ip: str) -> pd.DataFrame:
+        """What ``ip`` sent, per destination, largest first."""
+        code = self._code(ip)
+        if code is None:
+            return pd.DataFrame(columns=TRIPLET_COLUMNS)
+        idx = np.arange(self.indptr[code], self.indptr[code + 1])
+        return self._frame(idx[np.argsort(-self.bytes[idx], kind="stable")]).reset_index(drop=True)
+
+    def column(self, ip: str) -> pd.DataFrame:
+        """What ``ip`` received, per source, largest first."""
+        code = self._code(ip)
+        if code is None:
+            return pd.DataFrame(columns=TRIPLET_COLUMNS)
+        if self._by_dst is None:
+            # CSC order, built on first use
+            self._by_dst = np.argsort(self.dst, kind="stable")
+        start, end = np.searchsorted(self.dst[self._by_dst], [code, code + 1])
+        idx = self._by_dst[start:end]
+        return self._frame(idx[np.argsort(-self.bytes[idx], kind="stable")]).reset_index(drop=True)
+
+    def host_traffic(self) -> pd.Series:
+        """Bytes sent plus received per host."""
+        n = len(self.hosts)
+        weights = self.bytes.astype(np.float64)
+        total = np.bincount(self.src, weights, n) + np.bincount(self.dst, weights, n)
+        return pd.Series(total.astype(np.int64), index=self.hosts)
+
+    def dense(self, top_n: Optional[int] = None) -> pd.DataFrame:
+        """Dense src x dst bytes table (like ``pivot_table``), limited to the top_n hosts by traffic.
+
+        Rows are the selected hosts that sent something, columns those that
+        received something, both in host order; missing cells are 0.
+        """
+        n = len(self.hosts)
+        if n == 0:
+            return pd.DataFrame()
+        selected = np.ones(n, dtype=bool)
+        if top_n is not None and top_n < n:
+            selected[:] = False
+            selected[np.argsort(-self.host_traffic().to_numpy(), kind="stable")[:top_n]] = True
+        keep = selected[self.src] & selected[self.dst]
+        src, dst, nbytes = self.src[keep], self.dst[keep], self.bytes[keep]
+        rows = np.unique(src)
+        cols = np.unique(dst)
+        values = np.zeros((len(rows), len(cols)), dtype=np.int64)
+        values[np.searchsorted(rows, src), np.searchsorted(cols, dst)] = nbytes
+        return pd.DataFrame(
+            values,
+            index=pd.Index(self.hosts[rows], name="src_ip"),
+            columns=pd.Index(self.hosts[cols], name="dst_ip"),
+        )
+
+    def to_csv(self, path) -> None:
+        self.triplets().to_csv(path, index=False)
+
+    def to_parquet(self, path) -> None:
+        """Write the triplets as Parquet (needs pyarrow)."""
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)") from exc
+        self.triplets().to_parquet(path, index=False)
+
+    def to_scipy(self):
+        """The bytes as a ``scipy.sparse.csr_matrix`` over host codes (needs scipy)."""
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError as exc:
+            raise ImportError("to_scipy needs scipy (pip install scipy)") from exc
+        return csr_matrix((self.bytes, self.dst, self.indptr), shape=self.shape)
@@ -1,70 +1,263 @@
 from __future__ import annotations
 
+import math
+from typing import Iterator, Optional
+
+import numpy as np
 import pandas as pd
 
+from .columns import take_rows
+from .matrix import ConversationMatrix
+from .sketch import HeavyHitters
+
+# Metrics are computed in two steps: a partial aggregate of the packets (``*_counts``),
+# which can be summed across chunks of a capture, and a finishing step turning the
+# counts into the metric table. ``streaming`` merges the counts of packet chunks and
+# finishes them with the same functions. The ``compute_*`` functions take ``rows``
+# (positions of the packets to use) and ``sample_rate`` (see ``scale_estimates``).
+
+PAIR_KEYS = ["src_ip", "dst_ip", "protocol"]
+PORT_KEYS = ["protocol", "dst_port"]
+
+# Columns read by the pair, port and throughput counts
+PAIR_COLUMNS = PAIR_KEYS + ["length"]
+PORT_COLUMNS = PORT_KEYS + ["length"]
+THROUGHPUT_COLUMNS = ["timestamp", "length"]
+
+_SKETCH_CHUNK = 65536
+# resample(rule) bins of a fixed interval start at midnight of the first timestamp's day
+DAY_NANOS = 86_400 * 10**9
+
+
+def packet_chunks(packets_df: pd.DataFrame, chunk_size: int = _SKETCH_CHUNK) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(packets_df), chunk_size):
+        yield packets_df.iloc[start:start + chunk_size]
 
-def compute_top_talkers(packets_df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
-    """Return top n IPs by total bytes sent+received."""
-    if packets_df.empty:
-        return pd.DataFrame(columns=["ip", "bytes", "packets"])
 
-    by_src = (
-        packets_df.groupby("src_ip").agg(bytes=("length", "sum"), packets=("length", "count")).rename_axis("ip")
+def pair_counts(packets_df: pd.DataFrame) -> pd.DataFrame:
+    """Bytes and packets per (src_ip, dst_ip, protocol), sorted by key.
+
+    The partial aggregate behind top talkers, the protocol breakdown, the
+    conversation matrix and the host graph.
+    """
+    return (
+        packets_df.groupby(PAIR_KEYS, observed=True)
+        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        .reset_index()
     )
-    by_dst = (
-        packets_df.groupby("dst_ip").agg(bytes=("length", "sum"), packets=("length", "count")).rename_axis("ip")
+
+
+def port_counts(packets_df: pd.DataFrame) -> pd.DataFrame:
+    """Bytes and packets per (protocol, dst_port) for packets with ports, sorted by key."""
+    df = packets_df[packets_df["dst_port"].notna()]
+    return (
+        df.groupby(["protocol", df["dst_port"].astype(np.int64)], observed=True)
+        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        .reset_index()
     )
-    total = by_src.add(by_dst, fill_value=0).sort_values("bytes", ascending=False)
-    return total.reset_index().head(n)
 
 
-def compute_top_ports(packets_df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
-    """Return top n destination ports by bytes, separately for TCP and UDP."""
-    if packets_df.empty:
-        return pd.DataFrame(columns=["protocol", "port", "bytes", "packets"])
+def throughput_counts(packets_df: pd.DataFrame, rule: str = "1S") -> pd.DataFrame:
+    """Bytes and packets per time bucket for a fixed-width rule, as (bucket, bytes, packets).
 
-    df = packets_df.copy()
-    df = df[df["dst_port"].notna()]
-    df["dst_port"] = df["dst_port"].astype(int)
-    agg = (
-        df.groupby(["protocol", "dst_port"]).agg(bytes=("length", "sum"), packets=("length", "count"))
-        .sort_values("bytes", ascending=False)
+    ``compute_throughput`` bins start at midnight of the first packet's day,
+    which is only known once every chunk is counted. Buckets are numbered from
+    the Unix epoch with a width dividing both the rule and a day (the rule's
+    own for rules dividing a day), so each bin is whole buckets whichever day
+    it starts on.
+    """
+    width = _bucket_nanos(rule)
+    bucket = packets_df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64) // width
+    return (
+        packets_df.groupby(bucket)
+        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        .rename_axis("bucket")
         .reset_index()
     )
-    return agg.groupby("protocol").head(n).reset_index(drop=True)
 
 
-def compute_protocol_breakdown(packets_df: pd.DataFrame) -> pd.DataFrame:
-    """Return bytes and packets by protocol."""
-    if packets_df.empty:
-        return pd.DataFrame(columns=["protocol", "bytes", "packets"])
+def talker_counts(pairs: pd.DataFrame) -> pd.DataFrame:
+    """Per-IP (ip, bytes, packets) rows of ``pair_counts``: each pair counts for its source and its destination."""
+    src = pairs[["src_ip", "bytes", "packets"]].rename(columns={"src_ip": "ip"})
+    dst = pairs[["dst_ip", "bytes", "packets"]].rename(columns={"dst_ip": "ip"})
+    return pd.concat([src, dst], ignore_index=True)
+
+
+def update_port_sketches(sketches: dict, ports: pd.DataFrame, epsilon: float) -> None:
+    """Fold ``port_counts`` into one ``HeavyHitters`` per protocol, so each protocol gets its own error bound."""
+    for protocol, group in ports.groupby("protocol", observed=True):
+        sketch = sketches.get(protocol)
+        if sketch is None:
+            sketch = sketches[protocol] = HeavyHitters(PORT_KEYS, epsilon)
+        sketch.update(group)
+
+
+def rule_nanos(rule: str) -> int:
+    """Width in nanoseconds of a fixed-interval resample rule; ValueError for calendar rules like 'M'."""
+    try:
+        return pd.tseries.frequencies.to_offset(rule).nanos
+    except ValueError as exc:
+        raise ValueError(f"Throughput rule must be a fixed interval such as '1S' or '100ms', got {rule!r}") from exc
+
+
+def _bucket_nanos(rule: str) -> int:
+    return math.gcd(rule_nanos(rule), DAY_NANOS)
+
+
+def top_talkers_from_counts(pairs: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    if pairs.empty:
+        return pd.DataFrame(columns=["ip", "bytes", "packets"])
+    by_src = pairs.groupby("src_ip", observed=True)[["bytes", "packets"]].sum().rename_axis("ip")
+    by_dst = pairs.groupby("dst_ip", observed=True)[["bytes", "packets"]].sum().rename_axis("ip")
+    total = by_src.add(by_dst, fill_value=0).sort_values("bytes", ascending=False)
+    return total.reset_index().head(n)
+
+
+def top_ports_from_sketches(sketches: dict, n: Optional[int] = 10) -> pd.DataFrame:
+    """Top n ports of each protocol's ``HeavyHitters`` (every tracked port if n is None), largest first."""
+    if not sketches:
+        return pd.DataFrame(columns=PORT_KEYS + ["bytes", "packets", "bytes_error"])
+    tops = pd.concat([s.table() if n is None else s.top(n) for s in sketches.values()], ignore_index=True)
+    return tops.sort_values("bytes", ascending=False, kind="stable").reset_index(drop=True)
+
 
+def top_ports_from_counts(ports: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    agg = ports.sort_values("bytes", ascending=False).reset_index(drop=True)
+    return agg.groupby("protocol", observed=True).head(n).reset_index(drop=True)
+
+
+def protocol_breakdown_from_counts(pairs: pd.DataFrame) -> pd.DataFrame:
+    if pairs.empty:
+        return pd.DataFrame(columns=["protocol", "bytes", "packets"])
     return (
-        packets_df.groupby("protocol")
-        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        pairs.groupby("protocol", observed=True)[["bytes", "packets"]]
+        .sum()
         .sort_values("bytes", ascending=False)
         .reset_index()
     )
 
 
-def compute_throughput(packets_df: pd.DataFrame, rule: str = "1S") -> pd.DataFrame:
+def throughput_from_counts(buckets: pd.DataFrame, rule: str = "1S") -> pd.DataFrame:
+    """Throughput table from ``throughput_counts``, with empty buckets filled in as ``resample`` does."""
+    if buckets.empty:
+        return pd.DataFrame(columns=["timestamp", "bytes", "packets"])
+    width = rule_nanos(rule)
+    start = buckets["bucket"].to_numpy(dtype=np.int64) * _bucket_nanos(rule)
+    origin = start.min() - start.min() % DAY_NANOS
+    series = buckets[["bytes", "packets"]].groupby((start - origin) // width).sum()
+    full = np.arange(series.index.min(), series.index.max() + 1, dtype=np.int64)
+    res = series.reindex(full, fill_value=0)
+    timestamps = pd.to_datetime(origin + full * width, unit="ns", utc=True)
+    return pd.DataFrame(
+        {"timestamp": timestamps, "bytes": res["bytes"].to_numpy(), "packets": res["packets"].to_numpy()}
+    )
+
+
+def conversation_matrix_from_counts(pairs: pd.DataFrame, top_n: Optional[int] = None) -> pd.DataFrame:
+    if pairs.empty:
+        return pd.DataFrame()
+    return ConversationMatrix.from_counts(pairs).dense(top_n)
+
+
+def scale_estimates(table: pd.DataFrame, sample_rate: int = 1) -> pd.DataFrame:
+    """Counts of a 1-in-``sample_rate`` sample scaled up to the capture.
+
+    bytes, packets (and bytes_error) are multiplied by the rate and a
+    ``sample_rate`` column marks them as estimates; the table is returned
+    as is when ``sample_rate`` is 1.
+    """
+    if sample_rate == 1:
+        return table
+    scaled = {col: table[col] * sample_rate for col in ("bytes", "packets", "bytes_error") if col in table}
+    return table.assign(**scaled, sample_rate=sample_rate)
+
+
+def compute_top_talkers(
+    packets_df: pd.DataFrame,
+    n: int = 10,
+    epsilon: Optional[float] = None,
+    rows: Optional[np.ndarray] = None,
+    sample_rate: int = 1,
+) -> pd.DataFrame:
+    """Return top n IPs by total bytes sent+received.
+
+    With ``epsilon``, estimate them with a heavy-hitter sketch (see ``sketch``) in
+    memory independent of the number of hosts; the estimates get a ``bytes_error``.
+    """
+    packets_df = take_rows(packets_df, rows, PAIR_COLUMNS)
+    if epsilon is not None:
+        sketch = HeavyHitters(["ip"], epsilon)
+        for chunk in packet_chunks(packets_df):
+            sketch.update(talker_counts(pair_counts(chunk)))
+        return scale_estimates(sketch.top(n), sample_rate)
+    if packets_df.empty:
+        return scale_estimates(pd.DataFrame(columns=["ip", "bytes", "packets"]), sample_rate)
+    return scale_estimates(top_talkers_from_counts(pair_counts(packets_df), n), sample_rate)
+
+
+def compute_top_ports(
+    packets_df: pd.DataFrame,
+    n: int = 10,
+    epsilon: Optional[float] = None,
+    rows: Optional[np.ndarray] = None,
+    sample_rate: int = 1,
+) -> pd.DataFrame:
+    """Return top n destination ports by bytes, separately for TCP and UDP.
+
+    With ``epsilon``, estimate them with a heavy-hitter sketch per protocol.
+    """
+    packets_df = take_rows(packets_df, rows, PORT_COLUMNS)
+    if epsilon is not None:
+        sketches: dict = {}
+        for chunk in packet_chunks(packets_df):
+            update_port_sketches(sketches, port_counts(chunk), epsilon)
+        return scale_estimates(top_ports_from_sketches(sketches, n), sample_rate)
+    if packets_df.empty:
+        return scale_estimates(pd.DataFrame(columns=["protocol", "port", "bytes", "packets"]), sample_rate)
+    return scale_estimates(top_ports_from_counts(port_counts(packets_df), n), sample_rate)
+
+
+def compute_protocol_breakdown(
+    packets_df: pd.DataFrame, rows: Optional[np.ndarray] = None, sample_rate: int = 1
+) -> pd.DataFrame:
+    """Return bytes and packets by protocol."""
+    packets_df = take_rows(packets_df, rows, PAIR_COLUMNS)
+    if packets_df.empty:
+        return scale_estimates(pd.DataFrame(columns=["protocol", "bytes", "packets"]), sample_rate)
+    return scale_estimates(protocol_breakdown_from_counts(pair_counts(packets_df)), sample_rate)
+
+
+def compute_throughput(
+    packets_df: pd.DataFrame, rule: str = "1S", rows: Optional[np.ndarray] = None, sample_rate: int = 1
+) -> pd.DataFrame:
     """Compute throughput over time using pandas resample rule (e.g., '1S', '100ms')."""
+    packets_df = take_rows(packets_df, rows, THROUGHPUT_COLUMNS)
     if packets_df.empty:
-        return pd.DataFrame(columns=["timestamp", "bytes", "packets"])
+        return scale_estimates(pd.DataFrame(columns=["timestamp", "bytes", "packets"]), sample_rate)
 
     series = packets_df.set_index("timestamp").sort_index()
     res = series["length"].resample(rule).agg(["sum", "count"]).rename(
         columns={"sum": "bytes", "count": "packets"}
     )
     res = res.reset_index().rename(columns={"index": "timestamp"})
-    return res
+    return scale_estimates(res, sample_rate)
 
 
-def compute_conversation_matrix(packets_df: pd.DataFrame) -> pd.DataFrame:
-    """Return a pivot table (IP x IP) with total bytes from src to dst."""
+def compute_conversation_matrix(
+    packets_df: pd.DataFrame, top_n: Optional[int] = None, rows: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """Return a pivot table (IP x IP) with total bytes from src to dst.
+
+    Dense: limit it to the ``top_n`` hosts by traffic on large captures, or use
+    ``sparse_conversation_matrix``.
+    """
+    packets_df = take_rows(packets_df, rows, PAIR_COLUMNS)
     if packets_df.empty:
         return pd.DataFrame()
-    pivot = (
-        packets_df.pivot_table(index="src_ip", columns="dst_ip", values="length", aggfunc="sum", fill_value=0)
-    )
-    return pivot
+    return conversation_matrix_from_counts(pair_counts(packets_df), top_n)
+
+
+def sparse_conversation_matrix(packets_df: pd.DataFrame, rows: Optional[np.ndarray] = None) -> ConversationMatrix:
+    """Return the src x dst bytes/packets as a sparse ``matrix.ConversationMatrix``."""
+    packets_df = take_rows(packets_df, rows, PAIR_COLUMNS)
+    return ConversationMatrix.from_counts(pair_counts(packets_df))
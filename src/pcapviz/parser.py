@@ -1,10 +1,43 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterator, Optional, Tuple, Iterable
-
+import math
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from itertools import chain, islice
+from typing import Callable, Iterator, Optional, Tuple, Iterable
+
+import numpy as np
 import pandas as pd
-from scapy.all import IP, IPv6, PcapReader, TCP, UDP
+from scapy.all import IP, IPv6, PcapReader, TCP, UDP, conf
+
+from .columns import PacketTableBuilder, concat_packet_frames, ipv4_packets_frame, string_view
+from .decoder import (
+    COMPRESSION_MAGIC_SIZE,
+    SCAPY_FALLBACK,
+    CaptureRange,
+    CaptureSource,
+    ReadState,
+    capture_compression,
+    decode_frame,
+    decode_ipv4_batch,
+    iter_range,
+    is_path,
+    iter_records,
+    open_capture,
+    split_capture,
+    tcp_flags_mask,
+)
+from .index import CaptureIndex
+from .ipset import IPSet
+from .sampling import SampleOptions
+
+# Bump whenever parsing changes the packet/flow tables, so cached parses are not reused.
+PARSER_VERSION = "2"
+_SAMPLED_FLOWS_CACHE = 1 << 16  # 5-tuples whose sampling decision is remembered
 
 
 @dataclass(frozen=True)
@@ -34,7 +67,7 @@ class FlowKey:
 
 @dataclass
 class FilterOptions:
-    include_ips: Optional[Iterable[str]] = None  # exact match list
+    include_ips: Optional[Iterable[str]] = None  # addresses and CIDR prefixes, or an IPSet
     exclude_ips: Optional[Iterable[str]] = None
     protocols: Optional[Iterable[str]] = None  # e.g. {"TCP","UDP"}
     src_ports: Optional[Iterable[int]] = None
@@ -42,172 +75,894 @@ class FilterOptions:
     time_start: Optional[pd.Timestamp] = None  # UTC
     time_end: Optional[pd.Timestamp] = None    # UTC
 
+    def compile(self) -> "CompiledFilter":
+        """Compile into a predicate with hashed sets and epoch-second time bounds."""
+        return CompiledFilter(
+            time_start=_epoch_seconds(self.time_start),
+            time_end=_epoch_seconds(self.time_end, upper=True),
+            include_ips=_ip_set(self.include_ips),
+            exclude_ips=_ip_set(self.exclude_ips),
+            protocols=None if self.protocols is None else frozenset(self.protocols),
+            src_ports=None if self.src_ports is None else frozenset(int(p) for p in self.src_ports),
+            dst_ports=None if self.dst_ports is None else frozenset(int(p) for p in self.dst_ports),
+        )
+
+
+def _to_ns(seconds: float) -> int:
+    # the conversion PacketTableBuilder.to_frame applies to timestamps
+    return int(pd.to_datetime(np.array([seconds]), unit="s").asi8[0])
+
+
+def _epoch_seconds(ts, upper: bool = False) -> Optional[float]:
+    """Float bound matching ``ts`` exactly on the packets table's nanosecond timestamps.
+
+    Returns the smallest float timestamp stored at or after ``ts`` (or, with
+    ``upper``, the largest stored at or before it).
+    """
+    if ts is None:
+        return None
+    ns = to_utc(ts).value
+    x = ns / 1e9
+    if upper:
+        while _to_ns(x) > ns:
+            x = math.nextafter(x, -math.inf)
+        while _to_ns(math.nextafter(x, math.inf)) <= ns:
+            x = math.nextafter(x, math.inf)
+    else:
+        while _to_ns(x) < ns:
+            x = math.nextafter(x, math.inf)
+        while _to_ns(math.nextafter(x, -math.inf)) >= ns:
+            x = math.nextafter(x, -math.inf)
+    return x
+
+
+def _ip_set(ips: Optional[Iterable[str]]) -> Optional[IPSet]:
+    """Compiled address/prefix set; matches text and packed addresses, so both engines can use it."""
+    if ips is None or isinstance(ips, IPSet):
+        return ips
+    return IPSet(ips)
+
 
-def _pass_filters(pkt_row: dict, opts: Optional[FilterOptions]) -> bool:
-    if opts is None:
+@dataclass(frozen=True)
+class CompiledFilter:
+    """FilterOptions compiled for per-packet use.
+
+    Checks are split by layer so the native parser can reject a record on its
+    timestamp before decoding, and on its addresses before reading L4 headers.
+    Addresses may be packed bytes or text. ``sample`` (flow sampling) also
+    rejects the packets of flows outside the sample.
+    """
+
+    time_start: Optional[float] = None  # epoch seconds
+    time_end: Optional[float] = None
+    include_ips: Optional[IPSet] = None
+    exclude_ips: Optional[IPSet] = None
+    protocols: Optional[frozenset] = None
+    src_ports: Optional[frozenset] = None
+    dst_ports: Optional[frozenset] = None
+    sample: Optional[SampleOptions] = None
+
+    @property
+    def has_ip_filter(self) -> bool:
+        return self.include_ips is not None or self.exclude_ips is not None
+
+    @property
+    def has_l4_filter(self) -> bool:
+        return self.protocols is not None or self.src_ports is not None or self.dst_ports is not None
+
+    def accept_time(self, timestamp: float) -> bool:
+        if self.time_start is not None and timestamp < self.time_start:
+            return False
+        if self.time_end is not None and timestamp > self.time_end:
+            return False
         return True
 
-    ts = pd.to_datetime(pkt_row["timestamp"], unit="s", utc=True)
-    src = pkt_row["src_ip"]
-    dst = pkt_row["dst_ip"]
-    proto = pkt_row["protocol"]
-    sp = pkt_row["src_port"]
-    dp = pkt_row["dst_port"]
+    def accept_ips(self, src, dst) -> bool:
+        include = self.include_ips
+        if include is not None and src not in include and dst not in include:
+            return False
+        exclude = self.exclude_ips
+        if exclude is not None and (src in exclude or dst in exclude):
+            return False
+        return True
 
-    if opts.time_start is not None and ts < opts.time_start:
-        return False
-    if opts.time_end is not None and ts > opts.time_end:
-        return False
+    def accept_l4(self, protocol: str, src_port: Optional[int], dst_port: Optional[int]) -> bool:
+        if self.protocols is not None and protocol not in self.protocols:
+            return False
+        if self.src_ports is not None and src_port is not None and src_port not in self.src_ports:
+            return False
+        if self.dst_ports is not None and dst_port is not None and dst_port not in self.dst_ports:
+            return False
+        return True
 
-    if opts.include_ips is not None and src not in opts.include_ips and dst not in opts.include_ips:
-        return False
-    if opts.exclude_ips is not None and (src in opts.exclude_ips or dst in opts.exclude_ips):
-        return False
+    def __call__(self, record: tuple) -> bool:
+        """Check a full ``columns.RECORD_FIELDS`` record."""
+        return (
+            self.accept_time(record[0])
+            and self.accept_ips(record[2], record[3])
+            and self.accept_l4(record[6], record[4], record[5])
+            and (self.sample is None or self.sample.keep_flows(record[2], record[3], record[4], record[5], record[6]))
+        )
 
-    if opts.protocols is not None and proto not in opts.protocols:
-        return False
+    def batch_mask(self, fields: dict) -> np.ndarray:
+        """Vectorized check of the IPv4 TCP/UDP rows of ``decoder.decode_ipv4_batch``."""
+        ts = fields["timestamp"]
+        mask = np.ones(len(ts), dtype=bool)
+        if self.time_start is not None:
+            mask &= ts >= self.time_start
+        if self.time_end is not None:
+            mask &= ts <= self.time_end
+        if self.include_ips is not None:
+            include = self.include_ips
+            mask &= include.contains_v4(fields["src"]) | include.contains_v4(fields["dst"])
+        if self.exclude_ips is not None:
+            exclude = self.exclude_ips
+            mask &= ~(exclude.contains_v4(fields["src"]) | exclude.contains_v4(fields["dst"]))
+        if self.protocols is not None:
+            mask &= np.where(fields["protocol"] == 6, "TCP" in self.protocols, "UDP" in self.protocols)
+        if self.src_ports is not None:
+            mask &= np.isin(fields["src_port"], list(self.src_ports))
+        if self.dst_ports is not None:
+            mask &= np.isin(fields["dst_port"], list(self.dst_ports))
+        if self.sample is not None:
+            mask &= self.sample.keep_flows(
+                fields["src"], fields["dst"], fields["src_port"], fields["dst_port"], fields["protocol"]
+            )
+        return mask
+
+
+def _compile_filters(filters: Optional[FilterOptions], sample: Optional[SampleOptions]) -> Optional[CompiledFilter]:
+    """The compiled filters, with flow sampling added to them."""
+    flt = filters.compile() if filters is not None else None
+    if sample is None or sample.mode != "flow" or sample.rate == 1:
+        return flt
+    return replace(flt if flt is not None else CompiledFilter(), sample=sample)
+
+
+def _category_mask(col: pd.Series, values) -> np.ndarray:
+    """``col.isin(values)`` for a categorical column, evaluated once per category."""
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        return col.isin(list(values)).to_numpy()
+    hit = col.cat.categories.isin(list(values))
+    codes = col.cat.codes.to_numpy()
+    return np.append(hit, False)[codes]  # code -1 (missing) indexes the trailing False
+
+
+def _ip_mask(col: pd.Series, ips: IPSet) -> np.ndarray:
+    """Rows of an IP column whose address is in ``ips``, evaluated once per distinct address."""
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        return ips.mask(col)
+    hit = ips.mask(col.cat.categories)
+    return np.append(hit, False)[col.cat.codes.to_numpy()]
+
+
+def _port_mask(col: pd.Series, ports) -> np.ndarray:
+    # packets without ports pass port filters, as in CompiledFilter.accept_l4
+    return (col.isna() | col.isin(list(ports))).to_numpy(dtype=bool)
+
+
+def apply_filters(packets_df: pd.DataFrame, filters: Optional[FilterOptions]) -> pd.DataFrame:
+    """Rows of an (unfiltered) packets table passing ``filters``, with the semantics of a filtered parse."""
+    if filters is None or packets_df.empty:
+        return packets_df
+    flt = filters.compile()
+    mask = np.ones(len(packets_df), dtype=bool)
+    ts = packets_df["timestamp"]
+    if filters.time_start is not None:
+        mask &= (ts >= to_utc(filters.time_start)).to_numpy()
+    if filters.time_end is not None:
+        mask &= (ts <= to_utc(filters.time_end)).to_numpy()
+    if flt.include_ips is not None:
+        mask &= _ip_mask(packets_df["src_ip"], flt.include_ips) | _ip_mask(packets_df["dst_ip"], flt.include_ips)
+    if flt.exclude_ips is not None:
+        mask &= ~(_ip_mask(packets_df["src_ip"], flt.exclude_ips) | _ip_mask(packets_df["dst_ip"], flt.exclude_ips))
+    if flt.protocols is not None:
+        mask &= _category_mask(packets_df["protocol"], flt.protocols)
+    if flt.src_ports is not None:
+        mask &= _port_mask(packets_df["src_port"], flt.src_ports)
+    if flt.dst_ports is not None:
+        mask &= _port_mask(packets_df["dst_port"], flt.dst_ports)
+    return packets_df[mask]
+
+
+def to_utc(ts) -> pd.Timestamp:
+    """``ts`` as a Timestamp; naive values are taken as UTC, like the packets table's timestamps."""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts
+
+
+def _scapy_row(pkt, timestamp: float) -> Optional[dict]:
+    """Extract a packet row from a dissected Scapy packet, or None if it has no IP layer."""
+    l3 = pkt.getlayer(IP) or pkt.getlayer(IPv6)
+    if l3 is None:
+        return None
+
+    ip_version = 4 if l3.version == 4 else 6
+    src_ip = l3.src
+    dst_ip = l3.dst
+    ttl = int(getattr(l3, "ttl", getattr(l3, "hlim", 0)))
+
+    protocol = "OTHER"
+    src_port: Optional[int] = None
+    dst_port: Optional[int] = None
+    tcp_flags_str: Optional[str] = None
+
+    l4_tcp = pkt.getlayer(TCP)
+    l4_udp = pkt.getlayer(UDP)
+    if l4_tcp is not None:
+        protocol = "TCP"
+        src_port = int(l4_tcp.sport)
+        dst_port = int(l4_tcp.dport)
+        tcp_flags_str = l4_tcp.flags.flagrepr() if hasattr(l4_tcp.flags, "flagrepr") else str(l4_tcp.flags)
+    elif l4_udp is not None:
+        protocol = "UDP"
+        src_port = int(l4_udp.sport)
+        dst_port = int(l4_udp.dport)
+    else:
+        protocol = str(getattr(l3, "name", "OTHER")).upper()
+
+    return {
+        "timestamp": timestamp,
+        "src_ip": src_ip,
+        "dst_ip": dst_ip,
+        "src_port": src_port,
+        "dst_port": dst_port,
+        "protocol": protocol,
+        "length": int(len(pkt)),
+        "ip_version": ip_version,
+        "ttl": ttl,
+        "tcp_flags": tcp_flags_str,
+    }
+
+
+def _dissect(linktype: int, frame: bytes):
+    """Dissect one raw frame with Scapy the way PcapReader would."""
+    cls = conf.l2types.num2layer.get(linktype, conf.raw_layer)
+    try:
+        return cls(frame)
+    except Exception:
+        return conf.raw_layer(frame)
+
+
+def _scapy_record(pkt, timestamp: float) -> Optional[tuple]:
+    row = _scapy_row(pkt, timestamp)
+    if row is None:
+        return None
+    return (
+        timestamp,
+        row["length"],
+        row["src_ip"],
+        row["dst_ip"],
+        row["src_port"],
+        row["dst_port"],
+        row["protocol"],
+        row["ip_version"],
+        row["ttl"],
+        tcp_flags_mask(row["tcp_flags"]),
+    )
+
+
+def _decode_records(raw: Iterator[tuple], flt: Optional[CompiledFilter] = None) -> Iterator[tuple]:
+    """Turn raw ``decoder`` records into packet records with the native decoder, with per-record Scapy fallback.
+
+    With a filter, records outside the time window are dropped before decoding
+    and excluded addresses before the L4 header is read.
+    """
+    time_start = flt.time_start if flt is not None else None
+    time_end = flt.time_end if flt is not None else None
+    accept_ips = flt.accept_ips if flt is not None and flt.has_ip_filter else None
+    accept_l4 = flt.accept_l4 if flt is not None and flt.has_l4_filter else None
+    keep_flows = flt.sample.keep_flows if flt is not None and flt.sample is not None else None
+    sampled: dict[tuple, bool] = {}  # flow sampling decision per 5-tuple seen
+    for timestamp, linktype, buf, off, caplen in raw:
+        if time_start is not None and timestamp < time_start:
+            continue
+        if time_end is not None and timestamp > time_end:
+            continue
+        fields = decode_frame(linktype, buf, off, off + caplen, accept_ips)
+        if fields is None:
+            continue
+        if fields is SCAPY_FALLBACK:
+            record = _scapy_record(_dissect(linktype, buf[off:off + caplen]), timestamp)
+            if record is not None and (flt is None or flt(record)):
+                yield record
+            continue
+        if accept_l4 is not None and not accept_l4(fields[4], fields[2], fields[3]):
+            continue
+        if keep_flows is not None:
+            key = fields[:5]
+            keep = sampled.get(key)
+            if keep is None:
+                if len(sampled) >= _SAMPLED_FLOWS_CACHE:
+                    sampled.clear()
+                keep = sampled[key] = bool(keep_flows(*key))
+            if not keep:
+                continue
+        yield (timestamp, caplen) + fields
+
+
+def _dissect_records(raw: Iterator[tuple], flt: Optional[CompiledFilter] = None) -> Iterator[tuple]:
+    """Turn raw ``decoder`` records into packet records by dissecting every frame with Scapy."""
+    for timestamp, linktype, buf, off, caplen in raw:
+        record = _scapy_record(_dissect(linktype, buf[off:off + caplen]), timestamp)
+        if record is not None and (flt is None or flt(record)):
+            yield record
 
-    if opts.src_ports is not None and sp is not None and sp not in opts.src_ports:
-        return False
-    if opts.dst_ports is not None and dp is not None and dp not in opts.dst_ports:
-        return False
 
-    return True
+def _iter_records_native(pcap_path: str, flt: Optional[CompiledFilter] = None) -> Iterator[tuple]:
+    """Yield records using the native decoder."""
+    with open_capture(pcap_path) as f:
+        yield from _decode_records(iter_records(f), flt)
+
+
+def _iter_records_scapy(
+    pcap_path: CaptureSource, flt: Optional[CompiledFilter] = None, meter: Optional["_ParseMeter"] = None
+) -> Iterator[tuple]:
+    """Yield records by fully dissecting every packet with Scapy."""
+    with open_capture(pcap_path) as f, PcapReader(f) as pcap:
+        for pkt in pcap:
+            if meter is not None:
+                meter.tick(pcap.f.tell())
+            record = _scapy_record(pkt, float(pkt.time))
+            if record is not None and (flt is None or flt(record)):
+                yield record
+
 
+def _iter_records(pcap_path: str, engine: str = "native", flt: Optional[CompiledFilter] = None) -> Iterator[tuple]:
+    """Yield packet records passing ``flt`` as ``columns.RECORD_FIELDS`` tuples.
 
-def _iter_packets(pcap_path: str, max_packets: Optional[int] = None, filters: Optional[FilterOptions] = None) -> Iterator[dict]:
-    """Yield packet dicts from a PCAP.
+    Addresses are packed bytes (native decoder) or text (Scapy); tcp_flags is a
+    bitmask. engine: "native" decodes record headers directly and uses Scapy only
+    for frames it cannot decode; "scapy" dissects every packet with Scapy.
+    """
+    if engine == "native":
+        return _iter_records_native(pcap_path, flt)
+    if engine == "scapy":
+        return _iter_records_scapy(pcap_path, flt)
+    raise ValueError(f"Unknown parser engine: {engine!r}")
+
+
+@contextmanager
+def _raw_records(
+    pcap_path: CaptureSource,
+    ranges: Optional[list[CaptureRange]] = None,
+    mapped: bool = False,
+    state: Optional[ReadState] = None,
+) -> Iterator[Iterator[tuple]]:
+    """Raw ``decoder`` records of a capture, or of the given ranges in order, while the block runs.
+
+    With ``mapped`` the (uncompressed) capture is memory-mapped and read in place.
+    Records then point into the mapping, which is closed when the block exits:
+    decode them (batches too) before that. ``state`` follows the reader (e.g.
+    its file offset).
+    """
+    with open_capture(pcap_path) as f:
+        if ranges is None:
+            yield iter_records(f, state)
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if mapped and ranges else None
+        try:
+            yield chain.from_iterable(iter_range(f, rng, mm, state) for rng in ranges)
+        finally:
+            if mm is not None:
+                mm.close()
+
+
+def _iter_packets(
+    pcap_path: str,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+) -> Iterator[dict]:
+    """Yield packet dicts from a PCAP (the rows of ``string_view`` over ``iter_packet_chunks``).
 
     Keys: timestamp, src_ip, dst_ip, src_port, dst_port, protocol, length, ip_version, ttl, tcp_flags
     """
-    count = 0
-    with PcapReader(pcap_path) as pcap:
-        for pkt in pcap:
-            if max_packets is not None and count >= max_packets:
-                break
+    for chunk in iter_packet_chunks(pcap_path, max_packets=max_packets, filters=filters, engine=engine):
+        yield from string_view(chunk).to_dict("records")
 
-            l3 = pkt.getlayer(IP) or pkt.getlayer(IPv6)
-            if l3 is None:
-                continue
 
-            ip_version = 4 if l3.version == 4 else 6
-            src_ip = l3.src
-            dst_ip = l3.dst
-            ttl = int(getattr(l3, "ttl", getattr(l3, "hlim", 0)))
-
-            protocol = "OTHER"
-            src_port: Optional[int] = None
-            dst_port: Optional[int] = None
-            tcp_flags_str: Optional[str] = None
-
-            l4_tcp = pkt.getlayer(TCP)
-            l4_udp = pkt.getlayer(UDP)
-            if l4_tcp is not None:
-                protocol = "TCP"
-                src_port = int(l4_tcp.sport)
-                dst_port = int(l4_tcp.dport)
-                tcp_flags_str = l4_tcp.flags.flagrepr() if hasattr(l4_tcp.flags, "flagrepr") else str(l4_tcp.flags)
-            elif l4_udp is not None:
-                protocol = "UDP"
-                src_port = int(l4_udp.sport)
-                dst_port = int(l4_udp.dport)
-            else:
-                protocol = str(getattr(l3, "name", "OTHER")).upper()
-
-            length = int(len(pkt))
-            timestamp = float(pkt.time)
-
-            row = {
-                "timestamp": timestamp,
-                "src_ip": src_ip,
-                "dst_ip": dst_ip,
-                "src_port": src_port,
-                "dst_port": dst_port,
-                "protocol": protocol,
-                "length": length,
-                "ip_version": ip_version,
-                "ttl": ttl,
-                "tcp_flags": tcp_flags_str,
-            }
-
-            if not _pass_filters(row, filters):
-                continue
+def iter_packet_chunks(
+    pcap_path: CaptureSource,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    index: Optional[CaptureIndex] = None,
+    chunk_size: int = 65536,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield the packets table in consecutive chunks of at most ``chunk_size`` rows.
+
+    Chunks have the ``parse_pcap`` packets_df columns and dtypes (each with its
+    own categories); only one chunk is held in memory at a time. ``progress``
+    and ``sample`` work as in ``parse_pcap``.
+    """
+    if index is not None and not is_path(pcap_path):
+        raise ValueError("A capture index needs the capture's path")
+    if index is not None and not index.is_current(pcap_path):
+        raise ValueError(f"Capture index is out of date for {pcap_path}")
+    return _packet_chunks(
+        pcap_path, max_packets, filters, engine, index=index, chunk_size=chunk_size, progress=progress, sample=sample
+    )
+
+
+def _packet_chunks(
+    pcap_path: CaptureSource,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    index: Optional[CaptureIndex] = None,
+    ranges: Optional[list[CaptureRange]] = None,
+    mapped: bool = False,
+    chunk_size: int = 65536,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
+) -> Iterator[pd.DataFrame]:
+    flt = _compile_filters(filters, sample)
+    if index is not None:
+        ranges, mapped = [b.span for b in index.select(flt)], True
+    meter = None if progress is None else _ParseMeter(progress, pcap_path, chunk_size)
+    if engine == "scapy" and ranges is None and sample is None:
+        chunks = record_chunks(_iter_records_scapy(pcap_path, flt, meter), chunk_size)
+    else:
+        chunks = _decoded_chunks(pcap_path, ranges, mapped, engine, flt, chunk_size, meter, sample)
+    chunks = _head_chunks(chunks, max_packets)
+    return chunks if meter is None else meter.count_packets(chunks)
+
+
+def _decoded_chunks(
+    pcap_path: CaptureSource,
+    ranges: Optional[list[CaptureRange]],
+    mapped: bool,
+    engine: str,
+    flt: Optional[CompiledFilter],
+    chunk_size: int,
+    meter: Optional["_ParseMeter"] = None,
+    sample: Optional[SampleOptions] = None,
+) -> Iterator[pd.DataFrame]:
+    # the mapping stays open until the last pending batch has been decoded
+    state = ReadState()
+    with _raw_records(pcap_path, ranges, mapped, state) as raw:
+        if meter is not None:
+            raw = meter.count_records(raw, state)
+        if sample is not None:
+            raw = sample.sample_raw(raw)
+        yield from decode_chunks(raw, engine, flt, chunk_size)
 
-            yield row
-            count += 1
+
+@dataclass(frozen=True)
+class ParseProgress:
+    """Progress of a parse, as passed to ``progress`` callbacks."""
+
+    records: Optional[int]  # capture records read (None: unknown)
+    packets: int  # packets kept so far (after filters)
+    offset: Optional[int]  # file offset reached (None: unknown)
+    size: Optional[int]  # capture file size (None for compressed captures)
+    elapsed_s: float
+    done: bool = False
+
+    @property
+    def rate(self) -> float:
+        """Records (or, if unknown, packets) per second."""
+        count = self.packets if self.records is None else self.records
+        return count / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Share of the file read, from the offset."""
+        if self.done:
+            return 1.0
+        if self.offset is None or not self.size:
+            return None
+        return min(1.0, self.offset / self.size)
+
+    @property
+    def eta_s(self) -> Optional[float]:
+        """Seconds left at the average speed so far."""
+        fraction = self.fraction
+        if not fraction:
+            return None
+        return self.elapsed_s * (1 - fraction) / fraction
+
+
+def _capture_size(pcap_path: CaptureSource) -> Optional[int]:
+    """Size of the capture, or None if it is compressed (offsets then count uncompressed bytes)."""
+    if not is_path(pcap_path):
+        return None if capture_compression(bytes(pcap_path[:COMPRESSION_MAGIC_SIZE])) else len(pcap_path)
+    with open(pcap_path, "rb") as f:
+        if capture_compression(f.read(COMPRESSION_MAGIC_SIZE)):
+            return None
+    return os.path.getsize(pcap_path)
+
+
+class _ParseMeter:
+    """Counts the records and packets of a serial parse and reports them once per batch of records."""
+
+    def __init__(self, callback: Callable[[ParseProgress], None], pcap_path: CaptureSource, every: int) -> None:
+        self.callback = callback
+        self.size = _capture_size(pcap_path)
+        self.every = max(1, every)
+        self.records = 0
+        self.packets = 0
+        self.offset: Optional[int] = None
+        self._next = self.every
+        self._started = time.perf_counter()
+
+    def report(self, done: bool = False) -> None:
+        elapsed = time.perf_counter() - self._started
+        offset = self.size if done and self.size is not None else self.offset
+        self.callback(ParseProgress(self.records, self.packets, offset, self.size, elapsed, done))
+
+    def tick(self, offset: Optional[int]) -> None:
+        """One more record read, at ``offset``; reports when a batch of records is complete."""
+        self.records += 1
+        if self.records > self._next:
+            # the previous batch has been decoded by now, so its packets are counted
+            self._next += self.every
+            self.offset = offset
+            self.report()
+
+    def count_records(self, raw: Iterator[tuple], state: ReadState) -> Iterator[tuple]:
+        for record in raw:
+            self.tick(state.offset)
+            yield record
+
+    def count_packets(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            self.packets += len(chunk)
+            yield chunk
+        self.report(done=True)
+
+
+def decode_chunks(
+    raw: Iterator[tuple], engine: str = "native", flt: Optional[CompiledFilter] = None, chunk_size: int = 65536
+) -> Iterator[pd.DataFrame]:
+    """Packets tables of consecutive batches of ``chunk_size`` raw records, filtered by ``flt``.
+
+    The native engine decodes the plain IPv4 TCP/UDP frames of a batch at once
+    (``decoder.decode_ipv4_batch``) and only the rest record by record; rows keep
+    the capture order either way. Batches left empty by the filter are skipped.
+    """
+    if engine == "native":
+        return _native_chunks(raw, flt, chunk_size)
+    if engine == "scapy":
+        return record_chunks(_dissect_records(raw, flt), chunk_size)
+    raise ValueError(f"Unknown parser engine: {engine!r}")
+
+
+def _native_chunks(raw: Iterator[tuple], flt: Optional[CompiledFilter], chunk_size: int) -> Iterator[pd.DataFrame]:
+    while True:
+        batch = list(islice(raw, chunk_size))
+        if not batch:
+            return
+        decoded, fields = decode_ipv4_batch(batch)
+        fast_index = np.flatnonzero(decoded)
+        if flt is not None:
+            keep = flt.batch_mask(fields)
+            fields = {name: values[keep] for name, values in fields.items()}
+            fast_index = fast_index[keep]
+        frame = ipv4_packets_frame(fields)
+        if len(fast_index) < len(batch):
+            slow_index: list[int] = []
+            position = 0
+
+            def slow_raw() -> Iterator[tuple]:
+                nonlocal position
+                for position in np.flatnonzero(~decoded).tolist():
+                    yield batch[position]
+
+            # _decode_records yields each record before pulling the next raw one
+            records = []
+            for record in _decode_records(slow_raw(), flt):
+                records.append(record)
+                slow_index.append(position)
+            if records:
+                builder = PacketTableBuilder(chunk_size=len(records))
+                builder.extend(records)
+                order = np.argsort(np.concatenate([fast_index, slow_index]), kind="stable")
+                frame = concat_packet_frames([frame, builder.to_frame()]).take(order).reset_index(drop=True)
+        if len(frame):
+            yield frame
+
+
+def _head_chunks(chunks: Iterator[pd.DataFrame], max_packets: Optional[int]) -> Iterator[pd.DataFrame]:
+    """The chunks up to a total of ``max_packets`` rows."""
+    if max_packets is None:
+        yield from chunks
+        return
+    remaining = max_packets
+    for chunk in chunks:
+        if remaining <= 0:
+            return
+        if len(chunk) > remaining:
+            chunk = concat_packet_frames([chunk.iloc[:remaining]])
+        remaining -= len(chunk)
+        yield chunk
+
+
+def record_chunks(records: Iterator[tuple], chunk_size: int = 65536) -> Iterator[pd.DataFrame]:
+    """Build packets tables of at most ``chunk_size`` rows from packet records, one chunk at a time."""
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            return
+        builder = PacketTableBuilder(chunk_size=len(batch))
+        builder.extend(batch)
+        yield builder.to_frame()
 
 
 def parse_pcap(
-    pcap_path: str,
+    pcap_path: CaptureSource,
     max_packets: Optional[int] = None,
     filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    workers: int = 1,
+    index: Optional[CaptureIndex] = None,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Parse PCAP into packet and flow DataFrames.
 
     Returns (packets_df, flows_df)
     - packets_df: timestamp (datetime64[ns, UTC]), src_ip, dst_ip, src_port, dst_port, protocol, length, ip_version, ttl, tcp_flags
+      in the compact dtypes described in ``columns`` (categorical IPs/protocol, UInt16 ports, tcp_flags bitmask)
     - flows_df: src_ip, dst_ip, src_port, dst_port, protocol, packets, bytes, start_time, end_time, duration_s
+
+    workers > 1 splits the capture into byte ranges parsed by that many processes
+    (see ``parse_pcap_parallel``). With an ``index`` (see ``index.ensure_index``)
+    only the blocks that can match the time/protocol filters are read. Either
+    way the result is the same as a plain serial parse.
+
+    ``progress`` is called with a ``ParseProgress`` after every batch of records
+    read (with workers > 1: after every worker's share) and once more when done.
+
+    With ``sample`` (see ``sampling``) only the sampled flows or packets are
+    kept, and unsampled packets are dropped as early as the decoder allows;
+    max_packets and filters then apply to the sample. Counts estimate the
+    whole capture's once multiplied by ``sample.rate``.
+
+    ``pcap_path`` may also be the capture's bytes, e.g. an upload, which are
+    parsed in memory (serially, without an index). Captures compressed with
+    gzip, bzip2, xz or zstd are decompressed on the fly either way.
     """
-    rows = list(_iter_packets(pcap_path, max_packets=max_packets, filters=filters))
-    if not rows:
-        packets_df = pd.DataFrame(
-            columns=[
-                "timestamp",
-                "src_ip",
-                "dst_ip",
-                "src_port",
-                "dst_port",
-                "protocol",
-                "length",
-                "ip_version",
-                "ttl",
-                "tcp_flags",
-            ]
+    if not is_path(pcap_path):
+        if index is not None:
+            raise ValueError("A capture index needs the capture's path")
+        workers = 1
+    if index is not None and not index.is_current(pcap_path):
+        raise ValueError(f"Capture index is out of date for {pcap_path}")
+    if workers > 1:
+        return parse_pcap_parallel(
+            pcap_path,
+            workers,
+            max_packets=max_packets,
+            filters=filters,
+            engine=engine,
+            index=index,
+            progress=progress,
+            sample=sample,
         )
-        flows_df = pd.DataFrame(
-            columns=[
-                "src_ip",
-                "dst_ip",
-                "src_port",
-                "dst_port",
-                "protocol",
-                "packets",
-                "bytes",
-                "start_time",
-                "end_time",
-                "duration_s",
-            ]
+    chunks = _packet_chunks(pcap_path, max_packets, filters, engine, index=index, progress=progress, sample=sample)
+    packets_df = concat_packet_frames(list(chunks))
+    return packets_df, build_flows(packets_df)
+
+
+def _parse_ranges(
+    pcap_path: str,
+    ranges: list[CaptureRange],
+    max_packets: Optional[int],
+    filters: Optional[FilterOptions],
+    engine: str,
+    mapped: bool,
+    sample: Optional[SampleOptions] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Worker: parse byte ranges into their packets table and partial flow table."""
+    chunks = _packet_chunks(pcap_path, max_packets, filters, engine, ranges=ranges, mapped=mapped, sample=sample)
+    packets_df = concat_packet_frames(list(chunks))
+    return packets_df, build_flows(packets_df)
+
+
+def _group_ranges(ranges: list[CaptureRange], parts: int, size: int) -> list[list[CaptureRange]]:
+    """Cut an ordered list of ranges into up to ``parts`` consecutive groups of similar byte size."""
+    lengths = [(size if r.end is None else r.end) - r.start for r in ranges]
+    target = sum(lengths) / max(1, parts)
+    groups: list[list[CaptureRange]] = [[]]
+    filled = 0
+    for rng, length in zip(ranges, lengths):
+        if groups[-1] and filled >= target * len(groups):
+            groups.append([])
+        groups[-1].append(rng)
+        filled += length
+    return groups
+
+
+def parse_pcap_parallel(
+    pcap_path: str,
+    workers: int,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    index: Optional[CaptureIndex] = None,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """``parse_pcap`` with the capture split into byte ranges decoded by ``workers`` processes.
+
+    A pre-scan finds record boundaries (``decoder.split_capture``); with an
+    ``index`` its matching blocks are shared out instead. Each worker decodes
+    and filters its ranges and aggregates its own flows. Packet tables are
+    concatenated in file order, so rows come out exactly as in a serial parse, and
+    the partial flow tables are merged with ``merge_flow_tables`` so flows spanning
+    range edges are combined. With max_packets every worker stops after that many
+    packets and the merged table is cut to the first max_packets.
+    """
+    if index is not None:
+        flt = _compile_filters(filters, sample)
+        tasks = _group_ranges([b.span for b in index.select(flt)], workers, index.size)
+    else:
+        tasks = [[rng] for rng in split_capture(pcap_path, workers)]
+    if len(tasks) == 1:
+        return parse_pcap(
+            pcap_path, max_packets=max_packets, filters=filters, engine=engine, index=index, progress=progress, sample=sample
         )
-        return packets_df, flows_df
-
-    packets_df = pd.DataFrame.from_records(rows)
-    packets_df["timestamp"] = pd.to_datetime(packets_df["timestamp"], unit="s", utc=True)
-
-    def keyify(row) -> Tuple[str, str, Optional[int], Optional[int], str]:
-        key = FlowKey(
-            src_ip=row["src_ip"],
-            dst_ip=row["dst_ip"],
-            src_port=row["src_port"],
-            dst_port=row["dst_port"],
-            protocol=row["protocol"],
-        ).normalized()
-        return (
-            key.src_ip,
-            key.dst_ip,
-            key.src_port,
-            key.dst_port,
-            key.protocol,
+    mapped = index is not None
+    size = _capture_size(pcap_path) if progress is not None else None
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = [
+            pool.submit(_parse_ranges, pcap_path, task, max_packets, filters, engine, mapped, sample) for task in tasks
+        ]
+        parts = []
+        remaining = max_packets
+        for task, future in zip(tasks, futures):
+            packets_df, flows_df = future.result()
+            if progress is not None:
+                # results come in file order, so the file is read up to the end of this task
+                offset = size if task[-1].end is None else task[-1].end
+                packets = sum(len(p) for p, _ in parts) + len(packets_df)
+                progress(ParseProgress(None, packets, offset, size, time.perf_counter() - started))
+            if remaining is not None and len(packets_df) >= remaining:
+                packets_df = concat_packet_frames([packets_df.iloc[:remaining]])
+                parts.append((packets_df, build_flows(packets_df)))
+                for rest in futures:
+                    rest.cancel()
+                break
+            parts.append((packets_df, flows_df))
+            if remaining is not None:
+                remaining -= len(packets_df)
+    packets_df = concat_packet_frames([p for p, _ in parts])
+    if progress is not None:
+        progress(ParseProgress(None, len(packets_df), size, size, time.perf_counter() - started, done=True))
+    return packets_df, merge_flow_tables([f for _, f in parts])
+
+
+FLOW_COLUMNS = [
+    "src_ip",
+    "dst_ip",
+    "src_port",
+    "dst_port",
+    "protocol",
+    "packets",
+    "bytes",
+    "start_time",
+    "end_time",
+    "duration_s",
+]
+
+# Sorts after every real port, so flows without ports follow the ported ones like NA does.
+_NO_PORT = 1 << 16
+
+
+def _category_codes(col: pd.Series, categories: pd.Index) -> np.ndarray:
+    """Codes of ``col`` against ``categories`` (sorted), without materialising strings per row."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return categories.get_indexer(col.cat.categories)[col.cat.codes.to_numpy()]
+    return categories.get_indexer(col.astype(object))
+
+
+def _categories(*cols: pd.Series) -> pd.Index:
+    values = [c.cat.categories if isinstance(c.dtype, pd.CategoricalDtype) else pd.Index(c.unique()) for c in cols]
+    out = values[0]
+    for v in values[1:]:
+        out = out.union(v)
+    return out.sort_values()
+
+
+def build_flows(packets_df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate packets into bidirectional flows.
+
+    Vectorized equivalent of grouping on ``FlowKey.normalized()``: endpoints are
+    compared column-wise as (ip, port) pairs and swapped into canonical order,
+    then grouped on the integer-coded 5-tuple. Flows without ports (non TCP/UDP)
+    keep null ports and group by address pair and protocol.
+    """
+    if packets_df.empty:
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+
+    ips = _categories(packets_df["src_ip"], packets_df["dst_ip"])
+    protocols = _categories(packets_df["protocol"])
+    src = _category_codes(packets_df["src_ip"], ips)
+    dst = _category_codes(packets_df["dst_ip"], ips)
+    proto = _category_codes(packets_df["protocol"], protocols)
+    sport = packets_df["src_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT)
+    dport = packets_df["dst_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT)
+
+    # same ordering as FlowKey.normalized: (src_ip, src_port) <= (dst_ip, dst_port)
+    swap = (src > dst) | ((src == dst) & (sport > dport))
+    keys = pd.DataFrame(
+        {
+            "src_ip": np.where(swap, dst, src),
+            "dst_ip": np.where(swap, src, dst),
+            "src_port": np.where(swap, dport, sport),
+            "dst_port": np.where(swap, sport, dport),
+            "protocol": proto,
+            "length": packets_df["length"].to_numpy(),
+            "timestamp": packets_df["timestamp"].to_numpy(dtype="datetime64[ns]"),
+        }
+    )
+    flows_df = (
+        keys.groupby(["src_ip", "dst_ip", "src_port", "dst_port", "protocol"], sort=True)
+        .agg(
+            packets=("length", "count"),
+            bytes=("length", "sum"),
+            start_time=("timestamp", "min"),
+            end_time=("timestamp", "max"),
         )
+        .reset_index()
+    )
+    return _flows_frame(flows_df, ips, protocols)
+
+
+def _flows_frame(flows_df: pd.DataFrame, ips: pd.Index, protocols: pd.Index) -> pd.DataFrame:
+    """Convert an aggregated flow table keyed by integer codes back to the flows_df dtypes."""
+    ip_dtype = pd.CategoricalDtype(ips)
+    flows_df["src_ip"] = pd.Categorical.from_codes(flows_df["src_ip"].to_numpy(), dtype=ip_dtype)
+    flows_df["dst_ip"] = pd.Categorical.from_codes(flows_df["dst_ip"].to_numpy(), dtype=ip_dtype)
+    for col in ("src_port", "dst_port"):
+        values = flows_df[col].to_numpy()
+        flows_df[col] = pd.arrays.IntegerArray(values.astype(np.uint16), values == _NO_PORT)
+    flows_df["protocol"] = pd.Categorical.from_codes(flows_df["protocol"].to_numpy(), dtype=pd.CategoricalDtype(protocols))
+    flows_df["bytes"] = flows_df["bytes"].astype(np.int64)
+    flows_df["start_time"] = flows_df["start_time"].dt.tz_localize("UTC")
+    flows_df["end_time"] = flows_df["end_time"].dt.tz_localize("UTC")
+    flows_df["duration_s"] = (flows_df["end_time"] - flows_df["start_time"]).dt.total_seconds().clip(lower=0)
+    return flows_df[FLOW_COLUMNS]
 
-    packets_df["flow_key"] = packets_df.apply(keyify, axis=1)
-    grouped = packets_df.groupby("flow_key")
 
-    flows_df = grouped.agg(
-        packets=("length", "count"),
-        bytes=("length", "sum"),
-        start_time=("timestamp", "min"),
-        end_time=("timestamp", "max"),
-    ).reset_index(names=["src_ip", "dst_ip", "src_port", "dst_port", "protocol"])
-    flows_df["duration_s"] = (flows_df["end_time"] - flows_df["start_time"]).dt.total_seconds().clip(lower=0)
+def merge_flow_tables(flow_tables: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Merge flow tables built from disjoint packet sets into the table ``build_flows`` gives for all of them.
 
-    return packets_df.drop(columns=["flow_key"]), flows_df
+    Flows with the same key are combined: packets and bytes add up, start/end
+    times take the min/max. Keys are already canonical, so no endpoint swap is needed.
+    """
+    tables = [t for t in flow_tables if not t.empty]
+    if not tables:
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+
+    ips = _categories(*[t[col] for t in tables for col in ("src_ip", "dst_ip")])
+    protocols = _categories(*[t["protocol"] for t in tables])
+    keys = pd.DataFrame(
+        {
+            "src_ip": np.concatenate([_category_codes(t["src_ip"], ips) for t in tables]),
+            "dst_ip": np.concatenate([_category_codes(t["dst_ip"], ips) for t in tables]),
+            "src_port": np.concatenate([t["src_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT) for t in tables]),
+            "dst_port": np.concatenate([t["dst_port"].to_numpy(dtype=np.int64, na_value=_NO_PORT) for t in tables]),
+            "protocol": np.concatenate([_category_codes(t["protocol"], protocols) for t in tables]),
+            "packets": np.concatenate([t["packets"].to_numpy(dtype=np.int64) for t in tables]),
+            "bytes": np.concatenate([t["bytes"].to_numpy(dtype=np.int64) for t in tables]),
+            "start_time": np.concatenate([t["start_time"].to_numpy(dtype="datetime64[ns]") for t in tables]),
+            "end_time": np.concatenate([t["end_time"].to_numpy(dtype="datetime64[ns]") for t in tables]),
+        }
+    )
+    flows_df = (
+        keys.groupby(["src_ip", "dst_ip", "src_port", "dst_port", "protocol"], sort=True)
+        .agg(
+            packets=("packets", "sum"),
+            bytes=("bytes", "sum"),
+            start_time=("start_time", "min"),
+            end_time=("end_time", "max"),
+        )
+        .reset_index()
+    )
+    return _flows_frame(flows_df, ips, protocols)
@@ -0,0 +1,191 @@
+"""Per-stage instrumentation of a run: time, rows, throughput and memory.
+
+``Profiler.stage`` wraps one step of a run (parsing, a metric, the graph, an
+export, ...) and records a ``StageRecord`` for it: wall and CPU time, rows in
+and out, rows per second and the process's peak RSS. Callers set
+``rows_out`` on the record the context manager yields, and an ``on_stage``
+callback sees every record as soon as its stage ends:
+
+    profiler = Profiler(on_stage=print)
+    with profiler.stage("parse") as st:
+        packets_df, flows_df = parse_pcap(path, progress=ProgressPrinter())
+        st.rows_out = len(packets_df)
+    profiler.write_json("profile.json")
+
+With ``cprofile`` every stage also runs under ``cProfile`` and the profile of
+the slowest one is kept, to be written with ``dump_hottest`` and read with
+``python -m pstats`` or a viewer such as snakeviz. ``ProgressPrinter`` is a
+``parse_pcap(progress=...)`` callback printing throttled progress lines.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import datetime as dt
+import json
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, Optional, TextIO
+
+from . import __version__
+from .parser import ParseProgress
+
+REPORT_VERSION = 1
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where ``resource`` is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageRecord:
+    """Measurements of one stage; ``rows_in``/``rows_out`` are set by the caller."""
+
+    name: str
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: Optional[float] = None  # process peak at the end of the stage
+    rss_growth_mb: Optional[float] = None  # how much the stage raised that peak
+
+    @property
+    def rows_per_s(self) -> Optional[float]:
+        """Rows in (or, if not given, rows out) per wall-clock second."""
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        if rows is None or self.wall_s <= 0:
+            return None
+        return rows / self.wall_s
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "rows_per_s": self.rows_per_s}
+
+
+class Profiler:
+    """Records a ``StageRecord`` per ``stage`` block, in order."""
+
+    def __init__(self, on_stage: Optional[Callable[[StageRecord], None]] = None, cprofile: bool = False) -> None:
+        self.on_stage = on_stage
+        self.cprofile = cprofile
+        self.stages: list[StageRecord] = []
+        self._depth = 0
+        self._hottest: Optional[tuple[StageRecord, cProfile.Profile]] = None
+        self._started = dt.datetime.now(dt.timezone.utc)
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageRecord]:
+        """Measure the block as stage ``name``; the record is completed and reported when it exits.
+
+        Nested stages are measured too, but only outermost ones are run under cProfile.
+        """
+        record = StageRecord(name, rows_in=rows_in)
+        profile = cProfile.Profile() if self.cprofile and self._depth == 0 else None
+        rss_before = peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        self._depth += 1
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._depth -= 1
+            record.wall_s = time.perf_counter() - wall
+            record.cpu_s = time.process_time() - cpu
+            record.peak_rss_mb = peak_rss_mb()
+            if record.peak_rss_mb is not None and rss_before is not None:
+                record.rss_growth_mb = record.peak_rss_mb - rss_before
+            self.stages.append(record)
+            if profile is not None and (self._hottest is None or record.wall_s > self._hottest[0].wall_s):
+                self._hottest = (record, profile)
+            if self.on_stage is not None:
+                self.on_stage(record)
+
+    @property
+    def hottest(self) -> Optional[StageRecord]:
+        """The stage with the longest wall time so far."""
+        return max(self.stages, key=lambda r: r.wall_s, default=None)
+
+    def dump_hottest(self, path) -> Optional[str]:
+        """Write the cProfile stats of the slowest profiled stage to ``path``; returns its name (None if none)."""
+        if self._hottest is None:
+            return None
+        record, profile = self._hottest
+        profile.dump_stats(str(path))
+        return record.name
+
+    def report(self) -> dict:
+        """The records with run metadata, as a JSON-serialisable document."""
+        hottest = self.hottest
+        return {
+            "version": REPORT_VERSION,
+            "meta": {
+                "pcapviz": __version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "started": self._started.isoformat(timespec="seconds"),
+                "max_rss_mb": peak_rss_mb(),
+            },
+            "total_wall_s": sum(r.wall_s for r in self.stages),
+            "total_cpu_s": sum(r.cpu_s for r in self.stages),
+            "hottest": None if hottest is None else hottest.name,
+            "stages": [r.to_dict() for r in self.stages],
+        }
+
+    def write_json(self, path, **extra) -> None:
+        """Write ``report()`` (plus ``extra`` top-level keys) to ``path``."""
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({**self.report(), **extra}, fh, indent=2)
+            fh.write("\n")
+
+    def print_summary(self, file: TextIO = sys.stderr) -> None:
+        """One line per stage, with its share of the total wall time."""
+        total = sum(r.wall_s for r in self.stages) or 1.0
+        print(f"{'stage':<22} {'wall s':>8} {'cpu s':>8} {'share':>6} {'rows/s':>12} {'peak MB':>8}", file=file)
+        for r in self.stages:
+            rate = f"{r.rows_per_s:,.0f}" if r.rows_per_s else "-"
+            peak = f"{r.peak_rss_mb:.0f}" if r.peak_rss_mb is not None else "-"
+            print(
+                f"{r.name:<22} {r.wall_s:>8.3f} {r.cpu_s:>8.3f} {r.wall_s / total:>6.0%} {rate:>12} {peak:>8}",
+                file=file,
+            )
+
+
+class ProgressPrinter:
+    """``progress`` callback printing a status line at most every ``interval`` seconds, and one when done."""
+
+    def __init__(self, label: str = "parse", interval: float = 1.0, file: TextIO = sys.stderr) -> None:
+        self.label = label
+        self.interval = interval
+        self.file = file
+        self._last = -float("inf")
+
+    def __call__(self, progress: ParseProgress) -> None:
+        now = time.monotonic()
+        if not progress.done and now - self._last < self.interval:
+            return
+        self._last = now
+        print(self.format(progress), file=self.file)
+
+    def format(self, progress: ParseProgress) -> str:
+        parts = [f"{self.label}: {progress.packets:,} packets"]
+        if progress.records is not None:
+            parts.append(f"{progress.records:,} records")
+        parts.append(f"{progress.rate:,.0f}/s")
+        if progress.done:
+            parts.append(f"done in {progress.elapsed_s:.1f}s")
+        elif progress.fraction is not None:
+            eta = progress.eta_s
+            parts.append(f"{progress.fraction:.0%}" + ("" if eta is None else f", ETA {eta:.0f}s"))
+        return ", ".join(parts)
@@ -0,0 +1,186 @@
+"""Indexed queries over a parsed packets table.
+
+``PacketIndex`` answers ``FilterOptions`` on an already parsed (unfiltered)
+``packets_df`` without scanning every row:
+
+- timestamps are kept sorted (the table itself when it is in time order, as
+  parsed captures usually are, otherwise through a sort permutation), so a time
+  window is two binary searches;
+- src_ip, dst_ip, protocol, src_port and dst_port get posting lists: the row
+  positions of each value, stored CSR-style (one row permutation plus offsets
+  per value) and built on first use.
+
+A query starts from the predicate with the fewest candidate rows, read from its
+posting lists or time range, and checks the remaining predicates on those rows
+only by looking up their codes, so its cost follows the size of the smallest
+predicate rather than the table. The result is an array of row positions with
+the same rows as ``parser.apply_filters``; the ``metrics`` and ``graph``
+functions take it as ``rows=`` and gather only the columns they read.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ipset import IPSet
+from .parser import FilterOptions, to_utc
+
+# Port columns are coded by value; rows without a port get this code.
+_NO_PORT = 1 << 16
+
+
+class _Postings:
+    """Row positions of each code, as a permutation of the rows grouped by code."""
+
+    def __init__(self, codes: np.ndarray, n_codes: int) -> None:
+        self.codes = codes
+        dtype = np.int32 if len(codes) < 2**31 else np.int64
+        self.order = np.argsort(codes, kind="stable").astype(dtype, copy=False)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_codes))])
+
+    def count(self, hit: np.ndarray) -> int:
+        """Rows whose code is marked in ``hit``."""
+        return int(np.diff(self.indptr)[hit].sum())
+
+    def rows(self, hit: np.ndarray) -> np.ndarray:
+        """Rows whose code is marked in ``hit``, grouped by code (ascending within each code)."""
+        parts = [self.order[self.indptr[c]:self.indptr[c + 1]] for c in np.flatnonzero(hit)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=self.order.dtype)
+
+
+class PacketIndex:
+    """Time and posting-list indexes over ``packets_df`` for fast ``FilterOptions`` queries."""
+
+    def __init__(self, packets_df: pd.DataFrame) -> None:
+        self.packets = packets_df
+        self.n = len(packets_df)
+        ts = packets_df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        self._ts = ts
+        if self.n > 1 and not bool(np.all(ts[1:] >= ts[:-1])):
+            self._time_order: Optional[np.ndarray] = np.argsort(ts, kind="stable")
+            self._sorted_ts = ts[self._time_order]
+        else:
+            self._time_order = None
+            self._sorted_ts = ts
+        self._postings: dict[str, _Postings] = {}
+        self._codes: dict[str, np.ndarray] = {}
+
+    # -- per-column codes and lookups -------------------------------------------------
+
+    def _column_codes(self, column: str) -> np.ndarray:
+        """Integer codes of a column: category code + 1 (0 = missing), or the port (``_NO_PORT`` = none)."""
+        codes = self._codes.get(column)
+        if codes is None:
+            col = self.packets[column]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                codes = col.cat.codes.to_numpy().astype(np.int32) + 1
+            else:
+                codes = col.to_numpy(dtype=np.float64, na_value=_NO_PORT).astype(np.int32)
+            self._codes[column] = codes
+        return codes
+
+    def _n_codes(self, column: str) -> int:
+        col = self.packets[column]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            return len(col.cat.categories) + 1
+        return _NO_PORT + 1
+
+    def _hit(self, column: str, values: Iterable) -> np.ndarray:
+        """Boolean lookup over the codes of ``column``, marking ``values`` (or the addresses in an ``IPSet``)."""
+        hit = np.zeros(self._n_codes(column), dtype=bool)
+        col = self.packets[column]
+        if isinstance(values, IPSet):
+            hit[1:] = values.mask(col.cat.categories)
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            found = col.cat.categories.get_indexer(pd.Index(list(values)))
+            hit[found[found >= 0] + 1] = True
+        else:
+            ports = np.array([int(v) for v in values], dtype=np.int64)
+            hit[ports[(ports >= 0) & (ports < _NO_PORT)]] = True
+            hit[_NO_PORT] = True  # packets without ports pass port filters, as in apply_filters
+        return hit
+
+    def postings(self, column: str) -> _Postings:
+        """Posting lists of ``column``, built on first use."""
+        p = self._postings.get(column)
+        if p is None:
+            p = self._postings[column] = _Postings(self._column_codes(column), self._n_codes(column))
+        return p
+
+    # -- queries ------------------------------------------------------------------------
+
+    def time_rows(self, start=None, end=None) -> np.ndarray:
+        """Sorted row positions with ``start <= timestamp <= end`` (None = unbounded)."""
+        lo, hi = self._time_bounds(start, end)
+        if self._time_order is None:
+            return np.arange(lo, hi)
+        return np.sort(self._time_order[lo:hi])
+
+    def _time_bounds(self, start, end) -> tuple[int, int]:
+        lo = 0 if start is None else int(np.searchsorted(self._sorted_ts, to_utc(start).value, side="left"))
+        hi = self.n if end is None else int(np.searchsorted(self._sorted_ts, to_utc(end).value, side="right"))
+        return lo, max(lo, hi)
+
+    def select(self, filters: Optional[FilterOptions]) -> np.ndarray:
+        """Sorted row positions of the packets passing ``filters`` (the rows ``apply_filters`` keeps)."""
+        if filters is None:
+            return np.arange(self.n)
+        flt = filters.compile()
+        # (candidate count, enumerate rows, check rows) per positive predicate
+        predicates = []
+        if filters.time_start is not None or filters.time_end is not None:
+            start, end = filters.time_start, filters.time_end
+            lo, hi = self._time_bounds(start, end)
+            predicates.append((hi - lo, lambda: self.time_rows(start, end), self._time_check(start, end)))
+        if flt.include_ips is not None:
+            include = flt.include_ips
+            src_hit, dst_hit = self._hit("src_ip", include), self._hit("dst_ip", include)
+            predicates.append((
+                self.postings("src_ip").count(src_hit) + self.postings("dst_ip").count(dst_hit),
+                lambda: np.union1d(self.postings("src_ip").rows(src_hit), self.postings("dst_ip").rows(dst_hit)),
+                lambda rows: src_hit[self._column_codes("src_ip")[rows]] | dst_hit[self._column_codes("dst_ip")[rows]],
+            ))
+        for column, values in (("protocol", flt.protocols), ("src_port", flt.src_ports), ("dst_port", flt.dst_ports)):
+            if values is not None:
+                predicates.append(self._value_predicate(column, self._hit(column, values)))
+
+        if predicates:
+            predicates.sort(key=lambda p: p[0])
+            rows = np.unique(predicates[0][1]()).astype(np.int64, copy=False)
+            for _, _, check in predicates[1:]:
+                if not len(rows):
+                    break
+                rows = rows[check(rows)]
+        else:
+            rows = np.arange(self.n)
+        if flt.exclude_ips is not None and len(rows):
+            exclude = flt.exclude_ips
+            src_hit, dst_hit = self._hit("src_ip", exclude), self._hit("dst_ip", exclude)
+            rows = rows[~(src_hit[self._column_codes("src_ip")[rows]] | dst_hit[self._column_codes("dst_ip")[rows]])]
+        return rows
+
+    def _value_predicate(self, column: str, hit: np.ndarray) -> tuple:
+        postings = self.postings(column)
+        return postings.count(hit), lambda: postings.rows(hit), lambda rows: hit[postings.codes[rows]]
+
+    def _time_check(self, start, end):
+        start = None if start is None else to_utc(start).value
+        end = None if end is None else to_utc(end).value
+
+        def check(rows: np.ndarray) -> np.ndarray:
+            ts = self._ts[rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                mask &= ts >= start
+            if end is not None:
+                mask &= ts <= end
+            return mask
+
+        return check
+
+    def filter(self, filters: Optional[FilterOptions]) -> pd.DataFrame:
+        """The selected rows as a packets table, like ``apply_filters``."""
+        return self.packets.iloc[self.select(filters)]
@@ -0,0 +1,226 @@
+"""Scalable HTML rendering of the host graph.
+
+``to_pyvis_html`` hands every node and edge to pyvis and lets the browser
+run the physics simulation, which stalls above a few thousand nodes.
+``to_html`` instead:
+
+- prunes the graph to a render budget (the nodes with the most traffic, then
+  the heaviest edges among them) and notes what was dropped,
+- computes the layout once, server-side, with a vectorized
+  Fruchterman-Reingold (``force_layout``),
+- writes the nodes and edges as one compact JSON payload of parallel arrays
+  that a small script turns into a vis-network with physics off.
+
+The full graph is still what ``export_graphml`` writes.
+"""
+
+from __future__ import annotations
+
+import html as html_lib
+import json
+import math
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+
+from .graph import CREDIT
+
+DEFAULT_MAX_NODES = 1000
+DEFAULT_MAX_EDGES = 3000
+
+# Pairwise repulsion is computed for this many nodes at a time, bounding memory.
+_LAYOUT_BLOCK = 512
+# Edge labels are drawn only for graphs this small; larger graphs keep them as tooltips.
+_EDGE_LABELS_MAX = 300
+
+_PROTO_COLOR = {"TCP": "#1f77b4", "UDP": "#ff7f0e", "OTHER": "#7f7f7f"}
+
+_VIS_JS = "https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js"
+_VIS_JS_SRI = "sha512-LnvoEWDFrqGHlHmDD2101OrLcbsfkrzoSpvtSQtxK3RMnRV0eOkhhBN2dXHKRrUU8p2DGRTk35n4O8nWSVe1mQ=="
+
+
+def fit_budget(G: nx.DiGraph, max_nodes: Optional[int], max_edges: Optional[int]) -> tuple[nx.DiGraph, str]:
+    """Prune G to at most max_nodes nodes and max_edges edges (None = no limit).
+
+    Keeps the nodes with the most bytes sent and received, then the heaviest
+    edges between them, and drops nodes left without edges. Returns the pruned
+    graph and a note on what was dropped ("" if nothing was).
+    """
+    n, m = G.number_of_nodes(), G.number_of_edges()
+    if (max_nodes is None or n <= max_nodes) and (max_edges is None or m <= max_edges):
+        return G, ""
+    edges = list(G.edges(data="bytes", default=0))
+    weight = np.fromiter((b for _, _, b in edges), dtype=np.float64, count=len(edges))
+    keep_edges = np.arange(len(edges))
+    if max_nodes is not None and n > max_nodes:
+        traffic: dict = dict.fromkeys(G.nodes, 0)
+        for (u, v, _), b in zip(edges, weight.tolist()):
+            traffic[u] += b
+            traffic[v] += b
+        busiest = sorted(traffic, key=traffic.get, reverse=True)[:max_nodes]
+        kept = set(busiest)
+        keep_edges = np.array([i for i, (u, v, _) in enumerate(edges) if u in kept and v in kept], dtype=np.int64)
+    if max_edges is not None and len(keep_edges) > max_edges:
+        order = np.argsort(-weight[keep_edges], kind="stable")[:max_edges]
+        keep_edges = np.sort(keep_edges[order])
+    H = G.__class__()
+    H.add_edges_from((edges[i][0], edges[i][1], G.edges[edges[i][0], edges[i][1]]) for i in keep_edges.tolist())
+    for node in H.nodes:
+        H.nodes[node].update(G.nodes[node])
+    total = weight.sum()
+    share = weight[keep_edges].sum() / total if total else 1.0
+    note = (
+        f"Showing {H.number_of_nodes()} of {n} nodes and {H.number_of_edges()} of {m} edges "
+        f"({share:.1%} of bytes); the rest were dropped to fit the render budget."
+    )
+    return H, note
+
+
+def force_layout(G: nx.Graph, iterations: int = 50, seed: int = 0) -> np.ndarray:
+    """Fruchterman-Reingold positions in the unit square, one row per node in G.nodes order.
+
+    Vectorized with numpy; repulsion is computed in blocks so memory stays
+    O(block x n) instead of O(n^2).
+    """
+    nodes = list(G.nodes)
+    n = len(nodes)
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if n < 2:
+        return pos
+    index = {node: i for i, node in enumerate(nodes)}
+    pairs = {(index[u], index[v]) if index[u] < index[v] else (index[v], index[u]) for u, v in G.edges if u != v}
+    if pairs:
+        src, dst = np.array(sorted(pairs), dtype=np.int64).T
+    else:
+        src = dst = np.empty(0, dtype=np.int64)
+    x, y = pos[:, 0].copy(), pos[:, 1].copy()
+    k = math.sqrt(1.0 / n)
+    t = 0.1
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+        disp_x = np.empty(n)
+        disp_y = np.empty(n)
+        for start in range(0, n, _LAYOUT_BLOCK):
+            block = slice(start, start + _LAYOUT_BLOCK)
+            dx = x[block, None] - x[None, :]
+            dy = y[block, None] - y[None, :]
+            # repulsion k^2/d along the unit vector: delta * k^2 / d^2
+            w = dx * dx
+            w += dy * dy
+            np.maximum(w, 1e-6, out=w)
+            np.divide(k * k, w, out=w)
+            disp_x[block] = np.einsum("ij,ij->i", dx, w)
+            disp_y[block] = np.einsum("ij,ij->i", dy, w)
+        if len(src):
+            # attraction d^2/k along the unit vector: delta * d / k
+            dx = x[src] - x[dst]
+            dy = y[src] - y[dst]
+            f = np.sqrt(dx * dx + dy * dy) / k
+            disp_x += np.bincount(dst, dx * f, n) - np.bincount(src, dx * f, n)
+            disp_y += np.bincount(dst, dy * f, n) - np.bincount(src, dy * f, n)
+        length = np.maximum(np.sqrt(disp_x * disp_x + disp_y * disp_y), 1e-9)
+        step = np.minimum(length, t) / length
+        x += disp_x * step
+        y += disp_y * step
+        t -= dt
+    return np.column_stack([x, y])
+
+
+def to_html(
+    G: nx.Graph,
+    height: str = "700px",
+    width: str = "100%",
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    max_edges: Optional[int] = DEFAULT_MAX_EDGES,
+    iterations: int = 50,
+) -> str:
+    """Render the host graph as a standalone HTML page with a precomputed layout and physics off."""
+    H, note = fit_budget(G, max_nodes, max_edges)
+    rate = G.graph.get("sample_rate")
+    if rate:
+        note = f"Estimated from a 1-in-{rate} sample (bytes and packets scaled by {rate}). {note}".strip()
+    nodes = list(H.nodes)
+    pos = force_layout(H, iterations=iterations)
+    if len(pos):
+        span = np.ptp(pos, axis=0).max() or 1.0
+        pos = (pos - pos.min(axis=0)) / span * (60 * math.sqrt(len(pos)) + 200)
+    index = {node: i for i, node in enumerate(nodes)}
+
+    protocols: list[str] = []
+    proto_index: dict[str, int] = {}
+    e_from, e_to, e_bytes, e_packets, e_proto = [], [], [], [], []
+    for u, v, data in H.edges(data=True):
+        pbytes = data.get("protocol_bytes", {})
+        dominant = max(pbytes, key=pbytes.get) if pbytes else "OTHER"
+        if dominant not in proto_index:
+            proto_index[dominant] = len(protocols)
+            protocols.append(dominant)
+        e_from.append(index[u])
+        e_to.append(index[v])
+        e_bytes.append(int(data.get("bytes", 0)))
+        e_packets.append(int(data.get("packets", 0)))
+        e_proto.append(proto_index[dominant])
+
+    payload = {
+        "directed": H.is_directed(),
+        "nodes": {
+            "id": [str(n) for n in nodes],
+            "x": np.round(pos[:, 0]).astype(int).tolist() if len(pos) else [],
+            "y": np.round(pos[:, 1]).astype(int).tolist() if len(pos) else [],
+            "bytes": [int(H.nodes[n].get("total_bytes", 0)) for n in nodes],
+            "packets": [int(H.nodes[n].get("total_packets", 0)) for n in nodes],
+        },
+        "edges": {"from": e_from, "to": e_to, "bytes": e_bytes, "packets": e_packets, "proto": e_proto},
+        "protocols": protocols,
+        "colors": [_PROTO_COLOR.get(p, "#7f7f7f") for p in protocols],
+        "edgeLabels": len(e_from) <= _EDGE_LABELS_MAX,
+    }
+    # escaped so that no node name can close the <script> block
+    data = json.dumps(payload, separators=(",", ":")).replace("</", "<\\/")
+    note_html = f'<div style="color:#a33;font-size:12px;margin:4px 0">{html_lib.escape(note)}</div>' if note else ""
+    return _TEMPLATE.format(
+        height=html_lib.escape(height),
+        width=html_lib.escape(width),
+        vis_js=_VIS_JS,
+        vis_js_sri=_VIS_JS_SRI,
+        note=note_html,
+        data=data,
+        credit=html_lib.escape(CREDIT),
+    )
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="{vis_js}" integrity="{vis_js_sri}" crossorigin="anonymous" referrerpolicy="no-referrer"></script>
+</head>
+<body style="margin:0">
+{note}<div id="graph" style="height:{height};width:{width};border:1px solid #ddd"></div>
+<script>
+const data = {data};
+const N = data.nodes, E = data.edges;
+const nodes = N.id.map((id, i) => {{
+  const text = id + "\\nbytes: " + N.bytes[i] + "\\npackets: " + N.packets[i];
+  return {{id: i, label: text, title: text, x: N.x[i], y: N.y[i], value: N.bytes[i]}};
+}});
+const edges = E.from.map((from, i) => {{
+  const text = E.bytes[i] + " B / " + E.packets[i] + " pkts\\n" + data.protocols[E.proto[i]];
+  const edge = {{id: i, from: from, to: E.to[i], value: E.bytes[i], title: text, color: data.colors[E.proto[i]]}};
+  if (data.edgeLabels) edge.label = text;
+  return edge;
+}});
+new vis.Network(document.getElementById("graph"), {{nodes: new vis.DataSet(nodes), edges: new vis.DataSet(edges)}}, {{
+  physics: false,
+  layout: {{improvedLayout: false}},
+  nodes: {{shape: "dot", scaling: {{min: 5, max: 30}}}},
+  edges: {{arrows: {{to: {{enabled: data.directed}}}}, smooth: false, scaling: {{min: 1, max: 8}}}},
+  interaction: {{hideEdgesOnDrag: true, tooltipDelay: 100}}
+}});
+</script>
+<div style="text-align:center;color:#888;font-size:12px;margin-top:4px">{credit}</div>
+</body>
+</html>
+"""
@@ -0,0 +1,157 @@
+"""Replay a capture into a growing pcap file at a controlled packet rate.
+
+A local stand-in for ``tcpdump -w out.pcap [-C size]`` to exercise follow mode:
+frames of the input capture are appended to ``out.pcap`` at ``--pps`` packets
+per second, stamped with the current time, and flushed every tick. With
+``--rotate-packets N`` the output rotates like tcpdump's ``-C``: ``out.pcap``,
+``out.pcap1``, ``out.pcap2``, ...
+
+    python -m src.pcapviz.replay sample.pcap /tmp/live.pcap --pps 100000 --loop 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+import time
+from itertools import islice
+from typing import BinaryIO, Iterator, Optional
+
+from .decoder import iter_records, open_capture
+
+_PCAP_HEADER = struct.Struct("<IHHiIII")
+_RECORD_HEADER = struct.Struct("<IIII")
+_PCAP_MAGIC_US = 0xA1B2C3D4
+_SNAPLEN = 0xFFFF
+
+
+def _frames(pcap_path: str, loop: int) -> Iterator[tuple[int, bytes]]:
+    """(linktype, frame) of every record, ``loop`` times over (0 = forever).
+
+    Repeated passes replay the frames kept from the first one, so the source is decoded once.
+    """
+    frames = []
+    with open_capture(pcap_path) as f:
+        for _ts, linktype, buf, off, caplen in iter_records(f):
+            frame = (linktype, bytes(buf[off:off + caplen]))
+            if loop != 1:
+                frames.append(frame)
+            yield frame
+    n = 1
+    while frames and (loop == 0 or n < loop):
+        yield from frames
+        n += 1
+
+
+class _RotatingWriter:
+    """pcap writer that starts ``path``, ``path1``, ... every ``rotate_packets`` records."""
+
+    def __init__(self, path: str, rotate_packets: int = 0) -> None:
+        self.path = path
+        self.rotate_packets = rotate_packets
+        self.files = 0
+        self._fh: Optional[BinaryIO] = None
+        self._in_file = 0
+        self._linktype: Optional[int] = None
+
+    def write(self, frames: list[tuple[int, bytes]], ts_ns: int) -> int:
+        """Append records stamped ``ts_ns``; frames of another linktype than the first are skipped.
+
+        Returns the number of records written.
+        """
+        if self._linktype is None and frames:
+            self._linktype = frames[0][0]
+        sec, usec = divmod(ts_ns // 1000, 1_000_000)
+        pack = _RECORD_HEADER.pack
+        parts = [
+            pack(sec, usec, len(frame), len(frame)) + frame for linktype, frame in frames if linktype == self._linktype
+        ]
+        done = 0
+        while done < len(parts):
+            if self._fh is None or (self.rotate_packets and self._in_file >= self.rotate_packets):
+                self._rotate()
+            room = len(parts) - done
+            if self.rotate_packets:
+                room = min(room, self.rotate_packets - self._in_file)
+            self._fh.write(b"".join(parts[done:done + room]))
+            self._in_file += room
+            done += room
+        return len(parts)
+
+    def _rotate(self) -> None:
+        self.close()
+        name = self.path if self.files == 0 else f"{self.path}{self.files}"
+        self._fh = open(name, "wb")
+        self._fh.write(_PCAP_HEADER.pack(_PCAP_MAGIC_US, 2, 4, 0, 0, _SNAPLEN, self._linktype))
+        self.files += 1
+        self._in_file = 0
+
+    def flush(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def replay(
+    pcap_path: str,
+    out_path: str,
+    pps: float,
+    loop: int = 1,
+    rotate_packets: int = 0,
+    duration: Optional[float] = None,
+    tick: float = 0.01,
+) -> int:
+    """Append the frames of ``pcap_path`` to ``out_path`` at ``pps`` packets/s; return the number written."""
+    if pps <= 0:
+        raise ValueError("pps must be positive")
+    frames = _frames(pcap_path, loop)
+    writer = _RotatingWriter(out_path, rotate_packets)
+    written = 0
+    start = time.monotonic()
+    try:
+        while True:
+            elapsed = time.monotonic() - start
+            if duration is not None and elapsed >= duration:
+                break
+            due = int(elapsed * pps) + 1 - written
+            if due <= 0:
+                time.sleep(tick)
+                continue
+            now = time.time_ns()
+            batch = list(islice(frames, due))
+            if not batch:
+                break
+            written += writer.write(batch, now)
+            writer.flush()
+    finally:
+        writer.close()
+    return written
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a capture into a growing pcap at a fixed packet rate")
+    parser.add_argument("pcap", help="Source pcap/pcapng file")
+    parser.add_argument("out", help="Output pcap (appended while running)")
+    parser.add_argument("--pps", type=float, default=10000, help="Packets per second")
+    parser.add_argument("--loop", type=int, default=1, help="Times to replay the source (0 = until stopped)")
+    parser.add_argument("--rotate-packets", type=int, default=0, help="Start a new file every N packets (0 = never)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    try:
+        written = replay(args.pcap, args.out, args.pps, args.loop, args.rotate_packets, args.duration)
+    except KeyboardInterrupt:
+        return 130
+    elapsed = time.monotonic() - started
+    print(f"Wrote {written} packets in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} pps)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+"""Multi-resolution throughput rollups.
+
+``ThroughputPyramid`` buckets a packets table once into levels of growing
+width (1ms, 10ms, 100ms, 1s, 10s, 1min by default; each a multiple of the one
+before), for all traffic, per protocol and per top host. Only non-empty
+buckets are stored, as CSR over (group, bucket) like ``matrix``, and each
+level is summed from the one below instead of from the packets.
+
+``throughput(rule, start, end)`` answers any fixed-width rule that is a
+multiple of a level from the coarsest such level, restricted to a time window,
+without touching packets: the cost follows the number of level buckets in the
+window, not the capture. Bins are those of ``metrics.compute_throughput`` (same
+origin and empty-bin filling), so without a window the values are equal
+(counts come back as int64).
+``auto_rule`` picks the finest level that keeps a window under a number of
+points, for zoomable charts.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .columns import take_rows
+from .metrics import DAY_NANOS, compute_top_talkers, rule_nanos
+from .parser import to_utc
+
+DEFAULT_LEVELS = ("1ms", "10ms", "100ms", "1s", "10s", "1min")
+DEFAULT_TOP_HOSTS = 10
+
+
+class _Level:
+    """Non-empty buckets of one width, grouped: ``indptr[g]:indptr[g + 1]`` are group g's buckets, in time order."""
+
+    def __init__(self, width: int, indptr: np.ndarray, bucket: np.ndarray, nbytes: np.ndarray, packets: np.ndarray):
+        self.width = width
+        self.indptr = indptr
+        self.bucket = bucket
+        self.bytes = nbytes
+        self.packets = packets
+
+    def coarsen(self, width: int) -> "_Level":
+        """The same counts in buckets of ``width`` (a multiple of this level's width)."""
+        bucket = self.bucket // (width // self.width)
+        if not len(bucket):
+            return _Level(width, self.indptr, bucket, self.bytes, self.packets)
+        # buckets stay sorted within each group, so equal ones are adjacent
+        new = np.ones(len(bucket), dtype=bool)
+        new[1:] = bucket[1:] != bucket[:-1]
+        new[self.indptr[:-1][self.indptr[:-1] < len(bucket)]] = True
+        starts = np.flatnonzero(new)
+        indptr = np.searchsorted(starts, self.indptr)
+        return _Level(width, indptr, bucket[starts], np.add.reduceat(self.bytes, starts), np.add.reduceat(self.packets, starts))
+
+
+class ThroughputPyramid:
+    """Throughput of a packets table at several bucket widths, overall, per protocol and per top host.
+
+    ``top_hosts`` hosts with the most traffic (as in ``compute_top_talkers``)
+    get their own series; a packet counts for both its source and destination
+    host, so host series can add up to more than the total. A level is only
+    kept (and listed in ``levels``) if it has at most half the buckets of the
+    last kept one, so sparse traffic costs no more than the finest level twice;
+    the coarsest level is always kept.
+    """
+
+    def __init__(
+        self,
+        packets_df: pd.DataFrame,
+        rows: Optional[np.ndarray] = None,
+        levels: Sequence[str] = DEFAULT_LEVELS,
+        top_hosts: int = DEFAULT_TOP_HOSTS,
+    ) -> None:
+        widths = [rule_nanos(rule) for rule in levels]
+        if not widths or widths[0] <= 0 or any(b <= a or b % a for a, b in zip(widths, widths[1:])):
+            raise ValueError(f"Levels must be increasing, each a multiple of the one before: {list(levels)}")
+        packets_df = take_rows(packets_df, rows, ["timestamp", "length", "protocol", "src_ip", "dst_ip"])
+        self.packets = len(packets_df)
+        self.hosts: list[str] = (
+            [str(ip) for ip in compute_top_talkers(packets_df, n=top_hosts)["ip"]] if top_hosts and self.packets else []
+        )
+        protocol = packets_df["protocol"].astype("category")
+        self.protocols: list[str] = [str(p) for p in protocol.cat.categories]
+
+        ts = packets_df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        self.time_min = int(ts.min()) if len(ts) else None
+        self.time_max = int(ts.max()) if len(ts) else None
+        # resample(rule) bins start at midnight of the first packet's day
+        self.origin = 0 if self.time_min is None else self.time_min - self.time_min % DAY_NANOS
+        length = packets_df["length"].to_numpy(dtype=np.int64)
+        fine = ts // widths[0]
+
+        # group 0: everything; 1..P: protocols; P+1..: top hosts. picks[i] are the rows of groups[i].
+        proto_codes = protocol.cat.codes.to_numpy().astype(np.int64)
+        has_protocol = np.flatnonzero(proto_codes >= 0)
+        picks = [np.arange(len(ts)), has_protocol]
+        groups = [np.zeros(len(ts), dtype=np.int64), 1 + proto_codes[has_protocol]]
+        host_base = 1 + len(self.protocols)
+        src_host = self._host_codes(packets_df["src_ip"])
+        dst_host = self._host_codes(packets_df["dst_ip"])
+        for host, other in ((src_host, None), (dst_host, src_host)):
+            hit = host >= 0
+            if other is not None:
+                hit &= host != other  # a host talking to itself counts once
+            picks.append(np.flatnonzero(hit))
+            groups.append(host_base + host[hit])
+        n_groups = host_base + len(self.hosts)
+
+        group = np.concatenate(groups)
+        pick = np.concatenate(picks)
+        base = int(fine.min()) if len(fine) else 0
+        span = int(fine.max()) - base + 1 if len(fine) else 1
+        cells, inverse = np.unique(group * span + (fine[pick] - base), return_inverse=True)
+        nbytes = np.bincount(inverse, length[pick].astype(np.float64), len(cells)).astype(np.int64)
+        packets = np.bincount(inverse, minlength=len(cells)).astype(np.int64)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(cells // span, minlength=n_groups))])
+        self._levels = [_Level(widths[0], indptr, cells % span + base, nbytes, packets)]
+        self.levels = [levels[0]]
+        finer = self._levels[0]
+        for rule, width in zip(levels[1:], widths[1:]):
+            level = finer.coarsen(width)
+            finer = level
+            # a level that hardly merges buckets (sparse traffic) is answered from the finer one instead
+            if 2 * len(level.bucket) <= len(self._levels[-1].bucket) or rule == levels[-1]:
+                self._levels.append(level)
+                self.levels.append(rule)
+
+    def _host_codes(self, col: pd.Series) -> np.ndarray:
+        """Index into ``hosts`` of each row's address, or -1."""
+        categories = col.cat.categories.astype(str) if isinstance(col.dtype, pd.CategoricalDtype) else None
+        if categories is None:
+            col = col.astype("category")
+            categories = col.cat.categories.astype(str)
+        lookup = pd.Index(self.hosts).get_indexer(categories)
+        codes = col.cat.codes.to_numpy()
+        return np.where(codes >= 0, lookup[codes], -1).astype(np.int64)
+
+    def level_for(self, rule: str) -> _Level:
+        """The coarsest level whose width divides the rule's."""
+        width = rule_nanos(rule)
+        for level in reversed(self._levels):
+            if width % level.width == 0:
+                return level
+        raise ValueError(f"Throughput rule {rule!r} is not a multiple of the finest level ({self.levels[0]})")
+
+    def auto_rule(self, start=None, end=None, max_points: int = 2000) -> str:
+        """The finest level giving at most ``max_points`` bins over the window (the coarsest if none does)."""
+        lo, hi = self._window(start, end)
+        span = max(0, hi - lo) if lo is not None else 0
+        for rule, level in zip(self.levels, self._levels):
+            if span // level.width + 1 <= max_points:
+                return rule
+        return self.levels[-1]
+
+    def _window(self, start, end) -> tuple[Optional[int], Optional[int]]:
+        if self.time_min is None:
+            return None, None
+        lo = self.time_min if start is None else max(self.time_min, to_utc(start).value)
+        hi = self.time_max if end is None else min(self.time_max, to_utc(end).value)
+        return lo, hi
+
+    def throughput(self, rule: str = "1S", start=None, end=None, by: Optional[str] = None) -> pd.DataFrame:
+        """(timestamp, bytes, packets) per ``rule`` bin, from packets between ``start`` and ``end``.
+
+        The window is applied at the resolution of the level used (bins of that
+        level starting in it are counted). ``by="protocol"`` or ``by="host"``
+        adds that column and returns one series per protocol / top host, each
+        over the same bins.
+        """
+        if by not in (None, "protocol", "host"):
+            raise ValueError(f"by must be None, 'protocol' or 'host', got {by!r}")
+        width = rule_nanos(rule)
+        level = self.level_for(rule)
+        columns = ["timestamp"] + ([by] if by else []) + ["bytes", "packets"]
+        lo, hi = self._window(start, end)
+        if lo is None or lo > hi:
+            return pd.DataFrame(columns=columns)
+        if by is None:
+            names, groups = [None], [0]
+        elif by == "protocol":
+            names, groups = self.protocols, range(1, 1 + len(self.protocols))
+        else:
+            base = 1 + len(self.protocols)
+            names, groups = self.hosts, range(base, base + len(self.hosts))
+
+        # the level's buckets starting in [lo, hi]
+        first, last = lo // level.width, hi // level.width
+        series = []
+        for name, g in zip(names, groups):
+            a, b = level.indptr[g], level.indptr[g + 1]
+            i, j = a + np.searchsorted(level.bucket[a:b], [first, last + 1])
+            out = (level.bucket[i:j] * level.width - self.origin) // width
+            series.append((name, out, level.bytes[i:j], level.packets[i:j]))
+        present = [s[1] for s in series if len(s[1])]
+        if not present:
+            return pd.DataFrame(columns=columns)
+        bins = np.arange(min(o[0] for o in present), max(o[-1] for o in present) + 1, dtype=np.int64)
+        timestamps = pd.to_datetime(self.origin + bins * width, unit="ns", utc=True)
+        frames = []
+        for name, out, nbytes, packets in series:
+            index = out - bins[0]
+            frame = {"timestamp": timestamps}
+            if by:
+                frame[by] = name
+            frame["bytes"] = np.bincount(index, nbytes, len(bins)).astype(np.int64)
+            frame["packets"] = np.bincount(index, packets, len(bins)).astype(np.int64)
+            frames.append(pd.DataFrame(frame))
+        return pd.concat(frames, ignore_index=True) if by else frames[0]
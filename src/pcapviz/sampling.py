@@ -0,0 +1,131 @@
+"""Deterministic sampling of captures for fast previews.
+
+``SampleOptions(rate)`` keeps about one in ``rate`` flows (``mode="flow"``)
+or packets (``mode="packet"``). The choice is a hash, not a random draw or
+the record's position, so the same options pick the same sample on every
+run, with either engine, any number of workers and with or without an index:
+
+- flow sampling hashes the direction-agnostic 5-tuple (the endpoints of
+  ``FlowKey.normalized``, protocol), so a sampled flow keeps all its packets
+  in both directions;
+- packet sampling hashes the record's timestamp and captured length, which
+  are known before the frame is decoded, so unsampled records are skipped
+  without decoding them.
+
+Counts from a sample estimate the capture's when multiplied by ``rate``
+(see ``metrics.scale_estimates``). The hash works on numpy arrays (the
+vectorized decoder's batches) and on Python scalars (everything else) alike.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import zlib
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterator, Optional
+
+import numpy as np
+
+SAMPLE_MODES = ("flow", "packet")
+
+_MASK = (1 << 64) - 1
+_NO_PORT = 1 << 16  # stands for the missing ports of non TCP/UDP packets
+_PROTOCOL_NUMBERS = {"TCP": 6, "UDP": 17}
+_BATCH = 65536
+
+
+def _mix(x):
+    """splitmix64 finaliser, on a Python int or a uint64 array (wrapping like the array would)."""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK
+    return x ^ (x >> 31)
+
+
+def _address_key(address) -> int:
+    """An address (packed bytes or text) as an int, IPv6 folded to 64 bits; an IPv4 address is its own value."""
+    value = int.from_bytes(address, "big") if isinstance(address, bytes) else int(ipaddress.ip_address(address))
+    return (value ^ (value >> 64)) & _MASK
+
+
+def _protocol_key(protocol) -> int:
+    if isinstance(protocol, str):
+        return _PROTOCOL_NUMBERS.get(protocol, zlib.crc32(protocol.encode()))
+    return protocol
+
+
+@dataclass(frozen=True)
+class SampleOptions:
+    """Keep about one in ``rate`` flows or packets, chosen by ``seed``."""
+
+    rate: int
+    mode: str = "flow"
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        if int(self.rate) < 1:
+            raise ValueError(f"Sampling rate must be at least 1, got {self.rate}")
+        if self.mode not in SAMPLE_MODES:
+            raise ValueError(f"Sampling mode must be one of {', '.join(SAMPLE_MODES)}, got {self.mode!r}")
+
+    @property
+    def key(self) -> str:
+        """Short identifier of the sample, e.g. for cache keys."""
+        return f"{self.mode}{self.rate}s{self.seed}"
+
+    def _keep(self, h):
+        return h % self.rate == 0
+
+    def _salt(self) -> int:
+        return _mix((self.seed + 0x9E3779B97F4A7C15) & _MASK)
+
+    def keep_flows(self, src, dst, src_port, dst_port, protocol):
+        """Whether the flows of these packets are sampled.
+
+        Vectorized over uint64 address keys (IPv4 addresses as integers), int
+        ports and protocol numbers, or on one packet's values: addresses as
+        packed bytes or text, ports None for non TCP/UDP, protocol by name.
+        """
+        if isinstance(src, np.ndarray):
+            a = _mix(_mix(src.astype(np.uint64)) ^ src_port.astype(np.uint64))
+            b = _mix(_mix(dst.astype(np.uint64)) ^ dst_port.astype(np.uint64))
+            lo, hi = np.minimum(a, b), np.maximum(a, b)
+            proto = protocol.astype(np.uint64)
+        else:
+            a = _mix(_mix(_address_key(src)) ^ (_NO_PORT if src_port is None else src_port))
+            b = _mix(_mix(_address_key(dst)) ^ (_NO_PORT if dst_port is None else dst_port))
+            lo, hi = min(a, b), max(a, b)
+            proto = _protocol_key(protocol)
+        return self._keep(_mix(lo ^ _mix(hi ^ _mix(proto ^ self._salt()))))
+
+    def keep_packets(self, timestamp, length):
+        """Whether packets with these capture timestamps (float seconds) and captured lengths are sampled."""
+        if isinstance(timestamp, np.ndarray):
+            bits = timestamp.astype(np.float64).view(np.uint64)
+            length = length.astype(np.uint64)
+        else:
+            bits = int(np.float64(timestamp).view(np.uint64))
+        return self._keep(_mix(_mix(bits ^ self._salt()) ^ length))
+
+    def sample_raw(self, raw: Iterator[tuple]) -> Iterator[tuple]:
+        """The sampled raw ``decoder`` records (``(timestamp, linktype, buf, offset, caplen)``), in order.
+
+        Packet sampling is decided here, before decoding; flow sampling needs the
+        decoded addresses and passes every record through.
+        """
+        if self.mode != "packet" or self.rate == 1:
+            yield from raw
+            return
+        while True:
+            batch = list(islice(raw, _BATCH))
+            if not batch:
+                return
+            timestamps = np.fromiter((r[0] for r in batch), dtype=np.float64, count=len(batch))
+            lengths = np.fromiter((r[4] for r in batch), dtype=np.int64, count=len(batch))
+            for i in np.flatnonzero(self.keep_packets(timestamps, lengths)).tolist():
+                yield batch[i]
+
+
+def sample_rate(sample: Optional[SampleOptions]) -> int:
+    """Factor scaling a sample's counts up to the capture (1 without sampling)."""
+    return 1 if sample is None else sample.rate
@@ -0,0 +1,102 @@
+"""Fixed-size heavy-hitter summaries for top-N metrics on huge captures.
+
+``HeavyHitters`` is a weighted Space-Saving summary (equivalently, a
+Misra-Gries summary with per-key error) over byte counts. It keeps at most
+``capacity = ceil(1 / epsilon)`` keys however many distinct keys the traffic
+has, and is updated with pre-aggregated counts (e.g. the per-chunk
+``metrics.pair_counts``), so memory stays fixed at the summary plus one chunk.
+
+For every tracked key it reports ``bytes``, an upper bound of the key's true
+byte count, and ``bytes_error``, the most it can overestimate: the true count
+lies in ``[bytes - bytes_error, bytes]``. ``error`` bounds the bytes of any
+key that is not tracked, and is at most ``epsilon`` times the total bytes, so
+every key above that share is guaranteed to be reported. ``packets`` is
+counted only while a key is tracked (a lower bound).
+
+Summaries of disjoint streams merge with ``merge`` and keep the same bounds.
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_EPSILON = 1e-3
+
+
+class HeavyHitters:
+    """Space-Saving summary of the byte counts per key (one or more columns)."""
+
+    def __init__(self, keys: list[str], epsilon: float = DEFAULT_EPSILON) -> None:
+        if not 0 < epsilon < 1:
+            raise ValueError("epsilon must be between 0 and 1")
+        self.keys = list(keys)
+        self.epsilon = epsilon
+        self.capacity = math.ceil(1 / epsilon)
+        self.total_bytes = 0
+        self.total_packets = 0
+        self.error = 0  # max bytes of an untracked key
+        # low: bytes counted while tracked; err: bytes the key may have had before
+        self._table = pd.DataFrame(
+            {**{k: pd.Series(dtype=object) for k in self.keys}, "low": [], "packets": [], "err": []}
+        ).astype({"low": np.int64, "packets": np.int64, "err": np.int64})
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def update(self, counts: pd.DataFrame) -> None:
+        """Add counts with the key columns plus ``bytes`` and ``packets`` (keys may repeat)."""
+        if counts.empty:
+            return
+        self.total_bytes += int(counts["bytes"].sum())
+        self.total_packets += int(counts["packets"].sum())
+        rows = counts[self.keys + ["bytes", "packets"]].rename(columns={"bytes": "low"}).assign(err=0)
+        # exact counts: a key new to the summary may have had up to ``error`` bytes before
+        self._combine(rows, mine_missing=self.error, theirs_missing=0)
+
+    def merge(self, other: "HeavyHitters") -> None:
+        """Fold in the summary of another (disjoint) stream."""
+        if other.keys != self.keys:
+            raise ValueError("Cannot merge summaries over different keys")
+        self.total_bytes += other.total_bytes
+        self.total_packets += other.total_packets
+        mine_missing = self.error
+        self.error += other.error  # an untracked key may have been just below both bounds
+        self._combine(other._table, mine_missing=mine_missing, theirs_missing=other.error)
+
+    def _combine(self, rows: pd.DataFrame, mine_missing: int, theirs_missing: int) -> None:
+        """Outer-join ``rows`` into the summary; a key missing on one side gets that side's error bound."""
+        parts = [t for t in (self._table.assign(_mine=1, _theirs=0), rows.assign(_mine=0, _theirs=1)) if not t.empty]
+        if not parts:
+            return
+        merged = pd.concat(parts, ignore_index=True)
+        grouped = merged.groupby(self.keys, sort=False, observed=True).agg(
+            low=("low", "sum"), packets=("packets", "sum"), err=("err", "sum"), mine=("_mine", "max"), theirs=("_theirs", "max")
+        )
+        err = grouped["err"].to_numpy()
+        err = err + np.where(grouped["mine"].to_numpy() == 0, mine_missing, 0)
+        err = err + np.where(grouped["theirs"].to_numpy() == 0, theirs_missing, 0)
+        table = grouped[["low", "packets"]].assign(err=err).reset_index()
+        self._table = self._prune(table)
+
+    def _prune(self, table: pd.DataFrame) -> pd.DataFrame:
+        if len(table) <= self.capacity:
+            return table
+        upper = table["low"].to_numpy() + table["err"].to_numpy()
+        cut = int(np.partition(upper, len(upper) - self.capacity - 1)[len(upper) - self.capacity - 1])
+        self.error = max(self.error, cut)
+        return table[upper > cut].reset_index(drop=True)
+
+    def table(self) -> pd.DataFrame:
+        """Tracked keys with ``bytes`` (upper bound), ``packets`` and ``bytes_error``, largest first."""
+        t = self._table
+        out = t[self.keys].copy()
+        out["bytes"] = t["low"] + t["err"]
+        out["packets"] = t["packets"]
+        out["bytes_error"] = t["err"]
+        return out.sort_values("bytes", ascending=False, kind="stable").reset_index(drop=True)
+
+    def top(self, n: int = 10) -> pd.DataFrame:
+        return self.table().head(n)
@@ -0,0 +1,286 @@
+"""Single-pass streaming analytics.
+
+``StreamingStats`` consumes the packets table chunk by chunk and keeps only
+mergeable partial aggregates: the ``metrics`` per-pair, per-port and
+per-time-bucket counts, and partial flow tables. From those it produces the
+same metric tables, flows and host graph as the in-memory functions, so memory
+grows with the number of distinct keys (hosts, pairs, ports, buckets, flows)
+rather than with the number of packets.
+
+With ``epsilon``, hosts, pairs and ports go into fixed-size
+``sketch.HeavyHitters`` summaries instead, so top talkers, top ports, the
+conversation matrix and the host graph are estimates (with ``bytes_error``)
+in fixed memory; protocols and throughput stay exact. With ``sample_rate``
+(chunks of a sampled parse) top talkers, top ports, protocols, throughput and
+the host graph are scaled up as ``metrics.scale_estimates`` does.
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from typing import Callable, Iterable, Optional
+
+import networkx as nx
+import pandas as pd
+
+from .columns import empty_packets_frame
+from .graph import SubnetMap, host_graph_from_counts
+from .metrics import (
+    PAIR_KEYS,
+    PORT_KEYS,
+    compute_conversation_matrix,
+    compute_protocol_breakdown,
+    compute_throughput,
+    compute_top_ports,
+    compute_top_talkers,
+    conversation_matrix_from_counts,
+    pair_counts,
+    port_counts,
+    protocol_breakdown_from_counts,
+    scale_estimates,
+    talker_counts,
+    throughput_counts,
+    throughput_from_counts,
+    top_ports_from_counts,
+    top_ports_from_sketches,
+    top_talkers_from_counts,
+    update_port_sketches,
+)
+from .index import CaptureIndex
+from .matrix import ConversationMatrix
+from .parser import FilterOptions, ParseProgress, build_flows, iter_packet_chunks, merge_flow_tables
+from .sampling import SampleOptions, sample_rate
+from .sketch import HeavyHitters
+
+# Partial tables are merged once the pending rows exceed this or the merged table's size.
+_COMPACT_ROWS = 1 << 20
+
+
+def _sum_counts(keys: list[str], tables: list[pd.DataFrame]) -> pd.DataFrame:
+    merged = pd.concat(tables, ignore_index=True)
+    return merged.groupby(keys, sort=True, observed=True)[["bytes", "packets"]].sum().reset_index()
+
+
+class _Partials:
+    """Partial tables of a mergeable aggregate, combined lazily with ``combine``."""
+
+    def __init__(self, combine: Callable[[list[pd.DataFrame]], pd.DataFrame], empty: pd.DataFrame) -> None:
+        self._combine = combine
+        self._empty = empty
+        self._tables: list[pd.DataFrame] = []
+        self._pending = 0
+        self._merged_rows = 0
+
+    def add(self, table: pd.DataFrame) -> None:
+        if table.empty:
+            return
+        self._tables.append(table)
+        self._pending += len(table)
+        if self._pending > max(_COMPACT_ROWS, self._merged_rows):
+            self._compact()
+
+    def _compact(self) -> None:
+        if len(self._tables) > 1:
+            self._tables = [self._combine(self._tables)]
+        self._merged_rows = len(self._tables[0]) if self._tables else 0
+        self._pending = 0
+
+    def table(self) -> pd.DataFrame:
+        self._compact()
+        return self._tables[0] if self._tables else self._empty
+
+
+class StreamingStats:
+    """Running aggregates of a packet stream.
+
+    ``update`` takes one packets table chunk at a time; ``merge`` folds in the
+    stats of another (disjoint) stream. ``flows=False`` skips the flows table
+    (e.g. when a ``flows.FlowTable`` is used instead). throughput_rule must be a fixed interval
+    ('500ms', '1S', '1min', ...); its bins are those of ``compute_throughput``. ``epsilon``
+    switches hosts, pairs and ports to heavy-hitter sketches of that relative error.
+    """
+
+    def __init__(
+        self, throughput_rule: str = "1S", flows: bool = True, epsilon: Optional[float] = None, sample_rate: int = 1
+    ) -> None:
+        self.throughput_rule = throughput_rule
+        self.track_flows = flows
+        self.epsilon = epsilon
+        self.sample_rate = sample_rate
+        self.packets = 0
+        self.bytes = 0
+        self.time_min: Optional[pd.Timestamp] = None
+        self.time_max: Optional[pd.Timestamp] = None
+        self._pairs = _Partials(partial(_sum_counts, PAIR_KEYS), pd.DataFrame(columns=PAIR_KEYS + ["bytes", "packets"]))
+        self._ports = _Partials(partial(_sum_counts, PORT_KEYS), pd.DataFrame(columns=PORT_KEYS + ["bytes", "packets"]))
+        self._buckets = _Partials(partial(_sum_counts, ["bucket"]), pd.DataFrame(columns=["bucket", "bytes", "packets"]))
+        self._flows = _Partials(merge_flow_tables, merge_flow_tables([]))
+        if epsilon is not None:
+            self._talkers = HeavyHitters(["ip"], epsilon)
+            self._edges = HeavyHitters(PAIR_KEYS, epsilon)
+            self._port_sketches: dict = {}
+            self._protocols = _Partials(
+                partial(_sum_counts, ["protocol"]), pd.DataFrame(columns=["protocol", "bytes", "packets"])
+            )
+
+    def update(self, packets_df: pd.DataFrame) -> None:
+        if packets_df.empty:
+            return
+        self.packets += len(packets_df)
+        self.bytes += int(packets_df["length"].sum())
+        lo, hi = packets_df["timestamp"].min(), packets_df["timestamp"].max()
+        self.time_min = lo if self.time_min is None else min(self.time_min, lo)
+        self.time_max = hi if self.time_max is None else max(self.time_max, hi)
+        pairs = pair_counts(packets_df)
+        if self.epsilon is not None:
+            self._edges.update(pairs)
+            self._talkers.update(talker_counts(pairs))
+            update_port_sketches(self._port_sketches, port_counts(packets_df), self.epsilon)
+            self._protocols.add(_sum_counts(["protocol"], [pairs]))
+        else:
+            self._pairs.add(pairs)
+            self._ports.add(port_counts(packets_df))
+        self._buckets.add(throughput_counts(packets_df, self.throughput_rule))
+        if self.track_flows:
+            self._flows.add(build_flows(packets_df))
+
+    def merge(self, other: "StreamingStats") -> None:
+        if other.throughput_rule != self.throughput_rule:
+            raise ValueError("Cannot merge stats with different throughput rules")
+        if other.epsilon != self.epsilon:
+            raise ValueError("Cannot merge stats with different sketch errors")
+        if other.sample_rate != self.sample_rate:
+            raise ValueError("Cannot merge stats with different sampling rates")
+        if not other.packets:
+            return
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.time_min = other.time_min if self.time_min is None else min(self.time_min, other.time_min)
+        self.time_max = other.time_max if self.time_max is None else max(self.time_max, other.time_max)
+        if self.epsilon is not None:
+            self._edges.merge(other._edges)
+            self._talkers.merge(other._talkers)
+            for protocol, sketch in other._port_sketches.items():
+                self._port_sketches.setdefault(protocol, HeavyHitters(PORT_KEYS, self.epsilon)).merge(sketch)
+            self._protocols.add(other._protocols.table())
+        else:
+            self._pairs.add(other.pairs())
+            self._ports.add(other.ports())
+        self._buckets.add(other.buckets())
+        self._flows.add(other.flows())
+
+    def pairs(self) -> pd.DataFrame:
+        """``metrics.pair_counts`` of everything seen so far (the sketched heaviest pairs with ``epsilon``)."""
+        if self.epsilon is not None:
+            return self._edges.table()
+        return self._pairs.table()
+
+    def ports(self) -> pd.DataFrame:
+        """``metrics.port_counts`` of everything seen so far (the sketched heaviest ports with ``epsilon``)."""
+        if self.epsilon is not None:
+            return top_ports_from_sketches(self._port_sketches, n=None)
+        return self._ports.table()
+
+    def buckets(self) -> pd.DataFrame:
+        """``metrics.throughput_counts`` of everything seen so far."""
+        return self._buckets.table()
+
+    def flows(self) -> pd.DataFrame:
+        """The ``parse_pcap`` flows table of everything seen so far."""
+        return self._flows.table()
+
+    # Empty streams go through the in-memory functions so empty outputs match exactly.
+
+    def top_talkers(self, n: int = 10) -> pd.DataFrame:
+        if self.epsilon is not None:
+            return scale_estimates(self._talkers.top(n), self.sample_rate)
+        if not self.packets:
+            return compute_top_talkers(empty_packets_frame(), n, sample_rate=self.sample_rate)
+        return scale_estimates(top_talkers_from_counts(self.pairs(), n), self.sample_rate)
+
+    def top_ports(self, n: int = 10) -> pd.DataFrame:
+        if self.epsilon is not None:
+            return scale_estimates(top_ports_from_sketches(self._port_sketches, n), self.sample_rate)
+        if not self.packets:
+            return compute_top_ports(empty_packets_frame(), n, sample_rate=self.sample_rate)
+        return scale_estimates(top_ports_from_counts(self.ports(), n), self.sample_rate)
+
+    def protocol_breakdown(self) -> pd.DataFrame:
+        if not self.packets:
+            return compute_protocol_breakdown(empty_packets_frame(), sample_rate=self.sample_rate)
+        if self.epsilon is not None:
+            return scale_estimates(protocol_breakdown_from_counts(self._protocols.table()), self.sample_rate)
+        return scale_estimates(protocol_breakdown_from_counts(self.pairs()), self.sample_rate)
+
+    def throughput(self) -> pd.DataFrame:
+        if not self.packets:
+            return compute_throughput(empty_packets_frame(), self.throughput_rule, sample_rate=self.sample_rate)
+        return scale_estimates(throughput_from_counts(self.buckets(), self.throughput_rule), self.sample_rate)
+
+    def conversation_matrix(self, top_n: Optional[int] = None) -> pd.DataFrame:
+        if not self.packets:
+            return compute_conversation_matrix(empty_packets_frame())
+        return conversation_matrix_from_counts(self.pairs(), top_n)
+
+    def sparse_conversation_matrix(self) -> ConversationMatrix:
+        return ConversationMatrix.from_counts(self.pairs())
+
+    def host_graph(
+        self,
+        min_bytes: int = 0,
+        top_nodes: Optional[int] = None,
+        top_edges: Optional[int] = None,
+        subnets: Optional[SubnetMap] = None,
+    ) -> nx.DiGraph:
+        return host_graph_from_counts(
+            scale_estimates(self.pairs(), self.sample_rate),
+            min_bytes=min_bytes,
+            top_nodes=top_nodes,
+            top_edges=top_edges,
+            subnets=subnets,
+        )
+
+
+def stream_chunks(
+    chunks: Iterable[pd.DataFrame],
+    throughput_rule: str = "1S",
+    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+    flows: bool = True,
+    epsilon: Optional[float] = None,
+    sample_rate: int = 1,
+) -> StreamingStats:
+    """Aggregate packets table chunks; ``on_chunk`` sees every chunk first (e.g. to append it to a CSV)."""
+    stats = StreamingStats(throughput_rule, flows=flows, epsilon=epsilon, sample_rate=sample_rate)
+    for chunk in chunks:
+        if on_chunk is not None:
+            on_chunk(chunk)
+        stats.update(chunk)
+    return stats
+
+
+def stream_pcap(
+    pcap_path: str,
+    max_packets: Optional[int] = None,
+    filters: Optional[FilterOptions] = None,
+    engine: str = "native",
+    index: Optional[CaptureIndex] = None,
+    throughput_rule: str = "1S",
+    chunk_size: int = 65536,
+    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+    flows: bool = True,
+    epsilon: Optional[float] = None,
+    progress: Optional[Callable[[ParseProgress], None]] = None,
+    sample: Optional[SampleOptions] = None,
+) -> StreamingStats:
+    """Analyse a capture in one pass without building the full packets table (or a ``sample`` of it)."""
+    chunks = iter_packet_chunks(
+        pcap_path,
+        max_packets=max_packets,
+        filters=filters,
+        engine=engine,
+        index=index,
+        chunk_size=chunk_size,
+        progress=progress,
+        sample=sample,
+    )
+    return stream_chunks(chunks, throughput_rule, on_chunk, flows, epsilon, sample_rate(sample))
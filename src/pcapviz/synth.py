@@ -0,0 +1,297 @@
+"""Deterministic synthetic captures for benchmarks.
+
+``write_capture`` writes a pcap or pcapng file of Ethernet frames whose shape
+is set by a ``SynthSpec``: packet count, number of hosts and flows, TCP/UDP/
+other protocol mix and IPv6 share. The same spec (including ``seed``) always
+produces the same bytes, so benchmark runs on different machines or releases
+parse identical input.
+
+Hosts have Zipf-distributed popularity and flows heavy-tailed packet counts,
+as in real traffic; every flow gets at least one packet when there are enough
+packets. Frames carry IPv4/IPv6 with TCP, UDP or ICMP/ICMPv6 echo headers and
+zero payload up to their length, and are built column-wise with numpy a chunk
+of packets at a time.
+
+    python -m src.pcapviz.synth bench.pcap --packets 1000000 --hosts 5000 --flows 50000 --mix 70,25,5 --ipv6 0.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+from dataclasses import asdict, dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+_PCAP_HEADER = struct.Struct("<IHHiIII")
+_PCAP_MAGIC_US = 0xA1B2C3D4
+_SNAPLEN = 0xFFFF
+_LINKTYPE_ETHERNET = 1
+_CHUNK = 65536
+
+_TCP, _UDP, _OTHER = 0, 1, 2
+_TCP_PORTS = np.array([443, 80, 22, 8080, 25, 3389, 993, 5432])
+_UDP_PORTS = np.array([53, 123, 443, 5353, 161, 500, 514, 1900])
+_PORT_WEIGHTS = np.array([0.4, 0.2, 0.1, 0.1, 0.06, 0.06, 0.04, 0.04])
+# TCP flags (ACK, PSH-ACK, SYN, SYN-ACK, FIN-ACK, RST) and how often they occur
+_TCP_FLAGS = np.array([0x10, 0x18, 0x02, 0x12, 0x11, 0x04])
+_TCP_FLAG_WEIGHTS = np.array([0.5, 0.35, 0.05, 0.04, 0.04, 0.02])
+
+
+@dataclass
+class SynthSpec:
+    """Shape of a synthetic capture."""
+
+    packets: int = 200_000
+    hosts: int = 2_000
+    flows: int = 10_000
+    tcp: float = 0.7  # protocol mix of the flows; the rest is ICMP/ICMPv6
+    udp: float = 0.25
+    ipv6: float = 0.1  # share of flows over IPv6
+    duration: float = 60.0  # seconds covered by the timestamps
+    max_length: int = 1500  # frame lengths are drawn up to this
+    start: float = 1_700_000_000.0  # first timestamp (epoch seconds)
+    seed: int = 0
+    pcapng: bool = False
+
+    def __post_init__(self) -> None:
+        if self.hosts < 2 or self.flows < 1 or self.packets < 0:
+            raise ValueError("Need at least 2 hosts, 1 flow and 0 packets")
+        if self.tcp < 0 or self.udp < 0 or self.tcp + self.udp > 1 or not 0 <= self.ipv6 <= 1:
+            raise ValueError("Protocol and IPv6 shares must be between 0 and 1")
+        if not 100 <= self.max_length <= _SNAPLEN:
+            raise ValueError("max_length must be between 100 and 65535")
+
+
+@dataclass
+class _Flows:
+    src: np.ndarray  # host indexes
+    dst: np.ndarray
+    sport: np.ndarray
+    dport: np.ndarray
+    proto: np.ndarray  # _TCP, _UDP or _OTHER
+    v6: np.ndarray  # bool
+
+
+def _zipf_weights(n: int, s: float = 1.0) -> np.ndarray:
+    w = 1.0 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+
+def _make_flows(spec: SynthSpec, rng: np.random.Generator) -> tuple[_Flows, np.ndarray]:
+    """The flows and their share of the packets."""
+    n = spec.flows
+    popularity = _zipf_weights(spec.hosts)
+    src = rng.choice(spec.hosts, size=n, p=popularity)
+    dst = rng.choice(spec.hosts, size=n, p=popularity)
+    clash = src == dst
+    dst[clash] = (dst[clash] + rng.integers(1, spec.hosts, size=int(clash.sum()))) % spec.hosts
+    proto = rng.choice(3, size=n, p=[spec.tcp, spec.udp, max(0.0, 1 - spec.tcp - spec.udp)])
+    port_choice = rng.choice(len(_PORT_WEIGHTS), size=n, p=_PORT_WEIGHTS)
+    dport = np.where(proto == _TCP, _TCP_PORTS[port_choice], _UDP_PORTS[port_choice])
+    sport = rng.integers(49152, 65536, size=n)
+    v6 = rng.random(n) < spec.ipv6
+    share = rng.pareto(1.2, size=n) + 1.0
+    return _Flows(src, dst, sport, dport, proto, v6), share / share.sum()
+
+
+def _assign_packets(spec: SynthSpec, share: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Flow of every packet, in time order: one packet per flow first (if possible), the rest by share."""
+    first = np.arange(min(spec.flows, spec.packets))
+    rest = rng.choice(spec.flows, size=spec.packets - len(first), p=share)
+    flow = np.concatenate([first, rest])
+    rng.shuffle(flow)
+    return flow
+
+
+def _put(buf: np.ndarray, pos: np.ndarray, values, nbytes: int, little: bool = False) -> None:
+    """Write ``values`` as ``nbytes``-byte integers at offsets ``pos`` of ``buf``."""
+    values = np.asarray(values, dtype=np.uint64)
+    for k in range(nbytes):
+        shift = 8 * k if little else 8 * (nbytes - 1 - k)
+        buf[pos + k] = (values >> np.uint64(shift)) & np.uint64(0xFF)
+
+
+def _frames(
+    flows: _Flows,
+    rows: np.ndarray,
+    reply: np.ndarray,
+    lengths: np.ndarray,
+    flags: np.ndarray,
+    pos: np.ndarray,
+    buf: np.ndarray,
+) -> None:
+    """Write the Ethernet/IP/L4 headers of packets ``rows`` at frame offsets ``pos`` (payload stays zero)."""
+    src = np.where(reply, flows.dst[rows], flows.src[rows]).astype(np.uint64)
+    dst = np.where(reply, flows.src[rows], flows.dst[rows]).astype(np.uint64)
+    sport = np.where(reply, flows.dport[rows], flows.sport[rows])
+    dport = np.where(reply, flows.sport[rows], flows.dport[rows])
+    proto = flows.proto[rows]
+    v6 = flows.v6[rows]
+
+    # Ethernet: locally administered MACs 02:00:<host index>, then the ethertype
+    _put(buf, pos, 0x020000000000 + dst + 1, 6)
+    _put(buf, pos + 6, 0x020000000000 + src + 1, 6)
+    _put(buf, pos + 12, np.where(v6, 0x86DD, 0x0800), 2)
+
+    ip = pos + 14
+    l4_len = lengths - 14 - np.where(v6, 40, 20)
+    v4 = ~v6
+    p4, p6 = ip[v4], ip[v6]
+    # IPv4: 10.0.0.0/8 + host index
+    buf[p4] = 0x45
+    _put(buf, p4 + 2, lengths[v4] - 14, 2)
+    buf[p4 + 8] = 64
+    buf[p4 + 9] = np.select([proto[v4] == _TCP, proto[v4] == _UDP], [6, 17], 1)
+    _put(buf, p4 + 12, 0x0A000000 + src[v4] + 1, 4)
+    _put(buf, p4 + 16, 0x0A000000 + dst[v4] + 1, 4)
+    # IPv6: 2001:db8::<host index>
+    buf[p6] = 0x60
+    _put(buf, p6 + 4, l4_len[v6], 2)
+    buf[p6 + 6] = np.select([proto[v6] == _TCP, proto[v6] == _UDP], [6, 17], 58)
+    buf[p6 + 7] = 64
+    for base, host in ((p6 + 8, src[v6]), (p6 + 24, dst[v6])):
+        _put(buf, base, 0x20010DB8, 4)
+        _put(buf, base + 12, host + 1, 4)
+
+    l4 = ip + np.where(v6, 40, 20)
+    ported = proto != _OTHER
+    _put(buf, l4[ported], sport[ported], 2)
+    _put(buf, l4[ported] + 2, dport[ported], 2)
+    tcp = proto == _TCP
+    buf[l4[tcp] + 12] = 0x50  # data offset: 5 words
+    buf[l4[tcp] + 13] = flags[tcp]
+    _put(buf, l4[tcp] + 14, 65535, 2)
+    udp = proto == _UDP
+    _put(buf, l4[udp] + 4, l4_len[udp], 2)
+    other = proto == _OTHER
+    buf[l4[other]] = np.where(v6[other], 128, 8)  # echo request
+
+
+def _file_header(spec: SynthSpec) -> bytes:
+    if not spec.pcapng:
+        return _PCAP_HEADER.pack(_PCAP_MAGIC_US, 2, 4, 0, 0, _SNAPLEN, _LINKTYPE_ETHERNET)
+    shb = struct.pack("<IIIHHqI", 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28)
+    idb = struct.pack("<IIHHII", 1, 20, _LINKTYPE_ETHERNET, 0, _SNAPLEN, 20)
+    return shb + idb
+
+
+def iter_capture_chunks(spec: SynthSpec) -> Iterator[bytes]:
+    """The capture file as byte chunks: the file header, then records ``_CHUNK`` packets at a time."""
+    rng = np.random.default_rng(spec.seed)
+    flows, share = _make_flows(spec, rng)
+    flow_of = _assign_packets(spec, share, rng)
+    offsets = np.sort(rng.random(spec.packets)) * spec.duration
+    usec = np.round((spec.start + offsets) * 1e6).astype(np.uint64)
+    yield _file_header(spec)
+    for start in range(0, spec.packets, _CHUNK):
+        rows = flow_of[start:start + _CHUNK]
+        n = len(rows)
+        v6 = flows.v6[rows]
+        proto = flows.proto[rows]
+        min_len = 14 + np.where(v6, 40, 20) + np.select([proto == _TCP, proto == _UDP], [20, 8], 8)
+        small = rng.random(n) < 0.4
+        lengths = np.where(
+            small,
+            rng.integers(60, 129, size=n),
+            rng.integers(129, spec.max_length + 1, size=n),
+        )
+        lengths = np.maximum(lengths, min_len).astype(np.int64)
+        reply = rng.random(n) < 0.4
+        flags = rng.choice(_TCP_FLAGS, size=n, p=_TCP_FLAG_WEIGHTS)
+        ts = usec[start:start + n]
+
+        if spec.pcapng:
+            padded = (lengths + 3) // 4 * 4
+            rec_len = 28 + padded + 4
+        else:
+            rec_len = 16 + lengths
+        rec_pos = np.concatenate([[0], np.cumsum(rec_len)[:-1]])
+        buf = np.zeros(int(rec_len.sum()), dtype=np.uint8)
+        if spec.pcapng:
+            _put(buf, rec_pos, 6, 4, little=True)  # enhanced packet block
+            _put(buf, rec_pos + 4, rec_len, 4, little=True)
+            _put(buf, rec_pos + 12, ts >> np.uint64(32), 4, little=True)
+            _put(buf, rec_pos + 16, ts & np.uint64(0xFFFFFFFF), 4, little=True)
+            _put(buf, rec_pos + 20, lengths, 4, little=True)
+            _put(buf, rec_pos + 24, lengths, 4, little=True)
+            _put(buf, rec_pos + rec_len - 4, rec_len, 4, little=True)
+            frame_pos = rec_pos + 28
+        else:
+            _put(buf, rec_pos, ts // np.uint64(1_000_000), 4, little=True)
+            _put(buf, rec_pos + 4, ts % np.uint64(1_000_000), 4, little=True)
+            _put(buf, rec_pos + 8, lengths, 4, little=True)
+            _put(buf, rec_pos + 12, lengths, 4, little=True)
+            frame_pos = rec_pos + 16
+        _frames(flows, rows, reply, lengths, flags, frame_pos, buf)
+        yield buf.tobytes()
+
+
+def write_capture(path: str, spec: Optional[SynthSpec] = None) -> int:
+    """Write the capture of ``spec`` to ``path``; returns its size in bytes."""
+    spec = spec or SynthSpec()
+    size = 0
+    with open(path, "wb") as fh:
+        for chunk in iter_capture_chunks(spec):
+            fh.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    """The ``SynthSpec`` options, shared with ``bench``."""
+    d = SynthSpec()
+    parser.add_argument("--packets", type=int, default=d.packets, help="Number of packets")
+    parser.add_argument("--hosts", type=int, default=d.hosts, help="Number of distinct hosts")
+    parser.add_argument("--flows", type=int, default=d.flows, help="Number of flows")
+    parser.add_argument(
+        "--mix",
+        default=f"{d.tcp * 100:g},{d.udp * 100:g},{(1 - d.tcp - d.udp) * 100:g}",
+        help="TCP,UDP,other shares of the flows (normalized), e.g. 70,25,5",
+    )
+    parser.add_argument("--ipv6", type=float, default=d.ipv6, help="Share of flows over IPv6 (0-1)")
+    parser.add_argument("--duration", type=float, default=d.duration, help="Seconds covered by the capture")
+    parser.add_argument("--max-length", type=int, default=d.max_length, help="Largest frame length")
+    parser.add_argument("--seed", type=int, default=d.seed, help="Random seed")
+
+
+def spec_from_args(args: argparse.Namespace, pcapng: bool = False) -> SynthSpec:
+    try:
+        tcp, udp, other = (float(x) for x in args.mix.split(","))
+    except ValueError as exc:
+        raise ValueError(f"--mix must be three comma-separated numbers, got {args.mix!r}") from exc
+    total = tcp + udp + other
+    if total <= 0:
+        raise ValueError("--mix must not be all zero")
+    return SynthSpec(
+        packets=args.packets,
+        hosts=args.hosts,
+        flows=args.flows,
+        tcp=tcp / total,
+        udp=udp / total,
+        ipv6=args.ipv6,
+        duration=args.duration,
+        max_length=args.max_length,
+        seed=args.seed,
+        pcapng=pcapng,
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic capture")
+    parser.add_argument("out", help="Output file (.pcapng for pcapng, pcap otherwise)")
+    add_spec_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        spec = spec_from_args(args, pcapng=args.out.endswith(".pcapng"))
+    except ValueError as exc:
+        parser.error(str(exc))
+    size = write_capture(args.out, spec)
+    print(f"Wrote {spec.packets} packets ({size / 1e6:.1f} MB) to {args.out}: {asdict(spec)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+"""Small deterministic captures for the tests, written with Scapy."""
+
+from __future__ import annotations
+
+from scapy.all import ICMP, IP, IPv6, TCP, UDP, Dot1Q, Ether, Raw, wrpcap, wrpcapng
+
+START = 1_700_000_000.0
+TCP_FLAGS = ("S", "SA", "A", "PA", "FA", "R")
+
+
+def _eth() -> Ether:
+    # explicit addresses, so Scapy does not try to resolve them
+    return Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+
+
+def mixed_packets(n: int = 3000) -> list:
+    """Mostly plain IPv4 TCP/UDP, plus the frames the vectorized decoder leaves to ``decode_frame``.
+
+    Packets are 10 ms apart; 40 client hosts talk to 12 servers.
+    """
+    packets = []
+    for i in range(n):
+        src, dst = f"10.0.{i % 4}.{i % 40 + 1}", f"192.168.1.{i % 12 + 1}"
+        payload = Raw(b"x" * (i % 50))
+        kind = i % 20
+        if kind < 9:
+            pkt = _eth() / IP(src=src, dst=dst, ttl=64 - i % 5) / TCP(
+                sport=1024 + i % 40, dport=(80, 443, 22)[i % 3], flags=TCP_FLAGS[i % 6]
+            ) / payload
+        elif kind < 14:
+            pkt = _eth() / IP(src=src, dst=dst, ttl=128) / UDP(sport=5000 + i % 40, dport=53) / payload
+        elif kind == 14:
+            pkt = _eth() / IPv6(src=f"2001:db8::{i % 40 + 1:x}", dst="2001:db8:1::1") / TCP(sport=40000, dport=443, flags="PA")
+        elif kind == 15:
+            pkt = _eth() / IPv6(src=f"2001:db8::{i % 40 + 1:x}", dst="2001:db8:1::53") / UDP(sport=40001, dport=53)
+        elif kind == 16:
+            pkt = _eth() / Dot1Q(vlan=7) / IP(src=src, dst=dst) / UDP(sport=6000, dport=123) / payload
+        elif kind == 17:
+            pkt = _eth() / IP(src=src, dst=dst) / ICMP(type=8)
+        elif kind == 18:
+            # IP options and fragments are outside the vectorized decoder's fast path
+            pkt = _eth() / IP(src=src, dst=dst, options=b"\x01\x01\x01\x00") / TCP(sport=2000, dport=80)
+        else:
+            pkt = _eth() / IP(src=src, dst=dst, flags="MF", frag=0) / UDP(sport=7000, dport=9999) / payload
+        pkt.time = START + i * 0.01
+        packets.append(pkt)
+    return packets
+
+
+def raw_ip_packets(n: int = 200) -> list:
+    """IPv4 and IPv6 packets without a link layer (DLT_RAW)."""
+    packets = []
+    for i in range(n):
+        if i % 4 == 3:
+            pkt = IPv6(src="2001:db8::1", dst="2001:db8::2") / UDP(sport=1000 + i, dport=53)
+        else:
+            pkt = IP(src=f"172.16.0.{i % 9 + 1}", dst="172.16.1.1") / TCP(sport=3000 + i % 7, dport=8080, flags="A")
+        pkt.time = START + i * 0.5
+        packets.append(pkt)
+    return packets
+
+
+def write_pcap(path, packets: list, linktype: int | None = None) -> str:
+    wrpcap(str(path), packets, linktype=linktype)
+    return str(path)
+
+
+def write_pcapng(path, packets: list) -> str:
+    wrpcapng(str(path), packets)
+    return str(path)
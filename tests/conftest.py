@@ -0,0 +1,15 @@
+import pytest
+
+from .captures import mixed_packets, raw_ip_packets, write_pcap
+
+
+@pytest.fixture(scope="session")
+def capture(tmp_path_factory) -> str:
+    """Path of a 3000-packet Ethernet pcap with mixed traffic (see ``captures.mixed_packets``)."""
+    return write_pcap(tmp_path_factory.mktemp("captures") / "mixed.pcap", mixed_packets())
+
+
+@pytest.fixture(scope="session")
+def raw_capture(tmp_path_factory) -> str:
+    """Path of a raw-IP (DLT_RAW) pcap."""
+    return write_pcap(tmp_path_factory.mktemp("captures") / "raw.pcap", raw_ip_packets(), linktype=101)
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.pcapviz.batch import BatchOptions, find_captures, run_batch
+from src.pcapviz.parser import FilterOptions
+from src.pcapviz.streaming import stream_pcap
+
+from .captures import mixed_packets, write_pcap
+
+
+@pytest.fixture(scope="module")
+def rotated(tmp_path_factory) -> list[str]:
+    """The packets of ``mixed.pcap`` written as three rotated files."""
+    folder = tmp_path_factory.mktemp("rotated")
+    packets = mixed_packets()
+    return [write_pcap(folder / f"cap{i}.pcap", packets[i * 1000:(i + 1) * 1000]) for i in range(3)]
+
+
+def _sorted(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    return df.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_merged_batch_matches_one_capture(capture, rotated, tmp_path, workers):
+    result = run_batch(rotated, tmp_path, workers=workers)
+    assert sorted(result.processed) == rotated and not result.skipped and not result.failed
+    single = stream_pcap(capture)
+    merged = result.stats
+    assert (merged.packets, merged.bytes) == (single.packets, single.bytes)
+    pd.testing.assert_frame_equal(merged.throughput(), single.throughput())
+    pd.testing.assert_frame_equal(_sorted(merged.top_talkers(1000), ["ip"]), _sorted(single.top_talkers(1000), ["ip"]))
+    ports = ["protocol", "dst_port"]
+    pd.testing.assert_frame_equal(_sorted(merged.top_ports(1000), ports), _sorted(single.top_ports(1000), ports))
+    # flows running across files are joined
+    keys = ["src_ip", "dst_ip", "src_port", "dst_port", "protocol", "start_time"]
+    pd.testing.assert_frame_equal(_sorted(merged.flows(), keys), _sorted(single.flows(), keys))
+
+
+def test_unchanged_files_are_skipped(rotated, tmp_path):
+    files = [str(tmp_path / os.path.basename(p)) for p in rotated]
+    for src, dst in zip(rotated, files):
+        with open(src, "rb") as fh, open(dst, "wb") as out:
+            out.write(fh.read())
+    out_dir = tmp_path / "out"
+    first = run_batch(files, out_dir)
+    again = run_batch(files, out_dir)
+    assert again.processed == [] and sorted(again.skipped) == files
+    assert again.stats.packets == first.stats.packets
+
+    with open(files[1], "ab") as fh:
+        fh.write(b"\0" * 3)  # a truncated record: still readable, but changed
+    changed = run_batch(files, out_dir)
+    assert changed.processed == [files[1]] and sorted(changed.skipped) == [files[0], files[2]]
+
+    filtered = run_batch(files, out_dir, BatchOptions(filters=FilterOptions(protocols=["UDP"])))
+    assert sorted(filtered.processed) == files
+    assert filtered.stats.protocol_breakdown()["protocol"].astype(str).tolist() == ["UDP"]
+
+
+def test_broken_files_fail_without_stopping_the_batch(rotated, tmp_path):
+    broken = tmp_path / "broken.pcap"
+    broken.write_bytes(b"not a capture")
+    result = run_batch([*rotated, str(broken), str(tmp_path / "missing.pcap")], tmp_path / "out")
+    assert sorted(result.failed) == [str(broken), str(tmp_path / "missing.pcap")]
+    assert sorted(result.processed) == rotated
+
+
+def test_find_captures(rotated, tmp_path):
+    folder = os.path.dirname(rotated[0])
+    assert find_captures([folder]) == rotated
+    assert find_captures([os.path.join(folder, "cap[12].pcap"), rotated[1]]) == rotated[1:]
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.cache import ParseCache, parse_pcap_cached
+from src.pcapviz.index import ensure_index
+from src.pcapviz.parser import FilterOptions, parse_pcap
+
+pytest.importorskip("pyarrow")
+
+
+def _keys(cache: ParseCache) -> set:
+    return {p.name.split(".", 1)[0] for p in cache.cache_dir.glob("*.parquet")}
+
+
+@pytest.mark.parametrize(
+    "filters, max_packets",
+    [(None, None), (None, 100), (FilterOptions(protocols=["UDP"]), None), (FilterOptions(dst_ports=[80, 443]), 50)],
+)
+def test_cached_parse_matches_direct_parse(capture, tmp_path, filters, max_packets):
+    cache = ParseCache(tmp_path)
+    expected = parse_pcap(capture, filters=filters, max_packets=max_packets)
+    for _ in range(2):  # miss, then hit
+        packets_df, flows_df = parse_pcap_cached(capture, cache, filters=filters, max_packets=max_packets)
+        pd.testing.assert_frame_equal(packets_df, expected[0])
+        pd.testing.assert_frame_equal(flows_df, expected[1])
+    assert len(_keys(cache)) == 1
+
+
+def test_engines_are_cached_separately(capture, tmp_path):
+    cache = ParseCache(tmp_path)
+    parse_pcap_cached(capture, cache, max_packets=10)
+    parse_pcap_cached(capture, cache, max_packets=10, engine="scapy")
+    assert len(_keys(cache)) == 2
+
+
+def test_indexed_miss_matches_plain_parse(capture, tmp_path):
+    index = ensure_index(capture, path=str(tmp_path / "mixed.pvidx"), block_bytes=16 << 10)
+    cache = ParseCache(tmp_path / "cache")
+    packets_df, _ = parse_pcap_cached(capture, cache, index=index)
+    pd.testing.assert_frame_equal(packets_df, parse_pcap(capture)[0])
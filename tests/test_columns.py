@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from scapy.all import IP, TCP, UDP, IPv6, rdpcap
+
+from src.pcapviz.columns import BYTES_PER_PACKET, PACKET_COLUMNS, concat_packet_frames, string_view, take_rows
+from src.pcapviz.parser import parse_pcap
+
+
+def _fixed_bytes(packets_df: pd.DataFrame) -> int:
+    """Bytes of the per-row buffers (category codes, not the category strings)."""
+    total = 0
+    for col in packets_df.columns:
+        array = packets_df[col].array
+        total += array.codes.nbytes if isinstance(array, pd.Categorical) else array.nbytes
+    return total
+
+
+def test_packet_table_is_compact(capture):
+    packets_df, _ = parse_pcap(capture)
+    assert list(packets_df.columns) == PACKET_COLUMNS
+    assert _fixed_bytes(packets_df) <= BYTES_PER_PACKET * len(packets_df)
+    assert str(packets_df["src_port"].dtype) == "UInt16" and str(packets_df["tcp_flags"].dtype) == "UInt16"
+    assert isinstance(packets_df["src_ip"].dtype, pd.CategoricalDtype)
+    # both address columns share their categories
+    assert packets_df["src_ip"].cat.categories.equals(packets_df["dst_ip"].cat.categories)
+
+
+def test_string_view_matches_scapy_fields(capture):
+    view = string_view(parse_pcap(capture)[0])
+    rows = iter(view.itertuples(index=False))
+    for pkt in rdpcap(capture):
+        l3 = pkt.getlayer(IP) or pkt.getlayer(IPv6)
+        row = next(rows)
+        assert (row.src_ip, row.dst_ip) == (l3.src, l3.dst)
+        l4 = pkt.getlayer(TCP) or pkt.getlayer(UDP)
+        if l4 is None:
+            assert row.protocol == l3.name.upper() and pd.isna(row.src_port) and row.tcp_flags is None
+        else:
+            assert (row.src_port, row.dst_port) == (l4.sport, l4.dport)
+            assert row.tcp_flags == (str(l4.flags) if pkt.haslayer(TCP) else None)
+        assert row.length == len(pkt)
+    assert next(rows, None) is None
+
+
+def test_concat_and_take_rows_keep_the_table(capture):
+    packets_df, _ = parse_pcap(capture)
+    parts = [packets_df.iloc[i:i + 700] for i in range(0, len(packets_df), 700)]
+    pd.testing.assert_frame_equal(concat_packet_frames(parts), packets_df)
+    rows = np.arange(0, len(packets_df), 7)
+    taken = take_rows(packets_df, rows, ["timestamp", "src_ip", "length"])
+    expected = packets_df.iloc[rows][["timestamp", "src_ip", "length"]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(taken, expected)
@@ -0,0 +1,73 @@
+import bz2
+import gzip
+import lzma
+
+import pandas as pd
+import pytest
+
+from src.pcapviz import decoder
+from src.pcapviz.decoder import capture_compression, open_capture
+from src.pcapviz.parser import parse_pcap
+from src.pcapviz.streaming import stream_pcap
+
+from .captures import mixed_packets, write_pcapng
+
+
+def _zstd(data: bytes) -> bytes:
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {"gzip": gzip.compress, "bzip2": bz2.compress, "xz": lzma.compress, "zstd": _zstd}
+
+
+@pytest.fixture(scope="module")
+def pcapng_capture(tmp_path_factory) -> str:
+    return write_pcapng(tmp_path_factory.mktemp("captures") / "mixed.pcapng", mixed_packets(600))
+
+
+def _compressed(path: str, compression: str, out_dir) -> str:
+    with open(path, "rb") as fh:
+        data = COMPRESSORS[compression](fh.read())
+    # named without a suffix: the magic bytes decide
+    packed = out_dir / f"{compression}.cap"
+    packed.write_bytes(data)
+    return str(packed)
+
+
+@pytest.mark.parametrize("compression", list(COMPRESSORS))
+@pytest.mark.parametrize("name", ["capture", "raw_capture", "pcapng_capture"])
+def test_compressed_capture_parses_like_the_plain_one(name, compression, request, tmp_path):
+    path = request.getfixturevalue(name)
+    packed = _compressed(path, compression, tmp_path)
+    with open(packed, "rb") as fh:
+        assert capture_compression(fh.read(8)) == compression
+    packets_df, flows_df = parse_pcap(path)
+    for engine in ("native", "scapy"):
+        got = parse_pcap(packed, engine=engine)
+        pd.testing.assert_frame_equal(got[0], packets_df)
+        pd.testing.assert_frame_equal(got[1], flows_df)
+    assert stream_pcap(packed, chunk_size=400).packets == len(packets_df)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bzip2", "xz"])
+def test_small_reads_across_concatenated_streams(capture, compression, monkeypatch):
+    monkeypatch.setattr(decoder, "_READ_SIZE", 1000)
+    monkeypatch.setattr(decoder, "_COMPRESSED_READ", 777)
+    with open(capture, "rb") as fh:
+        data = fh.read()
+    cut = len(data) // 2
+    packed = COMPRESSORS[compression](data[:cut]) + b"\0" * 5 + COMPRESSORS[compression](data[cut:])
+    with open_capture(packed) as f:
+        assert f.read(10) == data[:10]
+        assert f.read() == data[10:]
+        assert f.tell() == len(data)
+
+
+def test_truncated_stream_ends_where_its_data_does(capture):
+    with open(capture, "rb") as fh:
+        data = fh.read()
+    packed = gzip.compress(data)
+    with open_capture(packed[: len(packed) // 2]) as f:
+        head = f.read()
+    assert 0 < len(head) < len(data) and data.startswith(head)
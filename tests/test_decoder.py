@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.pcapviz.decoder import (
+    DLT_IPV4,
+    DLT_RAW,
+    NATIVE_LINKTYPES,
+    SCAPY_FALLBACK,
+    decode_frame,
+    decode_ipv4_batch,
+    iter_records,
+    open_capture,
+)
+
+
+def _records(path: str) -> list:
+    with open_capture(path) as f:
+        return list(iter_records(f))
+
+
+@pytest.mark.parametrize("name", ["capture", "raw_capture"])
+def test_ipv4_batch_matches_decode_frame(name, request):
+    records = _records(request.getfixturevalue(name))
+    decoded, fields = decode_ipv4_batch(records)
+    assert decoded.sum() == len(fields["src"])
+    for row, i in enumerate(np.flatnonzero(decoded)):
+        timestamp, linktype, buf, off, caplen = records[i]
+        src, dst, sport, dport, proto, version, ttl, flags = decode_frame(linktype, buf, off, off + caplen)
+        assert fields["timestamp"][row] == timestamp
+        assert fields["length"][row] == caplen
+        assert fields["src"][row] == int.from_bytes(src, "big")
+        assert fields["dst"][row] == int.from_bytes(dst, "big")
+        assert (fields["src_port"][row], fields["dst_port"][row]) == (sport, dport)
+        assert fields["protocol"][row] == {"TCP": 6, "UDP": 17}[proto]
+        assert version == 4 and fields["ttl"][row] == ttl
+        if proto == "TCP":
+            assert fields["tcp_flags"][row] == flags
+
+
+def test_ipv4_batch_leaves_other_frames_to_decode_frame(capture):
+    records = _records(capture)
+    decoded, _ = decode_ipv4_batch(records)
+    for is_decoded, (timestamp, linktype, buf, off, caplen) in zip(decoded, records):
+        fields = decode_frame(linktype, buf, off, off + caplen)
+        plain = fields is not None and fields is not SCAPY_FALLBACK and fields[4] in ("TCP", "UDP") and fields[5] == 4
+        # untagged, option-less, unfragmented IPv4 TCP/UDP is all batched; everything else is not
+        untagged = buf[off + 12:off + 14] == b"\x08\x00" and buf[off + 14] == 0x45
+        assert is_decoded == (plain and untagged)
+
+
+def test_ipv4_batch_rejects_truncated_headers(capture):
+    records = _records(capture)
+    timestamp, linktype, buf, off, caplen = next(r for r in records if decode_ipv4_batch([r])[0][0])
+    for cut in (14, 33, 34 + 7, 34 + 19):
+        decoded, fields = decode_ipv4_batch([(timestamp, linktype, buf, off, cut)])
+        assert not decoded[0] and len(fields["src"]) == 0
+
+
+def test_only_native_linktypes_are_decoded(raw_capture):
+    timestamp, linktype, buf, off, caplen = _records(raw_capture)[0]
+    assert linktype == DLT_RAW
+    frame = decode_frame(DLT_RAW, buf, off, off + caplen)
+    assert frame is not SCAPY_FALLBACK
+    # the first record is IPv4, which DLT_IPV4 decodes the same way
+    assert DLT_IPV4 in NATIVE_LINKTYPES and decode_frame(DLT_IPV4, buf, off, off + caplen) == frame
+    for unknown in (0, 105, 127, 276):
+        assert unknown not in NATIVE_LINKTYPES
+        assert decode_frame(unknown, buf, off, off + caplen) is SCAPY_FALLBACK
+        assert not decode_ipv4_batch([(timestamp, unknown, buf, off, caplen)])[0][0]
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.flows import FlowTable, flow_records
+from src.pcapviz.parser import parse_pcap
+
+T0 = pd.Timestamp("2024-01-01T00:00:00Z")
+SYN, FIN, RST, ACK = 0x02, 0x01, 0x04, 0x10
+
+
+def _packets(rows) -> pd.DataFrame:
+    """Packets table from (seconds, src, dst, sport, dport, protocol, tcp_flags) rows."""
+    seconds, src, dst, sport, dport, protocol, flags = zip(*rows)
+    return pd.DataFrame(
+        {
+            "timestamp": T0 + pd.to_timedelta(seconds, unit="s"),
+            "src_ip": src,
+            "dst_ip": dst,
+            "src_port": pd.array(sport, dtype="UInt16"),
+            "dst_port": pd.array(dport, dtype="UInt16"),
+            "protocol": protocol,
+            "length": 100,
+            "tcp_flags": pd.array(flags, dtype="UInt8"),
+        }
+    )
+
+
+def _udp(seconds, src="10.0.0.1", dst="10.0.0.2", sport=1000, dport=53):
+    return (seconds, src, dst, sport, dport, "UDP", None)
+
+
+def _tcp(seconds, flags, src="10.0.0.1", dst="10.0.0.2", sport=1000, dport=80):
+    return (seconds, src, dst, sport, dport, "TCP", flags)
+
+
+def test_idle_timeout_is_swept_without_a_later_packet_of_the_flow():
+    table = FlowTable(idle_timeout=10, active_timeout=None)
+    assert table.update(_packets([_udp(0), _udp(1, sport=2000)])).empty
+    records = table.update(_packets([_udp(10.5, sport=3000)]))
+    assert records[["src_port", "packets", "end_reason"]].values.tolist() == [[1000, 1, "idle"]]
+    assert table.flush()["end_reason"].tolist() == ["forced", "forced"]
+
+
+def test_active_timeout_is_swept_without_a_later_packet_of_the_flow():
+    table = FlowTable(idle_timeout=None, active_timeout=60)
+    table.update(_packets([_udp(s) for s in range(0, 50, 5)]))
+    # another flow moves the clock past the first one's active timeout
+    records = table.update(_packets([_udp(61, sport=2000)]))
+    assert records[["src_port", "packets", "end_reason"]].values.tolist() == [[1000, 10, "active"]]
+    assert len(table) == 1
+
+
+def test_active_timeout_splits_a_long_flow():
+    records = flow_records(_packets([_udp(s) for s in range(0, 100, 10)]), chunk_size=1, idle_timeout=None, active_timeout=30)
+    assert records["end_reason"].tolist() == ["active", "active", "active", "forced"]
+    assert records["packets"].tolist() == [3, 3, 3, 1]
+
+
+def test_tcp_end_reasons():
+    rows = [
+        _tcp(0, SYN), _tcp(0.1, SYN | ACK, src="10.0.0.2", dst="10.0.0.1", sport=80, dport=1000), _tcp(0.2, FIN | ACK),
+        _tcp(0, SYN, sport=2000), _tcp(0.5, RST, sport=2000),
+    ]
+    table = FlowTable(fin_timeout=2)
+    records = table.update(_packets(sorted(rows)))
+    assert records[["src_port", "end_reason"]].values.tolist() == [[2000, "end"]]
+    assert len(table) == 1
+    records = table.update(_packets([_udp(3)]))
+    assert records[["src_port", "packets", "tcp_flags", "end_reason"]].values.tolist() == [[1000, 3, "FSA", "end"]]
+
+
+def test_eviction_prefers_unanswered_flows():
+    table = FlowTable(idle_timeout=None, active_timeout=None, max_flows=2)
+    table.update(_packets([_udp(0), _udp(0.1, src="10.0.0.2", dst="10.0.0.1", sport=53, dport=1000), _udp(0.2, sport=2000)]))
+    records = table.update(_packets([_udp(0.3, sport=3000)]))
+    assert records[["src_port", "end_reason"]].values.tolist() == [[2000, "evicted"]]
+    assert table.evicted == 1 and len(table) == 2
+
+
+@pytest.mark.parametrize("chunk_size", [1, 500, 100_000])
+def test_without_timeouts_records_are_the_flows_table(capture, chunk_size):
+    packets_df, flows_df = parse_pcap(capture)
+    records = flow_records(packets_df, chunk_size=chunk_size, idle_timeout=None, active_timeout=None, tcp_end=False)
+    key = ["src_ip", "dst_ip", "src_port", "dst_port", "protocol"]
+    got = records[key + ["packets", "bytes"]].astype({"src_ip": str, "dst_ip": str, "protocol": str})
+    expected = flows_df[key + ["packets", "bytes"]].astype({"src_ip": str, "dst_ip": str, "protocol": str})
+    pd.testing.assert_frame_equal(
+        got.sort_values(key).reset_index(drop=True), expected.sort_values(key).reset_index(drop=True), check_dtype=False
+    )
+    assert set(records["end_reason"]) == {"forced"}
@@ -0,0 +1,53 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.pcapviz.cli import main
+from src.pcapviz.follow import CaptureFollower
+from src.pcapviz.parser import concat_packet_frames, parse_pcap
+
+
+def _read(follower: CaptureFollower) -> pd.DataFrame:
+    return concat_packet_frames(list(follower.read_new(chunk_size=256)))
+
+
+def test_follower_reads_only_complete_appended_records(capture, tmp_path):
+    with open(capture, "rb") as fh:
+        data = fh.read()
+    live = tmp_path / "live.pcap"
+    cut = len(data) // 3 + 7  # most likely inside a record
+    live.write_bytes(data[:cut])
+    follower = CaptureFollower(str(live))
+    first = _read(follower)
+    assert 0 < len(first) < len(parse_pcap(capture)[0])
+
+    with open(live, "ab") as fh:
+        fh.write(data[cut:])
+    rest = _read(follower)
+    assert len(_read(follower)) == 0
+    pd.testing.assert_frame_equal(concat_packet_frames([first, rest]), parse_pcap(capture)[0])
+
+
+def test_follower_moves_on_to_rotated_file(capture, tmp_path):
+    with open(capture, "rb") as fh:
+        data = fh.read()
+    first = tmp_path / "cap.pcap"
+    first.write_bytes(data)
+    follower = CaptureFollower(str(tmp_path / "cap.pcap*"))
+    assert len(_read(follower)) == len(parse_pcap(capture)[0])
+
+    second = tmp_path / "cap.pcap1"
+    second.write_bytes(data)
+    stat = os.stat(first)
+    os.utime(second, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(_read(follower)) == len(parse_pcap(capture)[0])
+    assert follower.path == str(second) and follower.files_done == 1
+
+
+@pytest.mark.parametrize("option", [["--max-packets", "10"], ["--workers", "4"], ["--index"], ["--sample", "10"]])
+def test_follow_rejects_options_it_cannot_honour(capture, tmp_path, option):
+    with pytest.raises(SystemExit) as exc:
+        main([capture, "--follow", "--out-dir", str(tmp_path / "out"), *option])
+    assert exc.value.code == 2
+    assert not os.path.exists(capture + ".pvidx")
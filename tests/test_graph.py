@@ -0,0 +1,90 @@
+import json
+
+import networkx as nx
+import pytest
+
+from src.pcapviz.columns import string_view
+from src.pcapviz.graph import SubnetMap, build_host_graph, export_graphml
+from src.pcapviz.parser import parse_pcap
+
+
+@pytest.fixture(scope="module")
+def packets_df(capture):
+    return parse_pcap(capture)[0]
+
+
+def _reference_graph(packets_df, min_bytes: int = 0) -> nx.DiGraph:
+    """The host graph built row by row, as ``build_host_graph`` originally did."""
+    agg = (
+        string_view(packets_df)
+        .groupby(["src_ip", "dst_ip", "protocol"])
+        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        .reset_index()
+    )
+    agg = agg[agg["bytes"] >= min_bytes]
+    G = nx.DiGraph()
+    for ip in set(agg["src_ip"]) | set(agg["dst_ip"]):
+        sent = agg[agg["src_ip"] == ip]
+        G.add_node(ip, total_bytes=int(sent["bytes"].sum()), total_packets=int(sent["packets"].sum()))
+    for (src, dst), df in agg.groupby(["src_ip", "dst_ip"]):
+        G.add_edge(
+            src,
+            dst,
+            bytes=int(df["bytes"].sum()),
+            packets=int(df["packets"].sum()),
+            protocol_bytes={str(p): int(b) for p, b in zip(df["protocol"], df["bytes"])},
+        )
+    return G
+
+
+def _plain(data: dict) -> dict:
+    return {k: (_plain(v) if isinstance(v, dict) else int(v)) for k, v in data.items()}
+
+
+def _assert_same_graph(G: nx.DiGraph, expected: nx.DiGraph) -> None:
+    assert {n: _plain(d) for n, d in G.nodes(data=True)} == {n: _plain(d) for n, d in expected.nodes(data=True)}
+    assert {(u, v): _plain(d) for u, v, d in G.edges(data=True)} == {(u, v): _plain(d) for u, v, d in expected.edges(data=True)}
+
+
+@pytest.mark.parametrize("min_bytes", [0, 2000])
+def test_host_graph_matches_row_by_row_build(packets_df, min_bytes):
+    _assert_same_graph(build_host_graph(packets_df, min_bytes=min_bytes), _reference_graph(packets_df, min_bytes))
+
+
+def test_top_nodes_and_top_edges(packets_df):
+    full = build_host_graph(packets_df)
+    traffic = {n: 0 for n in full}
+    for u, v, d in full.edges(data=True):
+        traffic[u] += d["bytes"]
+        traffic[v] += d["bytes"]
+    busiest = set(sorted(traffic, key=traffic.get, reverse=True)[:10])
+    G = build_host_graph(packets_df, top_nodes=10)
+    assert set(G.edges) == {(u, v) for u, v in full.edges if u in busiest and v in busiest}
+
+    G = build_host_graph(packets_df, top_edges=15)
+    heaviest = sorted((d["bytes"] for _, _, d in full.edges(data=True)), reverse=True)[:15]
+    assert sorted((d["bytes"] for _, _, d in G.edges(data=True)), reverse=True) == heaviest
+
+
+def test_subnet_supernodes_keep_the_traffic(packets_df):
+    subnets = SubnetMap(v4_prefix=16, networks=["192.168.1.0/28"])
+    G = build_host_graph(packets_df, subnets=subnets)
+    full = build_host_graph(packets_df)
+    assert {n for n in G if ":" not in n} == {"10.0.0.0/16", "192.168.1.0/28"}
+    assert sum(d["bytes"] for _, _, d in G.edges(data=True)) == sum(d["bytes"] for _, _, d in full.edges(data=True))
+    assert G.nodes["10.0.0.0/16"]["hosts"] == len([n for n in full if n.startswith("10.0.")])
+    assert G.nodes["192.168.1.0/28"]["hosts"] == 12
+
+
+def test_graphml_round_trip(packets_df, tmp_path):
+    G = build_host_graph(packets_df, sample_rate=4)
+    path = tmp_path / "graph.graphml"
+    export_graphml(G, str(path))
+    back = nx.read_graphml(path)
+    assert back.graph["sample_rate"] == 4
+    assert set(back.edges) == set(G.edges)
+    for u, v, d in G.edges(data=True):
+        assert back.edges[u, v]["bytes"] == d["bytes"]
+        assert json.loads(back.edges[u, v]["protocol_bytes"]) == _plain(d["protocol_bytes"])
+    for n, d in G.nodes(data=True):
+        assert back.nodes[n]["total_bytes"] == d["total_bytes"]
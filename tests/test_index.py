@@ -0,0 +1,68 @@
+import gzip
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.pcapviz.index import build_index, ensure_index, load_index
+from src.pcapviz.parser import FilterOptions, parse_pcap
+
+from .captures import mixed_packets, write_pcapng
+
+WINDOW = FilterOptions(
+    time_start=pd.Timestamp(1_700_000_010, unit="s", tz="UTC"), time_end=pd.Timestamp(1_700_000_012, unit="s", tz="UTC")
+)
+
+
+@pytest.fixture(scope="module")
+def pcapng_capture(tmp_path_factory) -> str:
+    return write_pcapng(tmp_path_factory.mktemp("captures") / "mixed.pcapng", mixed_packets(1500))
+
+
+@pytest.mark.parametrize("name", ["capture", "pcapng_capture"])
+def test_blocks_cover_every_packet(name, request):
+    path = request.getfixturevalue(name)
+    index = build_index(path, block_bytes=8 << 10)
+    assert len(index.blocks) > 3
+    assert sum(b.packets for b in index.blocks) == len(parse_pcap(path)[0])
+    assert [b.first_packet for b in index.blocks[1:]] == [a.first_packet + a.packets for a in index.blocks[:-1]]
+    assert all(a.span.end == b.span.start for a, b in zip(index.blocks, index.blocks[1:]))
+
+
+@pytest.mark.parametrize("name", ["capture", "pcapng_capture"])
+def test_time_queries_read_fewer_blocks(name, request, tmp_path):
+    path = request.getfixturevalue(name)
+    index = ensure_index(path, path=str(tmp_path / "x.pvidx"), block_bytes=8 << 10)
+    selected = index.select(WINDOW.compile())
+    assert 0 < len(selected) < len(index.blocks)
+    pd.testing.assert_frame_equal(parse_pcap(path, filters=WINDOW, index=index)[0], parse_pcap(path, filters=WINDOW)[0])
+
+
+def test_protocol_queries_skip_blocks_without_the_protocol(raw_capture, tmp_path):
+    index = ensure_index(raw_capture, path=str(tmp_path / "raw.pvidx"), block_bytes=1 << 10)
+    assert all(b.protocols == {"TCP", "UDP"} for b in index.blocks)
+    other = FilterOptions(protocols=["IP"])
+    assert index.select(other.compile()) == []
+    assert parse_pcap(raw_capture, filters=other, index=index)[0].empty
+    tcp = FilterOptions(protocols=["TCP"])
+    assert len(index.select(tcp.compile())) == len(index.blocks)
+
+
+def test_saved_index_is_reused_until_the_capture_changes(capture, tmp_path):
+    live = tmp_path / "live.pcap"
+    shutil.copy(capture, live)
+    index = ensure_index(str(live), block_bytes=8 << 10)
+    assert os.path.exists(f"{live}.pvidx")
+    assert load_index(str(live)) == index
+    with open(live, "ab") as fh:
+        fh.write(b"\0" * 16)
+    assert load_index(str(live)) is None
+
+
+def test_compressed_captures_cannot_be_indexed(capture, tmp_path):
+    packed = tmp_path / "mixed.pcap.gz"
+    with open(capture, "rb") as src, gzip.open(packed, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    with pytest.raises(ValueError):
+        build_index(str(packed))
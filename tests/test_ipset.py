@@ -0,0 +1,98 @@
+import ipaddress
+import socket
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pcapviz.ipset import IPSet, read_ip_list
+from src.pcapviz.parser import FilterOptions, parse_pcap
+
+
+def _random_entries(rng, n: int) -> list[str]:
+    entries = []
+    for _ in range(n):
+        if rng.random() < 0.7:
+            length = int(rng.integers(8, 33))
+            entries.append(str(ipaddress.ip_network((int(rng.integers(0, 1 << 32)), length), strict=False)))
+        else:
+            length = int(rng.integers(16, 129))
+            address = (0x20010DB8 << 96) | int(rng.integers(0, 1 << 62)) << 32
+            entries.append(str(ipaddress.ip_network((address, length), strict=False)))
+    return entries
+
+
+def _reference(entries: list[str], ip: str) -> bool:
+    address = ipaddress.ip_address(ip)
+    return any(address in ipaddress.ip_network(e) for e in entries)
+
+
+def _probes(rng, entries: list[str]) -> list[str]:
+    """Addresses inside, at the edges of and just outside the entries, plus random ones."""
+    probes = []
+    for entry in entries:
+        net = ipaddress.ip_network(entry)
+        first, last = int(net.network_address), int(net.broadcast_address)
+        top = (1 << net.max_prefixlen) - 1
+        for value in (first, last, max(first - 1, 0), min(last + 1, top), (first + last) // 2):
+            probes.append(str(ipaddress.ip_address(value) if net.version == 4 else ipaddress.IPv6Address(value)))
+    probes += [str(ipaddress.IPv4Address(int(v))) for v in rng.integers(0, 1 << 32, 200)]
+    return probes
+
+
+def test_membership_matches_ipaddress():
+    rng = np.random.default_rng(7)
+    entries = _random_entries(rng, 300) + ["10.1.2.3", "2001:db8::1"]
+    ipset = IPSet(entries)
+    assert len(ipset) == len(entries)
+    for ip in _probes(rng, entries) + ["10.1.2.3", "10.1.2.4", "2001:db8::1", "2001:db8::2"]:
+        expected = _reference(entries, ip)
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        assert (ip in ipset) == expected, ip
+        assert (socket.inet_pton(family, ip) in ipset) == expected, ip
+
+
+def test_vectorized_ipv4_membership():
+    rng = np.random.default_rng(8)
+    entries = [e for e in _random_entries(rng, 300) if ":" not in e] + ["10.0.0.0/8", "10.128.0.0/9", "11.0.0.0/8", "1.2.3.4"]
+    ipset = IPSet(entries)
+    probes = [p for p in _probes(rng, entries) if ":" not in p]
+    addrs = np.array([int(ipaddress.IPv4Address(p)) for p in probes], dtype=np.uint32)
+    np.testing.assert_array_equal(ipset.contains_v4(addrs), [p in ipset for p in probes])
+
+
+def test_nested_prefixes_and_non_addresses():
+    ipset = IPSet(["10.0.0.0/8", "10.1.0.0/16", "10.1.1.1", "::ffff:0:0/96"])
+    assert "10.200.0.1" in ipset and "10.1.1.1" in ipset and "10.1.9.9" in ipset
+    assert "11.0.0.0" not in ipset
+    assert "::ffff:1.2.3.4" in ipset
+    assert "1.2.3.4" not in ipset  # IPv4 and IPv4-mapped IPv6 are different addresses
+    assert "not-an-ip" not in ipset and None not in ipset and b"\x01\x02" not in ipset
+    assert IPSet(["10.1.0.0/16", "10.0.0.0/8"]).networks() == ["10.0.0.0/8", "10.1.0.0/16"]
+    with pytest.raises(ValueError):
+        IPSet(["10.0.0.0/33"])
+
+
+def test_read_ip_list(tmp_path):
+    path = tmp_path / "feed.txt"
+    path.write_text("# feed\n10.0.0.0/8, 192.0.2.7\n\n2001:db8::/32  # documentation\n", encoding="utf-8")
+    assert list(read_ip_list(path)) == ["10.0.0.0/8", "192.0.2.7", "2001:db8::/32"]
+
+
+@pytest.mark.parametrize("engine", ["native", "scapy"])
+def test_cidr_filters_match_a_reference_selection(capture, engine):
+    include = ["10.0.1.0/24", "192.168.1.0/30", "2001:db8::/120"]
+    exclude = ["10.0.1.1/32", "192.168.1.2"]
+    filters = FilterOptions(include_ips=include, exclude_ips=exclude)
+    packets_df, _ = parse_pcap(capture, filters=filters, engine=engine)
+    everything, _ = parse_pcap(capture)
+    src, dst = everything["src_ip"].astype(str), everything["dst_ip"].astype(str)
+    keep = [
+        (_reference(include, s) or _reference(include, d)) and not (_reference(exclude, s) or _reference(exclude, d))
+        for s, d in zip(src, dst)
+    ]
+    assert 0 < sum(keep) < len(everything)
+    pd.testing.assert_frame_equal(
+        packets_df.astype({"src_ip": str, "dst_ip": str}).reset_index(drop=True),
+        everything[keep].astype({"src_ip": str, "dst_ip": str}).reset_index(drop=True),
+    )
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.columns import string_view
+from src.pcapviz.metrics import compute_conversation_matrix, sparse_conversation_matrix
+from src.pcapviz.parser import parse_pcap
+
+
+@pytest.fixture(scope="module")
+def packets_df(capture):
+    return parse_pcap(capture)[0]
+
+
+@pytest.fixture(scope="module")
+def pairs(packets_df) -> pd.DataFrame:
+    """Bytes and packets per (src, dst), summed with a plain groupby."""
+    return (
+        string_view(packets_df)
+        .groupby(["src_ip", "dst_ip"])
+        .agg(bytes=("length", "sum"), packets=("length", "count"))
+        .reset_index()
+    )
+
+
+def test_triplets_are_the_host_pairs(packets_df, pairs):
+    matrix = sparse_conversation_matrix(packets_df)
+    assert matrix.nnz == len(pairs)
+    pd.testing.assert_frame_equal(matrix.triplets(), pairs, check_dtype=False)
+
+
+def test_top_rows_and_columns(packets_df, pairs):
+    matrix = sparse_conversation_matrix(packets_df)
+    top = matrix.top(10)
+    assert list(top["bytes"]) == sorted(pairs["bytes"], reverse=True)[:10]
+    host = "192.168.1.3"
+    row = matrix.row(host)
+    expected = pairs[pairs["src_ip"] == host]
+    assert set(row["dst_ip"]) == set(expected["dst_ip"]) and row["bytes"].sum() == expected["bytes"].sum()
+    assert list(row["bytes"]) == sorted(row["bytes"], reverse=True)
+    column = matrix.column(host)
+    expected = pairs[pairs["dst_ip"] == host]
+    assert set(column["src_ip"]) == set(expected["src_ip"]) and column["bytes"].sum() == expected["bytes"].sum()
+    assert matrix.row("203.0.113.1").empty and matrix.column("203.0.113.1").empty
+
+
+@pytest.mark.parametrize("top_n", [None, 8])
+def test_dense_view_matches_the_pivot_table(packets_df, pairs, top_n):
+    if top_n is None:
+        selected = pairs
+    else:
+        traffic = pd.concat([pairs.groupby("src_ip")["bytes"].sum(), pairs.groupby("dst_ip")["bytes"].sum()])
+        busiest = traffic.groupby(level=0).sum().sort_values(ascending=False, kind="stable").index[:top_n]
+        selected = pairs[pairs["src_ip"].isin(busiest) & pairs["dst_ip"].isin(busiest)]
+    expected = selected.pivot_table(index="src_ip", columns="dst_ip", values="bytes", aggfunc="sum", fill_value=0)
+    dense = sparse_conversation_matrix(packets_df).dense(top_n)
+    pd.testing.assert_frame_equal(dense, expected, check_dtype=False, check_names=False)
+    pd.testing.assert_frame_equal(compute_conversation_matrix(packets_df, top_n), dense, check_dtype=False, check_names=False)
+
+
+def test_exports_round_trip(packets_df, tmp_path):
+    matrix = sparse_conversation_matrix(packets_df)
+    matrix.to_csv(tmp_path / "m.csv")
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "m.csv"), matrix.triplets(), check_dtype=False)
+    pytest.importorskip("pyarrow")
+    matrix.to_parquet(tmp_path / "m.parquet")
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "m.parquet"), matrix.triplets(), check_dtype=False)
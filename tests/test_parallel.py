@@ -0,0 +1,59 @@
+import functools
+
+import pandas as pd
+import pytest
+
+from src.pcapviz import parser
+from src.pcapviz.decoder import split_capture
+from src.pcapviz.index import ensure_index
+from src.pcapviz.parser import FilterOptions, parse_pcap, parse_pcap_parallel
+
+from .captures import mixed_packets, write_pcapng
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    # the test captures are far below the default minimum range size
+    monkeypatch.setattr(parser, "split_capture", functools.partial(split_capture, min_part_size=4 << 10))
+
+
+@pytest.fixture(scope="module")
+def pcapng_capture(tmp_path_factory) -> str:
+    return write_pcapng(tmp_path_factory.mktemp("captures") / "mixed.pcapng", mixed_packets(1000))
+
+
+@pytest.mark.parametrize("name", ["capture", "pcapng_capture"])
+@pytest.mark.parametrize("workers", [2, 3])
+def test_split_capture_covers_every_record_once(name, workers, request):
+    path = request.getfixturevalue(name)
+    ranges = split_capture(path, workers, min_part_size=4 << 10)
+    assert len(ranges) == workers
+    assert all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+    rows = sum(len(parser._parse_ranges(path, [rng], None, None, "native", False, None)[0]) for rng in ranges)
+    assert rows == len(parse_pcap(path)[0])
+
+
+@pytest.mark.parametrize("name", ["capture", "pcapng_capture"])
+@pytest.mark.parametrize("filters", [None, FilterOptions(protocols=["UDP"]), FilterOptions(dst_ports=[80])])
+def test_parallel_parse_matches_serial(name, filters, request):
+    path = request.getfixturevalue(name)
+    packets_df, flows_df = parse_pcap(path, filters=filters)
+    parallel_packets, parallel_flows = parse_pcap_parallel(path, 3, filters=filters)
+    pd.testing.assert_frame_equal(parallel_packets, packets_df)
+    pd.testing.assert_frame_equal(parallel_flows, flows_df)
+
+
+def test_parallel_parse_stopped_early(capture):
+    packets_df, flows_df = parse_pcap(capture, max_packets=1234)
+    parallel_packets, parallel_flows = parse_pcap_parallel(capture, 3, max_packets=1234)
+    pd.testing.assert_frame_equal(parallel_packets, packets_df)
+    pd.testing.assert_frame_equal(parallel_flows, flows_df)
+
+
+def test_parallel_indexed_parse_matches_serial(capture, tmp_path):
+    index = ensure_index(capture, path=str(tmp_path / "mixed.pvidx"), block_bytes=16 << 10)
+    filters = FilterOptions(time_start=pd.Timestamp(1_700_000_005, unit="s", tz="UTC"))
+    packets_df, flows_df = parse_pcap(capture, filters=filters)
+    parallel_packets, parallel_flows = parse_pcap_parallel(capture, 3, filters=filters, index=index)
+    pd.testing.assert_frame_equal(parallel_packets, packets_df)
+    pd.testing.assert_frame_equal(parallel_flows, flows_df)
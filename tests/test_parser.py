@@ -0,0 +1,161 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.columns import PacketTableBuilder, string_view
+from src.pcapviz.index import ensure_index
+from src.pcapviz.parser import (
+    FilterOptions,
+    FlowKey,
+    _iter_packets,
+    _iter_records,
+    apply_filters,
+    build_flows,
+    concat_packet_frames,
+    iter_packet_chunks,
+    parse_pcap,
+)
+
+from .captures import mixed_packets, write_pcapng
+
+FILTERS = [
+    None,
+    FilterOptions(protocols=["TCP"], dst_ports=[80, 443]),
+    FilterOptions(include_ips=["10.0.1.2", "192.168.1.3"]),
+    FilterOptions(time_start=pd.Timestamp(1_700_000_005, unit="s", tz="UTC"), time_end=pd.Timestamp(1_700_000_012, unit="s", tz="UTC")),
+]
+
+
+@pytest.fixture(scope="module")
+def pcapng_capture(tmp_path_factory) -> str:
+    return write_pcapng(tmp_path_factory.mktemp("captures") / "mixed.pcapng", mixed_packets(400))
+
+
+@pytest.fixture
+def index(capture, tmp_path):
+    # small blocks, so a query spans several mapped ranges
+    return ensure_index(capture, path=str(tmp_path / "mixed.pvidx"), block_bytes=16 << 10)
+
+
+@pytest.mark.parametrize("name", ["capture", "raw_capture", "pcapng_capture"])
+def test_native_parse_matches_scapy(name, request):
+    path = request.getfixturevalue(name)
+    packets_df, flows_df = parse_pcap(path)
+    scapy_packets, scapy_flows = parse_pcap(path, engine="scapy")
+    pd.testing.assert_frame_equal(packets_df, scapy_packets)
+    pd.testing.assert_frame_equal(flows_df, scapy_flows)
+
+
+@pytest.mark.parametrize("filters", FILTERS[1:])
+def test_native_filters_match_scapy(capture, filters):
+    pd.testing.assert_frame_equal(parse_pcap(capture, filters=filters)[0], parse_pcap(capture, filters=filters, engine="scapy")[0])
+
+
+def _port(p):
+    return None if pd.isna(p) else int(p)
+
+
+def _passes(row, opts: FilterOptions) -> bool:
+    """The original per-packet filter semantics (exact addresses)."""
+    src, dst, sport, dport = str(row.src_ip), str(row.dst_ip), _port(row.src_port), _port(row.dst_port)
+    if opts.time_start is not None and row.timestamp < opts.time_start:
+        return False
+    if opts.time_end is not None and row.timestamp > opts.time_end:
+        return False
+    if opts.include_ips is not None and src not in opts.include_ips and dst not in opts.include_ips:
+        return False
+    if opts.exclude_ips is not None and (src in opts.exclude_ips or dst in opts.exclude_ips):
+        return False
+    if opts.protocols is not None and str(row.protocol) not in opts.protocols:
+        return False
+    if opts.src_ports is not None and sport is not None and sport not in opts.src_ports:
+        return False
+    return opts.dst_ports is None or dport is None or dport in opts.dst_ports
+
+
+@pytest.mark.parametrize(
+    "filters",
+    FILTERS[1:]
+    + [
+        FilterOptions(exclude_ips=["192.168.1.1", "2001:db8:1::53"], src_ports=[1025, 5001, 40000]),
+        FilterOptions(protocols=["UDP", "IP"], include_ips=["10.0.1.10", "10.0.1.18"]),
+        # bounds on packet timestamps are inclusive
+        FilterOptions(time_start=pd.Timestamp("2023-11-14 22:13:21.23Z"), time_end=pd.Timestamp("2023-11-14 22:13:25.67Z")),
+    ],
+)
+def test_compiled_filters_match_per_packet_semantics(capture, filters):
+    everything, _ = parse_pcap(capture)
+    keep = [_passes(row, filters) for row in everything.itertuples(index=False)]
+    assert 0 < sum(keep) < len(everything)
+    expected = concat_packet_frames([everything[keep]])
+    pd.testing.assert_frame_equal(parse_pcap(capture, filters=filters)[0], expected)
+    pd.testing.assert_frame_equal(concat_packet_frames([apply_filters(everything, filters)]), expected)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_batched_parse_matches_record_by_record(capture, filters):
+    builder = PacketTableBuilder()
+    builder.extend(_iter_records(capture, "native", filters.compile() if filters else None))
+    packets_df, _ = parse_pcap(capture, filters=filters)
+    pd.testing.assert_frame_equal(packets_df, builder.to_frame())
+
+
+def test_packet_dicts_are_the_table_rows(capture):
+    filters = FILTERS[1]
+    rows = list(_iter_packets(capture, max_packets=300, filters=filters))
+    expected = string_view(parse_pcap(capture, max_packets=300, filters=filters)[0]).to_dict("records")
+    assert len(rows) == 300 and rows == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_indexed_parse_matches_plain_parse(capture, index, filters):
+    assert len(index.blocks) > 1
+    plain_packets, plain_flows = parse_pcap(capture, filters=filters)
+    packets_df, flows_df = parse_pcap(capture, filters=filters, index=index)
+    pd.testing.assert_frame_equal(packets_df, plain_packets)
+    pd.testing.assert_frame_equal(flows_df, plain_flows)
+
+
+def test_indexed_chunks_match_plain_parse(capture, index):
+    chunks = list(iter_packet_chunks(capture, index=index, chunk_size=500))
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(concat_packet_frames(chunks), parse_pcap(capture)[0])
+
+
+def test_indexed_parse_stopped_early(capture, index):
+    packets_df, _ = parse_pcap(capture, max_packets=10, index=index)
+    pd.testing.assert_frame_equal(packets_df, parse_pcap(capture, max_packets=10)[0])
+
+
+def _reference_flows(packets_df: pd.DataFrame) -> pd.DataFrame:
+    """Flows grouped on ``FlowKey.normalized`` one packet at a time, as the parser originally did."""
+    flows = {}
+    for row in packets_df.itertuples(index=False):
+        key = FlowKey(row.src_ip, row.dst_ip, _port(row.src_port), _port(row.dst_port), row.protocol)
+        flow = flows.setdefault(key.normalized(), [0, 0, row.timestamp, row.timestamp])
+        flow[0] += 1
+        flow[1] += int(row.length)
+        flow[2], flow[3] = min(flow[2], row.timestamp), max(flow[3], row.timestamp)
+    return pd.DataFrame(
+        [(k.src_ip, k.dst_ip, k.src_port, k.dst_port, k.protocol, *v) for k, v in flows.items()],
+        columns=["src_ip", "dst_ip", "src_port", "dst_port", "protocol", "packets", "bytes", "start_time", "end_time"],
+    )
+
+
+def test_build_flows_matches_flow_key_grouping(capture):
+    packets_df = parse_pcap(capture)[0].astype({"src_ip": str, "dst_ip": str, "protocol": str})
+    # a host talking to itself, in both port orders
+    loop = packets_df.iloc[:2].assign(dst_ip=packets_df["src_ip"].iloc[:2].to_numpy())
+    swapped = loop.assign(src_port=loop["dst_port"].to_numpy(), dst_port=loop["src_port"].to_numpy())
+    packets_df = pd.concat([packets_df, loop, swapped], ignore_index=True)
+    key = ["src_ip", "dst_ip", "src_port", "dst_port", "protocol"]
+    flows_df = build_flows(packets_df)
+    got = flows_df.astype({"src_ip": str, "dst_ip": str, "protocol": str, "src_port": object, "dst_port": object})
+    got[["src_port", "dst_port"]] = got[["src_port", "dst_port"]].map(_port)
+    expected = _reference_flows(packets_df)
+    columns = key + ["packets", "bytes", "start_time", "end_time"]
+    pd.testing.assert_frame_equal(
+        got[columns].sort_values(key, key=lambda c: c.astype(str)).reset_index(drop=True),
+        expected[columns].sort_values(key, key=lambda c: c.astype(str)).reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert (flows_df["duration_s"] == (flows_df["end_time"] - flows_df["start_time"]).dt.total_seconds()).all()
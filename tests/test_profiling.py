@@ -0,0 +1,60 @@
+import io
+import json
+import pstats
+
+import pytest
+
+from src.pcapviz.cli import main
+from src.pcapviz.parser import ParseProgress, parse_pcap
+from src.pcapviz.profiling import Profiler, ProgressPrinter
+
+
+def test_stages_are_recorded_in_order():
+    seen = []
+    profiler = Profiler(on_stage=seen.append)
+    with profiler.stage("outer", rows_in=1000) as outer:
+        with profiler.stage("inner") as inner:
+            inner.rows_out = 10
+            sum(range(200_000))
+        outer.rows_out = 500
+    assert [r.name for r in profiler.stages] == ["inner", "outer"] and seen == profiler.stages
+    assert outer.wall_s >= inner.wall_s > 0
+    assert outer.rows_per_s == 1000 / outer.wall_s and inner.rows_per_s == 10 / inner.wall_s
+    report = profiler.report()
+    assert [s["name"] for s in report["stages"]] == ["inner", "outer"] and report["hottest"] == "outer"
+
+
+def test_a_failing_stage_is_still_recorded():
+    profiler = Profiler()
+    with pytest.raises(RuntimeError):
+        with profiler.stage("broken"):
+            raise RuntimeError("boom")
+    assert [r.name for r in profiler.stages] == ["broken"]
+
+
+def test_progress_reaches_done(capture):
+    updates = []
+    packets_df, _ = parse_pcap(capture, progress=updates.append)
+    assert updates and updates[-1].done and updates[-1].packets == len(packets_df)
+    assert [u.packets for u in updates] == sorted(u.packets for u in updates)
+    assert all(u.fraction is None or 0 <= u.fraction <= 1 for u in updates)
+
+
+def test_progress_printer_is_throttled():
+    out = io.StringIO()
+    printer = ProgressPrinter(interval=3600, file=out)
+    for packets in (10, 20, 30):
+        printer(ParseProgress(packets, packets, packets * 100, 10_000, 1.0))
+    printer(ParseProgress(40, 40, 10_000, 10_000, 2.0, done=True))
+    lines = out.getvalue().splitlines()
+    assert lines == ["parse: 10 packets, 10 records, 10/s, 10%, ETA 9s", "parse: 40 packets, 40 records, 20/s, done in 2.0s"]
+
+
+def test_cli_profile_report(capture, tmp_path):
+    assert main([capture, "--out-dir", str(tmp_path), "--profile", "--profile-dump", str(tmp_path / "hot.prof")]) == 0
+    with open(tmp_path / "profile.json", encoding="utf-8") as fh:
+        report = json.load(fh)
+    names = [s["name"] for s in report["stages"]]
+    assert names[0] == "parse_pcap" and {"build_host_graph", "render_html", "export_graphml"} <= set(names)
+    assert report["hottest"] in names and report["stages"][0]["rows_out"] == len(parse_pcap(capture)[0])
+    assert pstats.Stats(str(tmp_path / "hot.prof")).total_calls > 0
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pcapviz.graph import build_host_graph
+from src.pcapviz.metrics import compute_protocol_breakdown, compute_throughput, compute_top_ports, compute_top_talkers
+from src.pcapviz.parser import FilterOptions, apply_filters, parse_pcap
+from src.pcapviz.query import PacketIndex
+
+QUERIES = [
+    None,
+    FilterOptions(protocols=["TCP"], dst_ports=[80, 443]),
+    FilterOptions(include_ips=["10.0.1.0/24", "2001:db8:1::/48"]),
+    FilterOptions(include_ips=["10.0.1.10"], exclude_ips=["192.168.1.3"], protocols=["UDP", "IP"]),
+    FilterOptions(src_ports=[1025, 5001], dst_ports=[53]),
+    FilterOptions(protocols=["IP"]),
+    FilterOptions(protocols=["ICMP"]),  # no such packets
+    FilterOptions(time_start=pd.Timestamp("2023-11-14 22:13:21.23Z"), time_end=pd.Timestamp("2023-11-14 22:13:25.67Z")),
+    FilterOptions(time_start=pd.Timestamp(1_700_000_004, unit="s", tz="UTC"), protocols=["TCP"], exclude_ips=["10.0.0.0/16"]),
+]
+
+
+@pytest.fixture(scope="module")
+def packets_df(capture):
+    return parse_pcap(capture)[0]
+
+
+def _expected_rows(packets_df: pd.DataFrame, filters) -> np.ndarray:
+    return np.flatnonzero(packets_df.index.isin(apply_filters(packets_df, filters).index))
+
+
+@pytest.mark.parametrize("filters", QUERIES)
+def test_select_matches_apply_filters(packets_df, filters):
+    index = PacketIndex(packets_df)
+    np.testing.assert_array_equal(index.select(filters), _expected_rows(packets_df, filters))
+    pd.testing.assert_frame_equal(index.filter(filters), apply_filters(packets_df, filters))
+
+
+@pytest.mark.parametrize("filters", QUERIES[1:])
+def test_select_on_a_table_out_of_time_order(packets_df, filters):
+    shuffled = packets_df.sample(frac=1, random_state=2).reset_index(drop=True)
+    np.testing.assert_array_equal(PacketIndex(shuffled).select(filters), _expected_rows(shuffled, filters))
+
+
+def test_metrics_on_selected_rows(packets_df):
+    filters = QUERIES[3]
+    rows = PacketIndex(packets_df).select(filters)
+    subset = apply_filters(packets_df, filters)
+    assert 0 < len(rows) < len(packets_df)
+    pd.testing.assert_frame_equal(compute_top_talkers(packets_df, rows=rows), compute_top_talkers(subset))
+    pd.testing.assert_frame_equal(compute_top_ports(packets_df, rows=rows), compute_top_ports(subset))
+    pd.testing.assert_frame_equal(compute_protocol_breakdown(packets_df, rows=rows), compute_protocol_breakdown(subset))
+    pd.testing.assert_frame_equal(compute_throughput(packets_df, rows=rows), compute_throughput(subset))
+    assert set(build_host_graph(packets_df, rows=rows).edges) == set(build_host_graph(subset).edges)
@@ -0,0 +1,72 @@
+import json
+import re
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.pcapviz.render import fit_budget, force_layout, to_html
+
+
+@pytest.fixture(scope="module")
+def graph() -> nx.DiGraph:
+    rng = np.random.default_rng(5)
+    G = nx.DiGraph()
+    for u, v in rng.integers(0, 200, (1500, 2)).tolist():
+        if u != v:
+            nbytes = int(rng.integers(60, 100_000))
+            G.add_edge(f"10.0.0.{u}", f"10.0.0.{v}", bytes=nbytes, packets=nbytes // 60, protocol_bytes={"TCP": nbytes})
+    for node in G:
+        G.nodes[node]["total_bytes"] = sum(b for _, _, b in G.out_edges(node, data="bytes"))
+    return G
+
+
+def _payload(page: str) -> dict:
+    return json.loads(re.search(r"^const data = (.*);$", page, re.M).group(1).replace("<\\/", "</"))
+
+
+def test_budget_keeps_the_busiest_nodes_and_heaviest_edges(graph):
+    H, note = fit_budget(graph, 50, 100)
+    assert H.number_of_nodes() <= 50 and H.number_of_edges() == 100
+    traffic = {n: 0 for n in graph}
+    for u, v, b in graph.edges(data="bytes"):
+        traffic[u] += b
+        traffic[v] += b
+    busiest = set(sorted(traffic, key=traffic.get, reverse=True)[:50])
+    inside = sorted((b for u, v, b in graph.edges(data="bytes") if u in busiest and v in busiest), reverse=True)
+    assert sorted((b for _, _, b in H.edges(data="bytes")), reverse=True) == inside[:100]
+    assert all(H.nodes[n] == graph.nodes[n] for n in H)
+    assert f"of {graph.number_of_nodes()} nodes" in note
+
+
+def test_graphs_within_budget_are_untouched(graph):
+    assert fit_budget(graph, None, None) == (graph, "")
+    assert fit_budget(graph, graph.number_of_nodes(), graph.number_of_edges())[0] is graph
+
+
+def test_layout_is_deterministic_and_finite(graph):
+    pos = force_layout(graph, iterations=20)
+    assert pos.shape == (graph.number_of_nodes(), 2) and np.isfinite(pos).all()
+    np.testing.assert_array_equal(pos, force_layout(graph, iterations=20))
+    assert len(np.unique(pos.round(6), axis=0)) == len(pos)
+
+
+def test_html_payload_holds_the_pruned_graph(graph):
+    page = to_html(graph, max_nodes=40, max_edges=60)
+    data = _payload(page)
+    H, note = fit_budget(graph, 40, 60)
+    assert data["nodes"]["id"] == list(H.nodes)
+    assert len(data["nodes"]["x"]) == len(data["nodes"]["y"]) == H.number_of_nodes()
+    ids, E = data["nodes"]["id"], data["edges"]
+    edges = {(ids[u], ids[v]): b for u, v, b in zip(E["from"], E["to"], E["bytes"])}
+    assert edges == {(u, v): b for u, v, b in H.edges(data="bytes")}
+    assert data["protocols"] == ["TCP"]
+    assert "physics: false" in page and "render budget" in page
+
+
+def test_node_names_cannot_close_the_script():
+    G = nx.DiGraph()
+    G.add_edge("</script><b>", "b", bytes=1, packets=1)
+    page = to_html(G)
+    assert "</script><b>" not in page
+    assert _payload(page)["nodes"]["id"][0] == "</script><b>"
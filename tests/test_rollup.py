@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.metrics import compute_throughput
+from src.pcapviz.parser import concat_packet_frames, parse_pcap
+from src.pcapviz.rollup import ThroughputPyramid
+
+T0 = pd.Timestamp(1_700_000_000, unit="s", tz="UTC")
+
+
+@pytest.fixture(scope="module")
+def packets_df(capture) -> pd.DataFrame:
+    day1, _ = parse_pcap(capture)
+    # a second day, off the bins of the first, so the origin matters
+    day2 = day1.assign(timestamp=day1["timestamp"] + pd.Timedelta(days=1, seconds=3.5))
+    return concat_packet_frames([day1, day2])
+
+
+@pytest.fixture(scope="module")
+def pyramid(packets_df) -> ThroughputPyramid:
+    return ThroughputPyramid(packets_df)
+
+
+@pytest.mark.parametrize("rule", ["10ms", "250ms", "1S", "7S", "1min", "13min"])
+def test_pyramid_matches_compute_throughput(packets_df, pyramid, rule):
+    pd.testing.assert_frame_equal(pyramid.throughput(rule), compute_throughput(packets_df, rule), check_dtype=False)
+
+
+@pytest.mark.parametrize("rule", ["100ms", "1S", "5S"])
+def test_window_matches_the_selected_packets(packets_df, pyramid, rule):
+    start, end = T0 + pd.Timedelta(seconds=5), T0 + pd.Timedelta(seconds=20)
+    width = pd.Timedelta(pyramid.level_for(rule).width, unit="ns")
+    # buckets of the level used are counted whole, up to the one containing ``end``
+    ts = packets_df["timestamp"]
+    selected = packets_df[(ts >= start) & (ts < end.floor(width) + width)]
+    pd.testing.assert_frame_equal(
+        pyramid.throughput(rule, start=start, end=end), compute_throughput(selected, rule), check_dtype=False
+    )
+
+
+def test_protocol_series_match_compute_throughput(packets_df, pyramid):
+    by_protocol = pyramid.throughput("1S", by="protocol")
+    for protocol in pyramid.protocols:
+        got = by_protocol[by_protocol["protocol"] == protocol].drop(columns="protocol")
+        got = got[got["packets"] > 0].reset_index(drop=True)
+        expected = compute_throughput(packets_df[packets_df["protocol"] == protocol], "1S")
+        expected = expected[expected["packets"] > 0].reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_auto_rule_keeps_a_window_under_max_points(pyramid):
+    start, end = T0, T0 + pd.Timedelta(seconds=20)
+    assert pyramid.auto_rule(start, end, max_points=25) == "1s"
+    rule = pyramid.auto_rule(max_points=2000)
+    assert len(pyramid.throughput(rule)) <= 2000
+    assert len(pyramid.throughput(pyramid.levels[pyramid.levels.index(rule) - 1])) > 2000
+
+
+def test_rules_between_levels(pyramid):
+    assert pyramid.level_for("3S").width == pd.Timedelta("1S").value
+    with pytest.raises(ValueError):
+        pyramid.level_for("1500us")
+    with pytest.raises(ValueError):
+        ThroughputPyramid(pd.DataFrame(), levels=["1S", "1500ms"])
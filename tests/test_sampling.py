@@ -0,0 +1,104 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pcapviz import parser
+from src.pcapviz.decoder import split_capture
+from src.pcapviz.index import ensure_index
+from src.pcapviz.parser import FilterOptions, concat_packet_frames, parse_pcap, parse_pcap_parallel
+from src.pcapviz.sampling import SampleOptions
+from src.pcapviz.streaming import stream_pcap
+
+SAMPLES = [SampleOptions(4), SampleOptions(4, seed=1), SampleOptions(5, mode="packet")]
+
+
+def _flow_selected(packets_df: pd.DataFrame, sample: SampleOptions) -> np.ndarray:
+    """Reference flow sampling of a packets table, one row at a time."""
+    def port(p):
+        return None if pd.isna(p) else int(p)
+
+    return np.array(
+        [
+            bool(sample.keep_flows(str(s), str(d), port(sp), port(dp), str(proto)))
+            for s, d, sp, dp, proto in zip(
+                packets_df["src_ip"], packets_df["dst_ip"], packets_df["src_port"], packets_df["dst_port"], packets_df["protocol"]
+            )
+        ]
+    )
+
+
+def test_vectorized_flow_hash_matches_scalar():
+    rng = np.random.default_rng(3)
+    src, dst = rng.integers(0, 1 << 32, 500, dtype=np.uint64), rng.integers(0, 1 << 32, 500, dtype=np.uint64)
+    sport, dport = rng.integers(0, 1 << 16, 500), rng.integers(0, 1 << 16, 500)
+    protocol = rng.choice([6, 17], 500)
+    sample = SampleOptions(3, seed=9)
+    vectorized = sample.keep_flows(src, dst, sport, dport, protocol)
+    for i in range(500):
+        packed = [int(a).to_bytes(4, "big") for a in (src[i], dst[i])]
+        name = {6: "TCP", 17: "UDP"}[int(protocol[i])]
+        assert vectorized[i] == sample.keep_flows(*packed, int(sport[i]), int(dport[i]), name)
+        # direction-agnostic
+        assert vectorized[i] == sample.keep_flows(packed[1], packed[0], int(dport[i]), int(sport[i]), name)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_flow_sample_keeps_whole_flows(capture, seed):
+    sample = SampleOptions(4, seed=seed)
+    everything, all_flows = parse_pcap(capture)
+    packets_df, flows_df = parse_pcap(capture, sample=sample)
+    keep = _flow_selected(everything, sample)
+    assert 0 < keep.sum() < len(everything)
+    pd.testing.assert_frame_equal(packets_df, concat_packet_frames([everything[keep]]))
+    # every sampled flow is complete
+    key = ["src_ip", "dst_ip", "src_port", "dst_port", "protocol"]
+    merged = flows_df.astype({c: str for c in key}).merge(all_flows.astype({c: str for c in key}), on=key, suffixes=("", "_all"))
+    assert len(merged) == len(flows_df)
+    assert (merged["packets"] == merged["packets_all"]).all() and (merged["bytes"] == merged["bytes_all"]).all()
+
+
+def test_seeds_and_rate_one(capture):
+    first = parse_pcap(capture, sample=SampleOptions(4))[0]
+    other = parse_pcap(capture, sample=SampleOptions(4, seed=1))[0]
+    assert not first.equals(other)
+    pd.testing.assert_frame_equal(parse_pcap(capture, sample=SampleOptions(1))[0], parse_pcap(capture)[0])
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=lambda s: s.key)
+def test_sample_is_the_same_with_any_engine(capture, sample):
+    packets_df, flows_df = parse_pcap(capture, sample=sample)
+    assert 0 < len(packets_df)
+    scapy_packets, scapy_flows = parse_pcap(capture, sample=sample, engine="scapy")
+    pd.testing.assert_frame_equal(scapy_packets, packets_df)
+    pd.testing.assert_frame_equal(scapy_flows, flows_df)
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=lambda s: s.key)
+def test_sample_is_the_same_with_workers_and_index(capture, tmp_path, monkeypatch, sample):
+    monkeypatch.setattr(parser, "split_capture", functools.partial(split_capture, min_part_size=4 << 10))
+    index = ensure_index(capture, path=str(tmp_path / "mixed.pvidx"), block_bytes=16 << 10)
+    filters = FilterOptions(protocols=["TCP", "UDP"])
+    packets_df, flows_df = parse_pcap(capture, filters=filters, sample=sample)
+    for kwargs in ({"index": index}, {"workers": 3}, {"workers": 3, "index": index}):
+        workers = kwargs.pop("workers", None)
+        if workers:
+            got = parse_pcap_parallel(capture, workers, filters=filters, sample=sample, **kwargs)
+        else:
+            got = parse_pcap(capture, filters=filters, sample=sample, **kwargs)
+        pd.testing.assert_frame_equal(got[0], packets_df)
+        pd.testing.assert_frame_equal(got[1], flows_df)
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=lambda s: s.key)
+def test_streaming_sample_matches_parse(capture, sample):
+    packets_df, _ = parse_pcap(capture, sample=sample)
+    stats = stream_pcap(capture, chunk_size=500, sample=sample)
+    assert (stats.packets, stats.bytes) == (len(packets_df), int(packets_df["length"].sum()))
+
+
+def test_packet_sample_size_is_about_one_in_rate(capture):
+    everything, _ = parse_pcap(capture)
+    packets_df, _ = parse_pcap(capture, sample=SampleOptions(5, mode="packet"))
+    assert abs(len(packets_df) - len(everything) / 5) < 0.2 * len(everything) / 5
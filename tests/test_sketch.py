@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pcapviz.metrics import compute_top_talkers
+from src.pcapviz.parser import parse_pcap
+from src.pcapviz.sketch import HeavyHitters
+
+
+def _stream(seed: int, n: int = 20_000, keys: int = 2000) -> pd.DataFrame:
+    """Zipf-like byte counts over ``keys`` keys, a few heavy ones and a long tail."""
+    rng = np.random.default_rng(seed)
+    key = np.minimum(rng.zipf(1.3, n), keys)
+    return pd.DataFrame({"ip": [f"k{k}" for k in key], "bytes": rng.integers(40, 1500, n), "packets": 1})
+
+
+def _check_bounds(sketch: HeavyHitters, stream: pd.DataFrame) -> None:
+    exact = stream.groupby("ip")["bytes"].sum()
+    total = int(stream["bytes"].sum())
+    table = sketch.table()
+    assert len(table) <= sketch.capacity
+    assert sketch.total_bytes == total
+    assert sketch.error <= sketch.epsilon * total
+    true = exact.reindex(table["ip"]).to_numpy()
+    assert (table["bytes"].to_numpy() - table["bytes_error"].to_numpy() <= true).all()
+    assert (true <= table["bytes"].to_numpy()).all()
+    # every key above the error bound is reported
+    assert set(exact[exact > sketch.error].index) <= set(table["ip"])
+    assert (exact.drop(table["ip"]) <= sketch.error).all()
+
+
+@pytest.mark.parametrize("epsilon", [0.01, 0.002])
+def test_estimates_bound_the_true_counts(epsilon):
+    stream = _stream(seed=1)
+    sketch = HeavyHitters(["ip"], epsilon)
+    for start in range(0, len(stream), 1000):
+        sketch.update(stream.iloc[start:start + 1000])
+    _check_bounds(sketch, stream)
+
+
+def test_merged_summaries_keep_the_bounds():
+    stream = pd.concat([_stream(seed=2), _stream(seed=3)], ignore_index=True)
+    merged = HeavyHitters(["ip"], 0.01)
+    for start in range(0, len(stream), 4000):
+        part = HeavyHitters(["ip"], 0.01)
+        part.update(stream.iloc[start:start + 4000])
+        merged.merge(part)
+    _check_bounds(merged, stream)
+
+
+def test_exact_when_every_key_fits():
+    stream = _stream(seed=4, keys=50)
+    sketch = HeavyHitters(["ip"], 0.01)
+    sketch.update(stream)
+    table = sketch.table().set_index("ip")
+    assert (table["bytes_error"] == 0).all()
+    pd.testing.assert_series_equal(
+        table["bytes"].sort_index(), stream.groupby("ip")["bytes"].sum().sort_index(), check_names=False
+    )
+
+
+def test_approximate_top_talkers_bound_the_exact_ones(capture):
+    packets_df, _ = parse_pcap(capture)
+    exact = compute_top_talkers(packets_df, n=1000).astype({"ip": str}).set_index("ip")["bytes"]
+    approx = compute_top_talkers(packets_df, n=5, epsilon=0.05).astype({"ip": str})
+    true = exact.reindex(approx["ip"]).to_numpy()
+    assert (approx["bytes"].to_numpy() - approx["bytes_error"].to_numpy() <= true).all()
+    assert (true <= approx["bytes"].to_numpy()).all()
+    assert set(exact.index[:3]) <= set(approx["ip"])
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from src.pcapviz.metrics import compute_protocol_breakdown, compute_throughput, compute_top_talkers
+from src.pcapviz.parser import concat_packet_frames, parse_pcap
+from src.pcapviz.streaming import StreamingStats, stream_pcap
+
+
+def _by(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    return df.astype({key: str}).sort_values(key).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("rule", ["250ms", "1S", "7S", "13min"])
+def test_streaming_throughput_matches_compute_throughput(capture, rule):
+    packets_df, _ = parse_pcap(capture)
+    stats = stream_pcap(capture, throughput_rule=rule, chunk_size=500)
+    pd.testing.assert_frame_equal(stats.throughput(), compute_throughput(packets_df, rule), check_dtype=False)
+
+
+def test_streaming_metrics_match_in_memory(capture):
+    packets_df, flows_df = parse_pcap(capture)
+    stats = stream_pcap(capture, chunk_size=500)
+    assert (stats.packets, stats.bytes) == (len(packets_df), int(packets_df["length"].sum()))
+    pd.testing.assert_frame_equal(
+        _by(stats.top_talkers(n=1000), "ip"), _by(compute_top_talkers(packets_df, n=1000), "ip"), check_dtype=False
+    )
+    pd.testing.assert_frame_equal(
+        _by(stats.protocol_breakdown(), "protocol"), _by(compute_protocol_breakdown(packets_df), "protocol"), check_dtype=False
+    )
+    assert len(stats.flows()) == len(flows_df)
+    assert stats.flows()["packets"].sum() == flows_df["packets"].sum()
+
+
+@pytest.mark.parametrize("rule", ["7S", "1min"])
+def test_throughput_bins_start_at_midnight_of_the_first_day(capture, rule):
+    day1, _ = parse_pcap(capture)
+    day2 = day1.assign(timestamp=day1["timestamp"] + pd.Timedelta(days=1, seconds=3.5))
+    expected = compute_throughput(concat_packet_frames([day1, day2]), rule)
+
+    # the later day first: the origin is only known at the end
+    stats = StreamingStats(rule, flows=False)
+    stats.update(day2)
+    stats.update(day1)
+    pd.testing.assert_frame_equal(stats.throughput(), expected, check_dtype=False)
+
+    merged = StreamingStats(rule, flows=False)
+    other = StreamingStats(rule, flows=False)
+    merged.update(day2)
+    other.update(day1)
+    merged.merge(other)
+    pd.testing.assert_frame_equal(merged.throughput(), expected, check_dtype=False)
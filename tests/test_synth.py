@@ -0,0 +1,68 @@
+import hashlib
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+from src.pcapviz.bench import benchmark, compare
+from src.pcapviz.parser import parse_pcap
+from src.pcapviz.synth import SynthSpec, write_capture
+
+SPEC = SynthSpec(packets=3000, hosts=50, flows=300, ipv6=0.2, duration=10.0)
+
+
+def _write(tmp_path, name: str, spec: SynthSpec) -> str:
+    path = str(tmp_path / name)
+    write_capture(path, spec)
+    return path
+
+
+def _digest(path: str) -> str:
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def test_same_spec_same_bytes(tmp_path):
+    first = _write(tmp_path, "a.pcap", SPEC)
+    assert _digest(first) == _digest(_write(tmp_path, "b.pcap", SPEC))
+    other = replace(SPEC, seed=1)
+    assert _digest(first) != _digest(_write(tmp_path, "c.pcap", other))
+
+
+def test_capture_has_the_spec_shape(tmp_path):
+    packets_df, flows_df = parse_pcap(_write(tmp_path, "a.pcap", SPEC))
+    assert len(packets_df) == SPEC.packets
+    hosts = set(packets_df["src_ip"].astype(str)) | set(packets_df["dst_ip"].astype(str))
+    assert len(hosts) <= 2 * SPEC.hosts  # each host has an IPv4 and an IPv6 address
+    assert set(packets_df["protocol"].astype(str)) == {"TCP", "UDP", "IP", "IPV6"}
+    tcp_or_udp = packets_df["protocol"].isin(["TCP", "UDP"]).mean()
+    assert tcp_or_udp > 0.8
+    assert packets_df["timestamp"].is_monotonic_increasing
+    span = packets_df["timestamp"].iloc[-1] - packets_df["timestamp"].iloc[0]
+    assert span <= pd.Timedelta(seconds=SPEC.duration)
+    assert packets_df["length"].max() <= SPEC.max_length
+
+
+def test_pcap_and_pcapng_hold_the_same_packets(tmp_path):
+    pcap = parse_pcap(_write(tmp_path, "a.pcap", SPEC))[0]
+    pcapng = parse_pcap(_write(tmp_path, "a.pcapng", replace(SPEC, pcapng=True)))[0]
+    pd.testing.assert_frame_equal(pcapng, pcap)
+    pd.testing.assert_frame_equal(parse_pcap(str(tmp_path / "a.pcap"), engine="scapy")[0], pcap)
+
+
+@pytest.mark.parametrize("kwargs", [{"hosts": 1}, {"tcp": 0.8, "udp": 0.3}, {"max_length": 50}])
+def test_invalid_specs(kwargs):
+    with pytest.raises(ValueError):
+        SynthSpec(**kwargs)
+
+
+def test_benchmark_and_regression_gates():
+    results = benchmark(SynthSpec(packets=500, hosts=20, flows=50), repeat=1, stages=["parse_pcap"], memory=False)
+    assert list(results["stages"]) == ["parse_pcap"]
+    assert compare(results, results) == []
+    slower = {**results, "stages": {"parse_pcap": {**results["stages"]["parse_pcap"], "peak_mb": None}}}
+    slower["stages"]["parse_pcap"]["seconds"] = results["stages"]["parse_pcap"]["seconds"] * 2 + 1
+    assert [r.split(":")[0] for r in compare(slower, results)] == ["parse_pcap"]
+    assert compare(slower, results, stage_thresholds={"parse_pcap": 100.0}) == []
+    with pytest.raises(ValueError):
+        compare(results, {**results, "workload": {"synth": {}}})